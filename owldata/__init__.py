@@ -8,6 +8,16 @@
 # =====================================================================
 
 from .api import OwlData
+from ._owlasync import AsyncOwlData
+from ._owlhttp import OwlRetry
+from ._owlrate import OwlRateLimiter
+from ._owlreplay import OwlRecorder, OwlReplayServer
+from ._owlmetrics import OwlMetrics
+from ._owlta import OwlIndicators, OwlIndicatorState
+from ._owladjust import OwlAdjustment
+from ._owlscreen import OwlScreen
+from ._owlerror import (OwlException, OwlInputError, OwlDateError, OwlColumnError, OwlSidError, OwlPermissionError,
+                        OwlConnectionError, OwlHTTPError, OwlAuthError, OwlNotFoundError, OwlServerError, OwlBatchErrors)
 from .__version__ import __version__
 
 __docformat__ = 'restructuredtext'
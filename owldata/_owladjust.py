@@ -0,0 +1,406 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+from ._owlerror import OwlBatchErrors, _as_raise, _check_range, _check_sid
+from ._owlrate import _as_bulk
+from ._owlbatch import _gather
+
+# --------------------
+# BLOCK 還原權值
+# --------------------
+# 依調整因子換算的價格欄位與股數欄位
+_PRICE_COLS = ['開盤價', '最高價', '最低價', '收盤價', '均價', '漲跌']
+_VOLUME_COLS = ['成交量', '成交量(股)', '均張']
+
+# 事件表欄位
+_EVENT_COLS = ['股票代號', '年度', '除權息日', '現金股利', '股票股利', '前收盤', '價格因子', '股數因子']
+
+# dpm 查詢欄位: 除息日配發現金股利、除權日配發股票股利，每次配發一列
+_DPM_COLS = ['股票代號', '年度', '除息日', '除權日', '現金股利合計(元)', '股票股利合計(元)']
+
+# 股票股利以每股面額 10 元換算配股比例
+_PAR = 10.0
+
+# 日期轉為 yyyymmdd 整數，無法解析時為 0；支援 yyyymmdd、yyyy/mm/dd 與民國年 yyy/mm/dd
+def _date_int(values) -> 'ndarray':
+    text = pd.Series(values, dtype = object).astype(str).str.strip()
+    parts = text.str.extract(r'^(\d{2,4})\D?(\d{1,2})\D?(\d{1,2})$').astype(float)
+    year, month, day = parts[0], parts[1], parts[2]
+    year = year.where(year >= 1911, year + 1911)
+    valid = month.between(1, 12) & day.between(1, 31)
+    return (year * 10000 + month * 100 + day).where(valid, 0).to_numpy(dtype = np.int64)
+
+def _stamp_int(index) -> 'ndarray':
+    index = pd.DatetimeIndex(index)
+    return (index.year * 10000 + index.month * 100 + index.day).to_numpy(dtype = np.int64)
+
+class OwlAdjustment():
+    def __init__(self, path:str = None, max_age:float = 12 * 3600):
+        '''
+        除權息事件與調整因子，供還原股價使用
+
+        Parameters
+        ----------
+        :param path: str, default None
+            - 保存事件表的檔案路徑 (pickle)，未輸入則只保留於記憶體
+
+        :param max_age: float, default 43200
+            - 尚未結束的年度，事件表超過幾秒才重新查詢 dpm
+
+        [NOTES]
+        ----------
+            - 每次配發為一個事件：現金股利於 除息日、股票股利於 除權日，同日除權息合併為一個事件
+            - 季配、半年配的股票一年有多個事件；重複的 dpm 列只計一次
+            - 價格因子 = (前收盤 - 現金股利) / (前收盤 x (1 + 股票股利 / 10))，即除權息參考價 / 前收盤
+            - 股數因子 = 1 + 股票股利 / 10
+            - 除權息日之前的價格乘上其後所有事件的價格因子、成交量乘上股數因子，以最新價格為基準
+            - 除權息日尚未到的事件保留至除權息後才計算因子
+        '''
+        self.path = path
+        self.max_age = max_age
+        self.events = pd.DataFrame({col:pd.Series(dtype = dtype) for col, dtype in zip(_EVENT_COLS, [
+            object, 'datetime64[ns]', np.int64, np.float64, np.float64, np.float64, np.float64, np.float64])})
+        self.fetched = {}
+        self._lock = threading.Lock()
+        self._table = None
+        if path is not None and os.path.exists(path):
+            entry = pd.read_pickle(path)
+            # 舊版事件表以 最後過戶日 推算除權息日，捨棄後重新查詢
+            if '最後過戶日' not in entry['events'].columns:
+                self.events = entry['events']
+                self.fetched = entry['fetched']
+
+    def __repr__(self):
+        return 'OwlAdjustment(events={}, years={})'.format(len(self.events), sorted(self.fetched))
+
+    # 需要查詢的年度
+    def stale(self, years) -> list:
+        '''
+        尚未查詢、或查詢時年度尚未結束且超過 max_age 的年度
+        '''
+        now = time.time()
+        result = []
+        for year in years:
+            fetched = self.fetched.get(year)
+            if fetched is None:
+                result.append(year)
+            elif time.localtime(fetched).tm_year <= int(year) and now - fetched > self.max_age:
+                result.append(year)
+        return result
+
+    # 合併新查詢的年度
+    def merge(self, events:'DataFrame', years:list):
+        '''
+        以新查詢的事件取代相同年度的舊事件，內容未變的事件保留已計算的因子
+
+        Parameters
+        ----------
+        :param events: DataFrame
+            - 股票代號、年度、除權息日、現金股利、股票股利
+
+        :param years: list
+            - 此次查詢成功的年度 (yyyy)
+        '''
+        with self._lock:
+            old = self.events
+            keys = ['股票代號', '年度', '除權息日', '現金股利', '股票股利']
+            done = old.loc[old['價格因子'].notna(), keys + ['前收盤', '價格因子', '股數因子']]
+            new = events[keys].merge(done, on = keys, how = 'left')
+            keep = old[~old['年度'].dt.year.astype(str).isin(years)]
+            self.events = pd.concat([keep, new[_EVENT_COLS]], ignore_index = True).sort_values(
+                ['股票代號', '除權息日']).reset_index(drop = True)
+            now = time.time()
+            for year in years:
+                self.fetched[year] = now
+            self._table = None
+
+    # 尚未計算因子、且已過除權息日的事件
+    def pending(self, last:int) -> 'DataFrame':
+        events = self.events
+        return events[events['價格因子'].isna() & (events['除權息日'] > 0) & (events['除權息日'] <= last)]
+
+    # 填入前收盤與因子
+    def settle(self, index, close:'ndarray'):
+        with self._lock:
+            events = self.events
+            cash = events.loc[index, '現金股利'].to_numpy()
+            shares = 1 + events.loc[index, '股票股利'].to_numpy() / _PAR
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                factor = (close - cash) / (close * shares)
+            # 現金股利不小於股價時，只以配股比例調整
+            factor = np.where(np.isfinite(factor) & (factor > 0), factor, 1 / shares)
+            events.loc[index, '前收盤'] = close
+            events.loc[index, '價格因子'] = factor
+            events.loc[index, '股數因子'] = shares
+            self._table = None
+
+    # 累積因子查詢表
+    def _lookup(self) -> tuple:
+        table = self._table
+        if table is None:
+            events = self.events[self.events['價格因子'].notna()].sort_values(['股票代號', '除權息日'])
+            sids = pd.Index(events['股票代號'].unique()).sort_values()
+            code = sids.get_indexer(events['股票代號'])
+            key = code * 10 ** 8 + events['除權息日'].to_numpy(dtype = np.int64)
+            order = np.argsort(key, kind = 'stable')
+            # 由最新事件往前累乘，第 i 個事件的累積因子涵蓋其本身及之後的事件
+            reverse = events.iloc[order][::-1]
+            price = reverse.groupby('股票代號', sort = False)['價格因子'].cumprod()[::-1].to_numpy()
+            share = reverse.groupby('股票代號', sort = False)['股數因子'].cumprod()[::-1].to_numpy()
+            table = self._table = (sids, code[order], key[order], price, share)
+        return table
+
+    # 累積調整因子
+    def factors(self, dates, sids) -> tuple:
+        '''
+        Parameters
+        ----------
+        :param dates: array-like
+            - 交易日 (datetime)
+
+        :param sids: array-like
+            - 與 dates 等長的股票代號
+
+        Returns
+        ----------
+        tuple of ndarray
+            - (價格因子, 股數因子)，為該日之後所有除權息事件的乘積，無事件時為 1
+        '''
+        table_sids, codes, keys, price, share = self._lookup()
+        if len(keys) == 0:
+            return np.ones(len(sids)), np.ones(len(sids))
+        code = table_sids.get_indexer(pd.Index(sids).astype(str))
+        key = code * 10 ** 8 + _stamp_int(dates)
+        # 第一個除權息日晚於該日的事件
+        idx = np.searchsorted(keys, key, 'right')
+        safe = np.minimum(idx, len(keys) - 1)
+        valid = (code >= 0) & (idx < len(keys)) & (codes[safe] == code)
+        return np.where(valid, price[safe], 1.0), np.where(valid, share[safe], 1.0)
+
+    # 還原股價
+    def apply(self, prices:'DataFrame', sid:str = None) -> 'DataFrame':
+        '''
+        以累積因子換算還原股價與股數
+
+        Parameters
+        ----------
+        :param prices: DataFrame
+            - msp_range 面板 (索引為 日期、股票代號)、ssp_many 長表格，或 ssp 表格 (需指定 sid)
+
+        :param sid: str, default None
+            - prices 為單一股票的 ssp 表格時的股票代號
+
+        Returns
+        ----------
+        DataFrame
+            - 相同形狀的表格，價格欄位乘上價格因子，成交量欄位乘上股數因子
+        '''
+        index = prices.index
+        if isinstance(index, pd.MultiIndex):
+            dates, sids = index.get_level_values('日期'), index.get_level_values('股票代號')
+        elif sid is None:
+            dates, sids = prices['日期'], prices['股票代號']
+        else:
+            dates, sids = prices['日期'], np.full(len(prices), str(sid), dtype = object)
+
+        price, share = self.factors(dates, sids)
+        result = prices.copy()
+        for col in _PRICE_COLS:
+            if col in result.columns:
+                result[col] = result[col].to_numpy(dtype = np.float64, na_value = np.nan) * price
+        for col in _VOLUME_COLS:
+            if col in result.columns:
+                result[col] = result[col].to_numpy(dtype = np.float64, na_value = np.nan) * share
+        return result
+
+    # 保存事件表
+    def save(self):
+        if self.path is None:
+            return
+        folder = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        tmp = self.path + '.{}.tmp'.format(threading.get_ident())
+        with self._lock:
+            pd.to_pickle({'events':self.events, 'fetched':dict(self.fetched)}, tmp)
+        os.replace(tmp, self.path)
+
+class _OwlAdjust():
+    # 啟用除權息事件表
+    def enable_adjust(self, path:str = None, max_age:float = 12 * 3600) -> OwlAdjustment:
+        '''
+        啟用還原股價所需的除權息事件表，指定 path 時保存於本地並於下次啟動時接續使用
+
+        Parameters
+        ----------
+        同 OwlAdjustment
+
+        Returns
+        ----------
+        OwlAdjustment
+        '''
+        self._adjust = OwlAdjustment(path, max_age)
+        return self._adjust
+
+    def _adjustment(self) -> OwlAdjustment:
+        if getattr(self, '_adjust', None) is None:
+            self._adjust = OwlAdjustment()
+        return self._adjust
+
+    # 更新除權息事件
+    def adj_update(self, bpy:str, epy:str = None, max_workers:int = None) -> 'DataFrame':
+        '''
+        以 dpm 全市場查詢更新除權息事件，只查詢需要更新的年度，只對新事件查詢前收盤
+
+        Parameters
+        ----------
+        :param bpy: str
+            - 起始年度，格式:yyyy 4碼
+
+        :param epy: str, default None
+            - 結束年度，格式:yyyy 4碼，未輸入則為今年
+
+        :param max_workers: int, default None
+            - 同時請求數上限，預設為連線池大小
+
+        Returns
+        ----------
+        DataFrame
+            - 事件表: 股票代號、年度、除權息日、現金股利、股票股利、前收盤、價格因子、股數因子
+
+        Notes
+        ----------
+        - 每個年度查詢一次 dpm；前收盤以 msp 查詢，每個除權息日一次
+        - 除權息日不晚於時間表第一個交易日、或前一日無收盤價的事件不計算因子，下次更新時重新查詢
+        '''
+        epy = epy if epy is not None else str(pd.Timestamp.today().year)
+        if not _check_range(self, bpy, epy, 'y'):
+            return None
+        adjust = self._adjustment()
+        if max_workers is None:
+            max_workers = self._session.pool_size
+
+        years = adjust.stale([str(y) for y in range(int(bpy), int(epy) + 1)])
+        if len(years) > 0:
+            events, done = self._adj_events(years, max_workers)
+            if len(done) > 0:
+                adjust.merge(events, done)
+
+        # 已過除權息日的新事件，以前一個交易日的收盤價計算因子
+        calendar = self.calendar('d')
+        today = calendar.prev(pd.Timestamp.today().strftime('%Y%m%d'), inclusive = True)
+        pending = adjust.pending(int(today) if today is not None else 0)
+        keys = calendar.keys
+        pos = np.searchsorted(keys, pending['除權息日'].to_numpy(), 'left')
+        pending, pos = pending[pos > 0], pos[pos > 0]
+        if len(pending) > 0:
+            before = keys[pos - 1]
+            closes = self._adj_closes(sorted(set(before.tolist())), max_workers)
+            close = np.array([closes.get(day, {}).get(sid, np.nan) for day, sid in zip(before, pending['股票代號'])])
+            # 前一日無收盤價 (停牌或查詢失敗) 的事件保留待下次更新，不以配股比例代替
+            settled = np.isfinite(close)
+            adjust.settle(pending.index[settled], close[settled])
+
+        adjust.save()
+        return adjust.events.copy()
+
+    # 查詢各年度的股利，每次配發拆為除息、除權事件
+    def _adj_events(self, years:list, max_workers:int) -> tuple:
+        frames = {}
+        errors = OwlBatchErrors(unit = '年')
+        with ThreadPoolExecutor(max_workers = max_workers) as pool:
+            futures = {pool.submit(_as_bulk, _as_raise, self.dpm, year, _DPM_COLS):year for year in years}
+            for year, temp in _gather(self, futures, errors):
+                frames[year] = temp
+        if len(errors) > 0:
+            print('除權息查詢失敗 {} 年:'.format(len(errors)), ', '.join(sorted(errors)))
+
+        done = [year for year in years if year in frames]
+        if len(done) == 0:
+            return pd.DataFrame(columns = _EVENT_COLS), done
+
+        part = pd.concat([frames[year] for year in done], ignore_index = True).drop_duplicates(_DPM_COLS)
+        sid = part['股票代號'].astype(str).to_numpy()
+        year = pd.to_datetime(part['年度']).to_numpy()
+        cash = pd.to_numeric(part['現金股利合計(元)'], errors = 'coerce').fillna(0).to_numpy(dtype = np.float64)
+        stock = pd.to_numeric(part['股票股利合計(元)'], errors = 'coerce').fillna(0).to_numpy(dtype = np.float64)
+        # 除權息日未公告時為 0，待重新查詢
+        events = pd.concat([
+            pd.DataFrame({'股票代號':sid, '年度':year, '除權息日':_date_int(part['除息日']), '現金股利':cash, '股票股利':0.0}),
+            pd.DataFrame({'股票代號':sid, '年度':year, '除權息日':_date_int(part['除權日']), '現金股利':0.0, '股票股利':stock})
+            ], ignore_index = True)
+        events = events[(events['現金股利'] > 0) | (events['股票股利'] > 0)]
+        # 同日除權息合併，價格因子同時扣除現金股利與配股
+        events = events.groupby(['股票代號', '年度', '除權息日'], as_index = False)[['現金股利', '股票股利']].sum()
+        return events, done
+
+    # 查詢除權息日前一日的收盤價
+    def _adj_closes(self, days:list, max_workers:int) -> dict:
+        closes = {}
+        errors = OwlBatchErrors(unit = '日')
+        with ThreadPoolExecutor(max_workers = max_workers) as pool:
+            futures = {pool.submit(_as_bulk, _as_raise, self.msp, str(day), ['股票代號', '收盤價']):day for day in days}
+            for day, temp in _gather(self, futures, errors):
+                closes[day] = dict(zip(temp['股票代號'].astype(str), temp['收盤價'].to_numpy(dtype = np.float64, na_value = np.nan)))
+        if len(errors) > 0:
+            print('前收盤查詢失敗 {} 日:'.format(len(errors)), ', '.join(str(day) for day in sorted(errors)))
+        return closes
+
+    # 還原股價 多股區間
+    def msp_range_adj(self, bpd:str, epd:str, colist = None, max_workers:int = None) -> 'DataFrame':
+        '''
+        依指定日期區間撈取全市場股價，並換算為還原權值的股價面板
+
+        Parameters
+        ----------
+        同 msp_range
+
+        Returns
+        ----------
+        DataFrame
+            - 以 (日期, 股票代號) 為索引的面板，價格以最新股價為基準向前還原
+
+        Notes
+        ----------
+        - 會先以 adj_update 更新起始年度至今的除權息事件
+        '''
+        panel = self.msp_range(bpd, epd, colist, max_workers = max_workers)
+        if panel is None or self.adj_update(bpd[:4], max_workers = max_workers) is None:
+            return None
+        return self._adjustment().apply(panel)
+
+    # 還原股價 個股
+    def ssp_adj(self, sid:str, bpd:str, epd:str, colist = None) -> 'DataFrame':
+        '''
+        依股票代號撈取指定區間的還原權值股價
+
+        Parameters
+        ----------
+        同 ssp
+
+        Returns
+        ----------
+        DataFrame
+        '''
+        if not _check_sid(self, sid):
+            return None
+        # 需要日期欄位對應因子，未選取時查詢後移除
+        query = colist if colist is None or '日期' in colist else ['日期'] + list(colist)
+        prices = self.ssp(sid, bpd, epd, query)
+        if prices is None or self.adj_update(bpd[:4]) is None:
+            return None
+        result = self._adjustment().apply(prices, sid)
+        return result if query is colist else result.drop(columns = '日期')
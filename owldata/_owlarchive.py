@@ -0,0 +1,248 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import os
+import pandas as pd
+
+from ._owlerror import OwlError, _fail
+from ._owlrate import _as_bulk
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# --------------------
+# BLOCK 欄式儲存
+# --------------------
+# 多股函數對應的商品函數與頻率
+_ARCHIVE_FUNC = {
+    'msp':{'d':'msp'},
+    'chm':{'d':'mch'},
+    'tim':{'d':'mth'},
+    'fim':{'y':'mby', 'q':'mbq', 'm':'mbm'}
+    }
+
+class OwlArchive():
+    _suffix = {'feather':'.feather', 'parquet':'.parquet'}
+
+    def __init__(self, path:str, fmt:str = 'feather', compression:str = None):
+        '''
+        多股資料的欄式儲存，依 商品代碼/頻率/日期 分區
+
+        Parameters
+        ----------
+        :param path: str
+            - 資料夾路徑
+
+        :param fmt: str, default 'feather'
+            - 'feather': Arrow IPC 格式，未壓縮時可記憶體映射零複製讀取
+            - 'parquet': 壓縮率較高，讀取時需解碼
+
+        :param compression: str, default None
+            - 壓縮方式，feather 預設不壓縮，parquet 預設 snappy
+
+        [NOTES]
+        ----------
+            - 需安裝 pyarrow
+            - 讀取時可指定欄位，只載入需要的欄位
+        '''
+        if pa is None:
+            raise ImportError('OwlArchive 需要安裝 pyarrow，請執行 pip install pyarrow')
+        if fmt not in self._suffix:
+            raise ValueError("fmt 請輸入 'feather' 或 'parquet'")
+
+        self.path = path
+        self.fmt = fmt
+        self.compression = compression
+
+    def __repr__(self):
+        return 'OwlArchive(path={}, fmt={})'.format(self.path, self.fmt)
+
+    def _dir(self, pdid:str, freq:str) -> str:
+        return os.path.join(self.path, pdid, freq)
+
+    def _file(self, pdid:str, freq:str, dt:str) -> str:
+        return os.path.join(self._dir(pdid, freq), dt + self._suffix[self.fmt])
+
+    # 寫入分區
+    def save(self, frame:'DataFrame', pdid:str, freq:str, dt:str) -> str:
+        fp = self._file(pdid, freq, dt)
+        if not os.path.exists(os.path.dirname(fp)):
+            os.makedirs(os.path.dirname(fp), exist_ok = True)
+
+        table = pa.Table.from_pandas(frame, preserve_index = False)
+        tmp = fp + '.tmp'
+        if self.fmt == 'feather':
+            feather.write_feather(table, tmp, compression = self.compression or 'uncompressed')
+        else:
+            pq.write_table(table, tmp, compression = self.compression or 'snappy')
+        os.replace(tmp, fp)
+        return fp
+
+    # 分區清單
+    def partitions(self, pdid:str, freq:str, bpd:str = None, epd:str = None) -> list:
+        folder = self._dir(pdid, freq)
+        if not os.path.exists(folder):
+            return []
+        suffix = self._suffix[self.fmt]
+        dts = sorted(f[:-len(suffix)] for f in os.listdir(folder) if f.endswith(suffix))
+        return [dt for dt in dts if (bpd is None or dt >= bpd) and (epd is None or dt <= epd)]
+
+    # 讀取單一分區
+    def read(self, pdid:str, freq:str, dt:str, colist = None, memory_map:bool = True) -> 'pyarrow.Table':
+        fp = self._file(pdid, freq, dt)
+        if self.fmt == 'feather':
+            return feather.read_table(fp, columns = colist, memory_map = memory_map)
+        return pq.read_table(fp, columns = colist, memory_map = memory_map)
+
+    # 讀取區間
+    def load(self, pdid:str, freq:str, bpd:str = None, epd:str = None, colist = None,
+             memory_map:bool = True, as_table:bool = False):
+        '''
+        讀取區間內所有分區並合併
+
+        Parameters
+        ----------
+        :param colist: list, default None
+            - 只讀取指定欄位，未寫輸入則取全部欄位
+
+        :param memory_map: bool, default True
+            - 以記憶體映射開啟檔案
+
+        :param as_table: bool, default False
+            - True 時回傳 pyarrow.Table，不轉換為 DataFrame
+
+        Returns
+        ----------
+        DataFrame or pyarrow.Table
+        '''
+        tables = [self.read(pdid, freq, dt, colist, memory_map) for dt in self.partitions(pdid, freq, bpd, epd)]
+        if len(tables) == 0:
+            return None
+        table = pa.concat_tables(tables, promote_options = 'default') if len(tables) > 1 else tables[0]
+        if as_table:
+            return table
+        return table.to_pandas()
+
+class _OwlArchive():
+    # 啟用欄式儲存
+    def enable_archive(self, path:str, fmt:str = 'feather', compression:str = None) -> OwlArchive:
+        '''
+        啟用多股資料 (msp, chm, tim, fim) 的欄式儲存
+
+        Parameters
+        ----------
+        :param path: str
+            - 資料夾路徑，依 商品代碼/頻率/日期 分區
+
+        :param fmt: str, default 'feather'
+            - 'feather' 或 'parquet'
+
+        :param compression: str, default None
+            - 壓縮方式
+
+        Returns
+        ----------
+        OwlArchive
+        '''
+        self._archive = OwlArchive(path, fmt = fmt, compression = compression)
+        return self._archive
+
+    def _archive_key(self, func:str, di:str):
+        if getattr(self, '_archive', None) is None:
+            _fail(self, 'ExError', ', 請先執行 enable_archive')
+            return None
+        if func not in _ARCHIVE_FUNC:
+            _fail(self, 'ExError', ', 僅支援 ' + ', '.join(_ARCHIVE_FUNC))
+            return None
+        freq = 'd' if func != 'fim' else str(di).lower()
+        if freq not in _ARCHIVE_FUNC[func]:
+            _fail(self, 'YQMError')
+            return None
+        return self._get_pdid(_ARCHIVE_FUNC[func][freq]), freq
+
+    # 下載並寫入分區
+    def archive(self, func:str, dt:str, di:str = None) -> 'DataFrame':
+        '''
+        下載指定日期的多股資料並寫入欄式儲存
+
+        Parameters
+        ----------
+        :param func: str
+            - 'msp', 'chm', 'tim' 或 'fim'
+
+        :param dt: str
+            - 指定日期，格式同原函數
+
+        :param di: str, default None
+            - fim 的資料頻率 y, q, m
+
+        Returns
+        ----------
+        DataFrame
+
+        Notes
+        ----------
+        - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空
+        '''
+        key = self._archive_key(func, di)
+        if key is None:
+            return None
+        pdid, freq = key
+
+        result = _as_bulk(self.fim, di, dt) if func == 'fim' else _as_bulk(getattr(self, func), dt)
+        if result is None or len(result) == 0:
+            return result
+        self._archive.save(result, pdid, freq, dt)
+        return result
+
+    # 讀取分區
+    def load_archive(self, func:str, bpd:str = None, epd:str = None, colist = None, di:str = None,
+                     memory_map:bool = True, as_table:bool = False):
+        '''
+        讀取欄式儲存中指定區間的多股資料
+
+        Parameters
+        ----------
+        :param func: str
+            - 'msp', 'chm', 'tim' 或 'fim'
+
+        :param bpd: str, default None
+            - 起始日期，格式同寫入時的 dt，未輸入則不設限
+
+        :param epd: str, default None
+            - 結束日期，格式同寫入時的 dt，未輸入則不設限
+
+        :param colist: list, default None
+            - 填入欲查看的欄位名稱，只讀取這些欄位
+
+        :param di: str, default None
+            - fim 的資料頻率 y, q, m
+
+        :param memory_map: bool, default True
+            - 以記憶體映射開啟檔案
+
+        :param as_table: bool, default False
+            - True 時回傳 pyarrow.Table
+
+        Returns
+        ----------
+        DataFrame or pyarrow.Table
+        '''
+        key = self._archive_key(func, di)
+        if key is None:
+            return None
+        pdid, freq = key
+        try:
+            return self._archive.load(pdid, freq, bpd, epd, colist, memory_map, as_table)
+        except (KeyError, pa.ArrowInvalid):
+            _fail(self, 'ColumnsError')
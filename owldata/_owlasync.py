@@ -0,0 +1,423 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import asyncio
+import json
+import time
+
+from ._owlerror import OwlError, OwlException, _fail, _fail_http, _fail_connection, _check_range
+from ._owlcache import OwlCache
+from ._owlhttp import OwlRetry
+from ._owlrate import PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+from ._owlmetrics import _Trace
+from .api import _OwlBase
+from ._owltime import OwlCalendar, _CALENDAR
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# --------------------
+# BLOCK 非同步 API
+# --------------------
+class AsyncOwlData(_OwlBase):
+    def __init__(self, auid:str, ausrt:str, max_concurrency:int = 50, timeout:float = 60, cache_dir:str = None,
+                 retry:OwlRetry = None, base_url:str = None, errors:str = 'print'):
+        '''
+        asyncio 版本的 OwlData，所有查詢函數皆為 awaitable
+
+        Parameters
+        ----------
+        :param auid: str
+            - Owl account's appId
+
+        :param ausrt: str
+            - Owl application's secret key
+
+        :param max_concurrency: int, default 50
+            - 同時進行中的請求數上限
+
+        :param timeout: float, default 60
+            - 單次請求逾時秒數
+
+        :param cache_dir: str, default None
+            - 本地快取資料夾，與 OwlData 共用相同格式
+
+        :param retry: OwlRetry, default None
+            - 5xx 與連線錯誤的重試策略，Token 過期時自動重新認證
+
+        :param base_url: str, default None
+            - API 主機，離線重播時填入 OwlReplayServer.url
+
+        :param errors: str, default 'print'
+            - 'print': 輸出錯誤提示並回傳 None
+            - 'raise': 拋出 OwlException 子類別，如 OwlDateError、OwlPermissionError
+
+        [NOTES]
+        ----------
+            - 需安裝 aiohttp
+            - Token、商品表與時間表於所有 task 間共用，只會下載一次
+            - 建議以 async with AsyncOwlData(...) as owlapp 使用
+        '''
+        if aiohttp is None:
+            raise ImportError('AsyncOwlData 需要安裝 aiohttp，請執行 pip install aiohttp')
+
+        super().__init__()
+
+        self.errors = errors
+        self._token = self._token_config(auid, ausrt, base_url)
+        self._data_headers = {}
+        self._fp = None
+        self._cache = OwlCache(cache_dir) if cache_dir is not None else None
+
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.status_code = None
+        self._retry = retry if retry is not None else OwlRetry()
+        self._limiter = None
+        self._metrics = None
+
+        # 於事件迴圈內建立
+        self._http = None
+        self._semaphore = None
+        self._auth_lock = None
+        self._token_lock = None
+        self._table_lock = {}
+
+    def __repr__(self):
+        return '歡迎使用數據貓頭鷹資料庫 (async), 連線狀態: {}'.format(str(self.status_code))
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # 建立連線並取得 Token 與商品表
+    async def connect(self) -> int:
+        if self._http is None:
+            self._http = aiohttp.ClientSession(
+                connector = aiohttp.TCPConnector(limit = self.max_concurrency),
+                timeout = aiohttp.ClientTimeout(total = self.timeout))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._auth_lock = asyncio.Lock()
+            self._token_lock = asyncio.Lock()
+
+        async with self._auth_lock:
+            if self._fp is None:
+                self.status_code = await self._request_token_authorization()
+                if self.status_code == 200:
+                    await self._pdid_map()
+        return self.status_code
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+
+    # Token 取得
+    async def _request_token_authorization(self) -> int:
+        try:
+            status, body = await self._send('POST', self._token['token_url'], auth = False, priority = PRIORITY_INTERACTIVE,
+                                            data = self._token['token_params'],
+                                            headers = self._token['token_headers'])
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            _fail_connection(self, url = self._token['token_url'])
+            return None
+
+        if status == 200:
+            token = json.loads(body).get("token")
+            self._data_headers = {'authorization':'Bearer ' + token}
+            return status
+
+        elif status in OwlError._http_error.keys():
+            _fail_http(self, status, url = self._token['token_url'])
+
+        else:
+            _fail_connection(self, url = self._token['token_url'])
+
+    # Token 過期時重新取得，多個 task 同時收到 401 只重新認證一次
+    async def _reauthorize(self, used:dict):
+        async with self._token_lock:
+            if self._data_headers is used:
+                await self._request_token_authorization()
+
+    # 等待限流額度，不阻塞事件迴圈
+    async def _throttle(self, priority:int, deadline:float):
+        while True:
+            wait = self._limiter.poll(priority)
+            if wait == 0:
+                return
+            if time.monotonic() + wait >= deadline:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(wait)
+
+    # 送出請求: 401 重新認證，5xx 與連線錯誤以指數退避重試，總時間不超過 deadline
+    async def _send(self, method:str, url:str, auth:bool = True, priority:int = PRIORITY_NORMAL, **kwargs) -> tuple:
+        retry = self._retry
+        deadline = time.monotonic() + retry.deadline
+        attempt = 0
+        renewed = False
+        while True:
+            if auth:
+                kwargs['headers'] = self._data_headers
+            if self._limiter is not None:
+                await self._throttle(priority, deadline)
+            kwargs['timeout'] = aiohttp.ClientTimeout(total = retry.clip(self.timeout, deadline - time.monotonic()))
+
+            error = None
+            try:
+                async with self._http.request(method, url, **kwargs) as resp:
+                    status = resp.status
+                    body = await resp.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status, error = None, e
+            else:
+                if auth and status == 401 and not renewed:
+                    renewed = True
+                    await self._reauthorize(kwargs['headers'])
+                    if self._data_headers is not kwargs['headers']:
+                        continue
+                if status not in retry.statuses:
+                    return status, body
+
+            delay = retry.delay(attempt)
+            attempt += 1
+            if attempt > retry.retries or time.monotonic() + delay >= deadline:
+                if error is not None:
+                    raise error
+                return status, body
+            await asyncio.sleep(delay)
+
+    # 取得函數與商品對應表
+    async def _pdid_map(self):
+        get_data_url = self._token['data_url'] + self._token['pythonmap']
+        try:
+            data = await self._data_from_owl(get_data_url)
+        except OwlException:
+            data = 'error'
+        if type(data) == str:
+            get_data_url = self._token['data_url'] + self._token['testmap']
+            data = await self._data_from_owl(get_data_url)
+        self._fp = data.set_index("FuncID")
+        return self._fp
+
+    # 商品時間，所有 task 與 OwlData 共用，只下載一次
+    async def _ensure_table(self, freq:str):
+        key = self._calendar_key(freq)
+        freq = key[1]
+        if key in _CALENDAR:
+            return
+        lock = self._table_lock.setdefault(freq, asyncio.Lock())
+        async with lock:
+            if key in _CALENDAR:
+                return
+            get_data_url = self._token['data_url'] + self._table_code[freq]
+            try:
+                data = await self._data_from_owl(get_data_url)
+            except OwlException:
+                data = 'error'
+            if type(data) == str:
+                get_data_url = self._token['data_url'] + self._table_code_test[freq]
+            if freq == 'd':
+                get_data_url = get_data_url + '/TWA00/9999'
+            table = await self._data_from_owl(get_data_url)
+            _CALENDAR[key] = OwlCalendar(table[table.columns[0]].values, freq)
+
+    def _date_table(self, freq:str):
+        raise RuntimeError('AsyncOwlData 的時間表需以 _ensure_table 非同步載入')
+
+    def _get_pdid(self, funcname:str):
+        if self._fp is None:
+            raise RuntimeError('AsyncOwlData 的商品表需以 connect 非同步載入')
+        return self._fp.loc[funcname].iloc[0]
+
+    # 呼叫 OwlData 資料下載
+    # 啟用效能監控時，http 為送出請求至讀完回應內容的秒數
+    async def _data_from_owl(self, url:str, pdid:str = None, trace:_Trace = None) -> 'DataFrame':
+        func = None
+        if self._cache is not None:
+            func = self._get_func(pdid)
+            body = self._cache.get(url, pdid, func)
+            if body is not None:
+                if trace is not None:
+                    trace.cache = 'hit'
+                return self._decode(body, trace)
+            if trace is not None:
+                trace.cache = 'miss'
+
+        async with self._semaphore:
+            try:
+                start = time.perf_counter()
+                status, body = await self._send('GET', url, priority = self._priority(pdid))
+                if trace is not None:
+                    trace.http, trace.status = time.perf_counter() - start, status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                _fail_connection(self, detail = ', ' + type(e).__name__, pdid = pdid, url = url)
+                return 'error'
+
+        try:
+            if status == 200:
+                # 只解析一次，空資料不寫入快取
+                result = self._decode(body, trace)
+                if self._cache is not None and len(result) > 0:
+                    self._cache.set(url, body, pdid, func)
+                return result
+            else:
+                _fail_http(self, status, pdid = pdid, url = url)
+                return 'error'
+        except OwlException:
+            raise
+        except:
+            return 'error'
+
+    def _decode(self, body:bytes, trace:_Trace = None) -> 'DataFrame':
+        if trace is None:
+            return self._to_frame(body)
+        trace.bytes = len(body)
+        start = time.perf_counter()
+        result = self._to_frame(body)
+        trace.decode = time.perf_counter() - start
+        return result
+
+    # 查詢流程: 檢查日期、載入時間表、組合網址、下載資料、修正資料
+    async def _query(self, req, freqs:tuple, *args) -> 'DataFrame':
+        # 區間查詢的日期先行檢查，輸入錯誤時不連線也不載入時間表
+        if len(freqs) > 0 and not _check_range(self, args[-3], args[-2], freqs[0]):
+            return None
+        # 商品表須於組合網址前以 await 載入，認證失敗時錯誤已由 connect 回報
+        if self._fp is None:
+            await self.connect()
+            if self._fp is None:
+                return None
+        for freq in freqs:
+            await self._ensure_table(freq)
+
+        pdid = get_data_url = ''
+        trace = _Trace() if self._metrics is not None else None
+        try:
+            spec = req(*args)
+            if spec is None:
+                return None
+            get_data_url, pdid, opts = spec
+            result = await self._data_from_owl(get_data_url, pdid, trace)
+            if trace is None:
+                return self._check(result = result, pd_id = pdid, **opts)
+
+            checked = time.perf_counter()
+            result = self._check(result = result, pd_id = pdid, **opts)
+            self._observe(trace, get_data_url, pdid, result, checked)
+            return result
+        except OwlException:
+            if trace is not None and pdid:
+                self._observe(trace, get_data_url, pdid, None, time.perf_counter())
+            raise
+        except:
+            _fail(self, 'PdError', ", 商品代碼: " + pdid, pdid = pdid)
+
+    # 個股日收盤行情 (Single Stock Price)
+    async def ssp(self, sid:str, bpd:str, epd:str, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.ssp
+        '''
+        return await self._query(self._req_ssp, ('d',), sid, bpd, epd, colist)
+
+    # 多股每日收盤行情 (Multi Stock Price)
+    async def msp(self, dt:str, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.msp
+        '''
+        return await self._query(self._req_msp, (), dt, colist)
+
+    # 個股財務簡表 (Financial Statements Single)
+    async def fis(self, sid:str, di:str, bpd:str, epd:str, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.fis
+        '''
+        freqs = (di.lower(),) if di.lower() in self._table_code else ()
+        return await self._query(self._req_fis, freqs, sid, di, bpd, epd, colist)
+
+    # 多股財務簡表 (Financial Statements Multi)
+    async def fim(self, di:str, dt:str, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.fim
+        '''
+        return await self._query(self._req_fim, (), di, dt, colist)
+
+    # 法人籌碼個股歷史資料 (Corporate Chip Single)
+    async def chs(self, sid:str, bpd:str, epd:str, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.chs
+        '''
+        return await self._query(self._req_chs, ('d',), sid, bpd, epd, colist)
+
+    # 法人籌碼多股歷史資料 (Corporate Chip Multi)
+    async def chm(self, dt:str, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.chm
+        '''
+        return await self._query(self._req_chm, (), dt, colist)
+
+    # 技術指標 個股 (Technical indicators Single)
+    async def tis(self, sid:str, bpd:str, epd:str, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.tis
+        '''
+        return await self._query(self._req_tis, ('d',), sid, bpd, epd, colist)
+
+    # 技術指標 多股 (Technical indicators Multi)
+    async def tim(self, dt:str, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.tim
+        '''
+        return await self._query(self._req_tim, (), dt, colist)
+
+    # 公司基本資料 多股 (Company information Multi)
+    async def cim(self, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.cim
+        '''
+        return await self._query(self._req_cim, (), colist)
+
+    # 股利政策 個股 (Dividend Policy Single)
+    async def dps(self, sid:str, bpd:str, epd:str, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.dps
+        '''
+        return await self._query(self._req_dps, ('y',), sid, bpd, epd, colist)
+
+    # 股利政策 多股 (Dividend Policy Multi)
+    async def dpm(self, dt:str, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.dpm
+        '''
+        return await self._query(self._req_dpm, (), dt, colist)
+
+    # 除權除息 個股 (Exemption Dividend Policy Single)
+    async def edps(self, sid:str, bpd:str, epd:str, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.edps
+        '''
+        return await self._query(self._req_edps, ('y',), sid, bpd, epd, colist)
+
+    # 除權除息 多股 (Exemption Dividend Policy Multi)
+    async def edpm(self, dt:str, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.edpm
+        '''
+        return await self._query(self._req_edpm, (), dt, colist)
+
+    # 即時報價 (Timely Stock Price)
+    async def tsp(self, sid:str, colist=None) -> 'DataFrame':
+        '''
+        同 OwlData.tsp
+        '''
+        return await self._query(self._req_tsp, (), sid, colist)
@@ -0,0 +1,386 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+
+from ._owlerror import OwlException, OwlSidError, OwlBatchErrors, _fail, _raising, _as_raise, _check_colist, _check_sid
+from ._owltime import _DATE_SPEC
+from ._owlrate import _as_bulk
+from .config import colist_dict
+
+# --------------------
+# BLOCK 批次查詢
+# --------------------
+# 各頻率的日期欄位
+_DATE_COL = {freq:spec[0] for freq, spec in _DATE_SPEC.items()}
+
+# 依完成順序取出併發結果，失敗項目記錄於 errors；拋出例外模式時遇到第一個錯誤即取消其餘工作並拋出
+def _gather(owl, futures:dict, errors:OwlBatchErrors):
+    fail_fast = _raising(owl)
+    for future in as_completed(futures):
+        target = futures[future]
+        try:
+            temp = future.result()
+            if temp is None or len(temp) == 0:
+                raise OwlSidError()
+        except Exception as e:
+            if isinstance(e, OwlException):
+                e.target = target
+            errors[target] = e
+            if fail_fast:
+                for other in futures:
+                    other.cancel()
+                raise
+            continue
+        yield target, temp
+
+class _OwlBatch():
+    # 多檔個股併發查詢
+    def _batch(self, func, sids:list, args:tuple, freq:str, bpd:str, epd:str,
+               colist = None, max_workers:int = None, callback = None) -> 'DataFrame':
+        '''
+        以有上限的執行緒池併發查詢多檔個股，並合併為長表格
+
+        Parameters
+        ----------
+        :param func: callable
+            - 單檔查詢函數，如 self.ssp
+
+        :param sids: list
+            - 股票代號清單
+
+        :param args: tuple
+            - 股票代號之後的位置參數
+
+        :param freq: str
+            - 資料頻率，決定日期欄位
+
+        :param callback: callable, default None
+            - 每檔完成時呼叫 callback(sid, DataFrame)
+
+        Returns
+        ----------
+        DataFrame
+            - 以 股票代號 與日期欄位排序，失敗清單 (OwlBatchErrors) 記錄於 DataFrame.attrs['errors']
+            - errors = 'raise' 時遇到第一個失敗即停止並拋出例外
+        '''
+        # 先行檢查欄位與日期並載入時間表，避免每個執行緒重複下載
+        if not _check_colist(self, func.__name__, colist, freq):
+            return None
+        if self._date_freq(bpd, epd, freq) == 'error':
+            return None
+
+        date_col = _DATE_COL[freq]
+        if colist is not None and date_col not in colist:
+            colist = [date_col] + list(colist)
+        if max_workers is None:
+            max_workers = self._session.pool_size
+
+        # 股票代號格式錯誤者直接列入失敗清單，不送出請求
+        frames = []
+        errors = OwlBatchErrors(unit = '檔')
+        valid = []
+        for sid in dict.fromkeys(sids):
+            try:
+                _as_raise(_check_sid, self, sid)
+            except OwlSidError as e:
+                e.target = sid
+                errors[sid] = e
+                if _raising(self):
+                    raise
+                continue
+            valid.append(sid)
+
+        with ThreadPoolExecutor(max_workers = max_workers) as pool:
+            futures = {pool.submit(_as_bulk, _as_raise, func, sid, *args, colist = colist):sid for sid in valid}
+            for sid, temp in _gather(self, futures, errors):
+                temp.insert(0, '股票代號', sid)
+                frames.append(temp)
+                if callback is not None:
+                    callback(sid, temp)
+
+        if len(frames) == 0:
+            result = pd.DataFrame(columns = ['股票代號', date_col])
+        else:
+            result = pd.concat(frames, ignore_index = True, sort = False)
+            result.sort_values(['股票代號', date_col], inplace = True)
+            result.reset_index(drop = True, inplace = True)
+
+        if len(errors) > 0:
+            print('批次查詢失敗 {} 檔:'.format(len(errors)), ', '.join(sorted(errors)))
+        result.attrs['errors'] = errors
+        return result
+
+    # 個股日收盤行情 批次 (Single Stock Price Many)
+    def ssp_many(self, sids:list, bpd:str, epd:str, colist = None, max_workers:int = None, callback = None) -> 'DataFrame':
+        '''
+        依指定日期區間，併發撈取多檔股票的股價資訊
+
+        Parameters
+        ----------
+        :param sids: list
+            - 台股股票代號清單
+
+        :param bpd: str
+            - 起始日，格式:yyyymmdd 8碼
+
+        :param epd: str
+            - 結束日，格式:yyyymmdd 8碼
+
+        :param colist: list, default None
+            - 填入欲查看的欄位名稱，未寫輸入則取全部欄位
+
+        :param max_workers: int, default None
+            - 同時請求數上限，預設為連線池大小
+
+        :param callback: callable, default None
+            - 每檔完成時呼叫 callback(sid, DataFrame)
+
+        Returns
+        ----------
+        DataFrame
+
+        Notes
+        ----------
+        - 以 股票代號、日期 排序的長表格
+        - 個別股票失敗不會中斷批次，失敗清單記錄於 DataFrame.attrs['errors']
+        - attrs['errors'].retryable() 為可重試的股票，可再傳入 ssp_many
+
+        '''
+        return self._batch(self.ssp, sids, (bpd, epd), 'd', bpd, epd, colist, max_workers, callback)
+
+    # 法人籌碼個股 批次 (Corporate Chip Single Many)
+    def chs_many(self, sids:list, bpd:str, epd:str, colist = None, max_workers:int = None, callback = None) -> 'DataFrame':
+        '''
+        依指定日期區間，併發撈取多檔股票的三大法人買賣狀況與融資券狀況
+
+        Parameters
+        ----------
+        同 ssp_many
+
+        Returns
+        ----------
+        DataFrame
+        '''
+        return self._batch(self.chs, sids, (bpd, epd), 'd', bpd, epd, colist, max_workers, callback)
+
+    # 技術指標個股 批次 (Technical indicators Single Many)
+    def tis_many(self, sids:list, bpd:str, epd:str, colist = None, max_workers:int = None, callback = None) -> 'DataFrame':
+        '''
+        依指定日期區間，併發撈取多檔股票的技術指標數值
+
+        Parameters
+        ----------
+        同 ssp_many
+
+        Returns
+        ----------
+        DataFrame
+        '''
+        return self._batch(self.tis, sids, (bpd, epd), 'd', bpd, epd, colist, max_workers, callback)
+
+    # 個股財務簡表 批次 (Financial Statements Single Many)
+    def fis_many(self, sids:list, di:str, bpd:str, epd:str, colist = None, max_workers:int = None, callback = None) -> 'DataFrame':
+        '''
+        依據 di 決定查詢資料頻率，併發撈取多檔股票指定區間的財務報表資訊
+
+        Parameters
+        ----------
+        :param di: str
+            - 查詢資料時間頻率，y = 年度, q = 季度, m = 月份
+
+        其餘參數同 ssp_many
+
+        Returns
+        ----------
+        DataFrame
+        '''
+        if di.lower() not in ('y', 'q', 'm'):
+            _fail(self, 'YQMError')
+            return None
+        return self._batch(self.fis, sids, (di, bpd, epd), di.lower(), bpd, epd, colist, max_workers, callback)
+
+    # 股利政策個股 批次 (Dividend Policy Single Many)
+    def dps_many(self, sids:list, bpd:str, epd:str, colist = None, max_workers:int = None, callback = None) -> 'DataFrame':
+        '''
+        依據指定年度區間，併發撈取多檔股票的配發股利狀況表
+
+        Parameters
+        ----------
+        :param bpd: str
+            - 起始年度，格式:yyyy 4碼
+
+        :param epd: str
+            - 結束年度，格式:yyyy 4碼
+
+        其餘參數同 ssp_many
+
+        Returns
+        ----------
+        DataFrame
+        '''
+        return self._batch(self.dps, sids, (bpd, epd), 'y', bpd, epd, colist, max_workers, callback)
+
+    # 除權除息個股 批次 (Exemption Dividend Policy Single Many)
+    def edps_many(self, sids:list, bpd:str, epd:str, colist = None, max_workers:int = None, callback = None) -> 'DataFrame':
+        '''
+        依據指定年度區間，併發撈取多檔股票的股東會日期及停止過戶的相關日期
+
+        Parameters
+        ----------
+        同 dps_many
+
+        Returns
+        ----------
+        DataFrame
+        '''
+        return self._batch(self.edps, sids, (bpd, epd), 'y', bpd, epd, colist, max_workers, callback)
+
+    # 多股多日併發查詢
+    def _range(self, name:str, bpd:str, epd:str, colist = None, max_workers:int = None,
+               callback = None, as_array:bool = False):
+        '''
+        以交易日表列出區間內交易日，併發查詢各日多股資料，合併為 (日期, 股票代號) 索引的面板
+
+        Parameters
+        ----------
+        :param name: str
+            - 多股函數名稱，如 'msp'
+
+        :param as_array: bool, default False
+            - True 時回傳 (array, dates, sids, fields)，array 形狀為 日期 x 股票 x 數值欄位，缺值為 NaN
+
+        Returns
+        ----------
+        DataFrame or tuple
+            - 失敗日期 (OwlBatchErrors) 記錄於 DataFrame.attrs['errors']
+        '''
+        if not _check_colist(self, name, colist) or self._date_freq(bpd, epd, 'd') == 'error':
+            return None
+        days = [str(day) for day in self.calendar('d').range(bpd, epd)]
+
+        # 索引欄位一併查詢，日期欄位僅在商品有提供時加入
+        if colist is not None:
+            keys = [col for col in ('股票代號', '日期') if col in colist_dict[name] and col not in colist]
+            colist = keys + list(colist)
+        if max_workers is None:
+            max_workers = self._session.pool_size
+
+        func = getattr(self, name)
+        frames = {}
+        errors = OwlBatchErrors(unit = '日')
+        with ThreadPoolExecutor(max_workers = max_workers) as pool:
+            futures = {pool.submit(_as_bulk, _as_raise, func, day, colist = colist):day for day in days}
+            for day, temp in _gather(self, futures, errors):
+                if '日期' not in temp.columns:
+                    temp.insert(0, '日期', pd.Timestamp(day))
+                frames[day] = temp
+                if callback is not None:
+                    callback(day, temp)
+
+        if len(errors) > 0:
+            print('區間查詢失敗 {} 日:'.format(len(errors)), ', '.join(sorted(errors)))
+
+        if len(frames) == 0:
+            result = pd.DataFrame(index = pd.MultiIndex.from_arrays([[], []], names = ['日期', '股票代號']))
+        else:
+            parts = [frames[day] for day in sorted(frames)]
+            result = pd.concat(parts, ignore_index = True, sort = False)
+            # 各日類別不同時合併後為 object，統一轉回類別
+            for col in parts[0].columns:
+                if isinstance(parts[0][col].dtype, pd.CategoricalDtype) and not isinstance(result[col].dtype, pd.CategoricalDtype):
+                    result[col] = result[col].astype('category')
+            result = result.set_index(['日期', '股票代號']).sort_index()
+        result.attrs['errors'] = errors
+
+        if as_array:
+            return self._panel_array(result)
+        return result
+
+    # 面板轉為 日期 x 股票 x 欄位 陣列
+    @staticmethod
+    def _panel_array(panel:'DataFrame') -> tuple:
+        values = panel.select_dtypes(include = 'number')
+        dates = panel.index.levels[0][panel.index.levels[0].isin(panel.index.get_level_values(0))]
+        sids = panel.index.levels[1][panel.index.levels[1].isin(panel.index.get_level_values(1))]
+
+        array = np.full((len(dates), len(sids), values.shape[1]), np.nan)
+        i = dates.get_indexer(panel.index.get_level_values(0))
+        j = sids.get_indexer(panel.index.get_level_values(1))
+        array[i, j] = values.to_numpy(dtype = np.float64, na_value = np.nan)
+        return array, dates, sids, list(values.columns)
+
+    # 多股日收盤行情 區間 (Multi Stock Price Range)
+    def msp_range(self, bpd:str, epd:str, colist = None, max_workers:int = None, callback = None, as_array:bool = False):
+        '''
+        依指定日期區間，併發撈取每個交易日全部股票的股價資訊
+
+        Parameters
+        ----------
+        :param bpd: str
+            - 起始日，格式:yyyymmdd 8碼
+
+        :param epd: str
+            - 結束日，格式:yyyymmdd 8碼
+
+        :param colist: list, default None
+            - 填入欲查看的欄位名稱，未寫輸入則取全部欄位
+
+        :param max_workers: int, default None
+            - 同時請求數上限，預設為連線池大小
+
+        :param callback: callable, default None
+            - 每日完成時呼叫 callback(dt, DataFrame)
+
+        :param as_array: bool, default False
+            - True 時回傳 (array, dates, sids, fields)，array 為 日期 x 股票 x 數值欄位
+
+        Returns
+        ----------
+        DataFrame or tuple
+
+        Notes
+        ----------
+        - 以 (日期, 股票代號) 為索引的面板，一次合併
+        - 個別日期失敗不會中斷查詢，失敗清單記錄於 DataFrame.attrs['errors']
+
+        '''
+        return self._range('msp', bpd, epd, colist, max_workers, callback, as_array)
+
+    # 法人籌碼多股 區間 (Corporate Chip Multi Range)
+    def chm_range(self, bpd:str, epd:str, colist = None, max_workers:int = None, callback = None, as_array:bool = False):
+        '''
+        依指定日期區間，併發撈取每個交易日全部股票的三大法人買賣狀況與融資券狀況
+
+        Parameters
+        ----------
+        同 msp_range
+
+        Returns
+        ----------
+        DataFrame or tuple
+        '''
+        return self._range('chm', bpd, epd, colist, max_workers, callback, as_array)
+
+    # 技術指標多股 區間 (Technical indicators Multi Range)
+    def tim_range(self, bpd:str, epd:str, colist = None, max_workers:int = None, callback = None, as_array:bool = False):
+        '''
+        依指定日期區間，併發撈取每個交易日全部股票的技術指標數值
+
+        Parameters
+        ----------
+        同 msp_range
+
+        Returns
+        ----------
+        DataFrame or tuple
+        '''
+        return self._range('tim', bpd, epd, colist, max_workers, callback, as_array)
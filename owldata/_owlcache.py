@@ -0,0 +1,242 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import datetime
+import gzip
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+
+# --------------------
+# BLOCK 本地快取
+# --------------------
+# 函數對應的資料頻率，用以判斷查詢區間是否已收盤
+_FUNC_FREQ = {
+    'ssp':'d', 'msp':'d', 'sch':'d', 'mch':'d', 'sth':'d', 'mth':'d',
+    'sby':'y', 'mby':'y', 'scm1':'y', 'mcm1':'y', 'scm2':'y', 'mcm2':'y',
+    'sbq':'q', 'mbq':'q',
+    'sbm':'m', 'mbm':'m'
+    }
+
+# 期末日之後資料仍可能補齊的日數，期間內的回應依 ttl 過期
+# - 日資料: 盤後與夜間陸續更新
+# - 月營收: 次月 10 日；財報: 第一至三季 45 日，第四季與年報 90 日
+# - 股利政策 (scm1 / mcm1): 年度股利於次年股東會後公告並陸續除權息
+# - 除權除息 (scm2 / mcm2): 當年度事件於年底前公告
+_LAGS = {
+    'ssp':1, 'msp':1, 'sch':1, 'mch':1, 'sth':1, 'mth':1,
+    'sbm':10, 'mbm':10,
+    'sbq':45, 'mbq':45,
+    'sby':90, 'mby':90,
+    'scm1':366, 'mcm1':366,
+    'scm2':31, 'mcm2':31
+    }
+
+# 第四季財報的公告期限同年報
+_Q4_LAG = 90
+
+# 季資料網址的月份欄位: 個股 (sbq) 為季別 01-04，多股 (mbq) 為季初月份 01、04、07、10
+_QUARTER_START = ('mbq',)
+
+# 網址中的基準日期 .../date/yyyymmdd/...
+_URL_DATE = re.compile(r'/date/(\d{8})/')
+
+class OwlCache():
+    # 預設規則: 即時報價不快取
+    _default_rules = {'mnp':0, 'tsp':0}
+
+    def __init__(self, path:str, max_bytes:int = 512 * 1024 ** 2, ttl:int = 3600, rules:dict = None):
+        '''
+        OwlData 回應資料的本地磁碟快取
+
+        Parameters
+        ----------
+        :param path: str
+            - 快取資料夾路徑，不存在時自動建立
+
+        :param max_bytes: int, default 512MB
+            - 快取容量上限，超過時依最久未使用的順序淘汰
+
+        :param ttl: int, default 3600
+            - 未過公告期限的區間 (含商品表、時間表) 的預設存活秒數
+
+        :param rules: dict, default None
+            - 個別商品的存活秒數，鍵值可為函數名稱 (如 'ssp') 或商品代碼
+            - 0 表示不快取，None 表示永不過期
+
+        [NOTES]
+        ----------
+            - 以商品代碼與請求網址作為快取鍵值
+            - 已過公告期限的歷史區間永不過期，期限內依 ttl 過期，即時報價 (tsp) 不快取
+        '''
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.rules = dict(self._default_rules)
+        if rules is not None:
+            self.rules.update(rules)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        self._size = sum(os.path.getsize(os.path.join(self.path, f)) for f in self._files())
+
+    def __repr__(self):
+        return 'OwlCache(path={}, hits={}, misses={}, size={})'.format(self.path, self.hits, self.misses, self._size)
+
+    def _files(self) -> list:
+        return [f for f in os.listdir(self.path) if f.endswith('.owl')]
+
+    def _key(self, url:str, pdid:str) -> str:
+        return hashlib.sha1((str(pdid) + '|' + url).encode('utf-8')).hexdigest() + '.owl'
+
+    # 計算存活期限
+    def expires(self, url:str, pdid:str = None, func:str = None):
+        '''
+        依規則計算快取到期時間
+
+        Returns
+        ----------
+        :float: 到期時間 (epoch 秒)，None 表示永不過期，0 表示不快取
+        '''
+        for key in (func, pdid):
+            if key in self.rules:
+                ttl = self.rules[key]
+                return None if ttl is None else (time.time() + ttl if ttl > 0 else 0)
+
+        match = _URL_DATE.search(url)
+        if match and func in _FUNC_FREQ and self._closed(match.group(1), _FUNC_FREQ[func], _LAGS.get(func, 0), func in _QUARTER_START):
+            return None
+        return time.time() + self.ttl
+
+    # 判斷區間是否已過公告期限，季資料網址為 yyyyqq01 (quarter_start 時為季初月份 yyyymm01)
+    def _closed(self, dt:str, freq:str, lag:int = 0, quarter_start:bool = False) -> bool:
+        year, month = int(dt[0:4]), int(dt[4:6])
+        if freq == 'y':
+            end = datetime.date(year, 12, 31)
+        elif freq in ('q', 'm'):
+            if freq == 'q':
+                quarter = (month - 1) // 3 + 1 if quarter_start else month
+                lag = max(lag, _Q4_LAG) if quarter == 4 else lag
+                month = quarter * 3
+            end = datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days = 1)
+        else:
+            end = datetime.date(year, month, int(dt[6:8]))
+        return end + datetime.timedelta(days = lag) < datetime.date.today()
+
+    # 讀取快取
+    def get(self, url:str, pdid:str = None, func:str = None):
+        '''
+        取出快取內容，不存在、已過期或不快取的商品回傳 None
+        '''
+        if self.rules.get(func, self.rules.get(pdid)) == 0:
+            return None
+
+        fp = os.path.join(self.path, self._key(url, pdid))
+        try:
+            with gzip.open(fp, 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if entry['expires'] is not None and entry['expires'] < time.time():
+            self._remove(fp)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # 更新使用時間，作為淘汰依據
+        try:
+            os.utime(fp)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry['body']
+
+    # 寫入快取
+    def set(self, url:str, body:bytes, pdid:str = None, func:str = None):
+        expires = self.expires(url, pdid, func)
+        if expires == 0:
+            return
+
+        fp = os.path.join(self.path, self._key(url, pdid))
+        tmp = fp + '.{}.{}.tmp'.format(os.getpid(), threading.get_ident())
+        with gzip.open(tmp, 'wb') as f:
+            pickle.dump({'url':url, 'pdid':pdid, 'expires':expires, 'body':body}, f, protocol = pickle.HIGHEST_PROTOCOL)
+
+        with self._lock:
+            if os.path.exists(fp):
+                self._size -= os.path.getsize(fp)
+            os.replace(tmp, fp)
+            self._size += os.path.getsize(fp)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    # 依最久未使用淘汰
+    def _evict(self):
+        entries = []
+        for f in self._files():
+            fp = os.path.join(self.path, f)
+            try:
+                stat = os.stat(fp)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, fp))
+        entries.sort()
+
+        self._size = sum(e[1] for e in entries)
+        for _, size, fp in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(fp)
+                self._size -= size
+            except OSError:
+                pass
+
+    def _remove(self, fp:str):
+        with self._lock:
+            try:
+                size = os.path.getsize(fp)
+                os.remove(fp)
+                self._size -= size
+            except OSError:
+                pass
+
+    # 清空快取
+    def clear(self):
+        with self._lock:
+            for f in self._files():
+                try:
+                    os.remove(os.path.join(self.path, f))
+                except OSError:
+                    pass
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    # 快取狀態
+    def info(self) -> dict:
+        '''
+        Returns
+        ----------
+        :dict: hits - 命中次數, misses - 未命中次數, entries - 筆數, bytes - 佔用容量
+        '''
+        with self._lock:
+            return {'hits':self.hits, 'misses':self.misses,
+                    'entries':len(self._files()), 'bytes':self._size}
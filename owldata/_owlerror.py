@@ -6,9 +6,13 @@
 # author: Danny, Destiny
 
 # =====================================================================
+import contextvars
+import datetime
 import pandas as pd
 from functools import wraps 
 
+from .config import colist_dict
+
 # --------------------
 # BLOCK 除錯
 # --------------------
@@ -55,50 +59,29 @@ class OwlError():
     def http(cls):
         return pd.Series(cls._http_error)
     
+    @classmethod
+    def exception(cls, key:str) -> type:
+        '''
+        錯誤代號對應的例外類別，如 'DayError' -> OwlDateError
+        '''
+        return _KEY_EXCEPTION.get(key, OwlException)
+    
+    @classmethod
+    def http_exception(cls, status:int) -> type:
+        '''
+        HTTP 狀態碼對應的例外類別，如 404 -> OwlNotFoundError
+        '''
+        if status in _HTTP_EXCEPTION:
+            return _HTTP_EXCEPTION[status]
+        return OwlServerError if status is not None and status >= 500 else OwlHTTPError
+    
     def _check_dt(di = 'd'):
         def inner_function(func):
             @wraps(func)
             def wrap(self, dt, colist = None):
-                season = ['0' + str(x) for x in range(5,13)]
-                
-                if di.lower() == 'y':
-                    if len(dt) != 4:
-                        print('YearError:',OwlError._dicts['YearError'])
-                        return None
-                    try:
-                        dts = pd.to_datetime(dt, format = '%Y')             
-                    except ValueError:
-                        print('ValueError:', OwlError._dicts["ValueError"])
-                        return None
-                    
-                elif di.lower() == 'm':
-                    if len(dt) != 6:
-                        print('MonthError:',OwlError._dicts['MonthError'])
-                        return None
-                    try:
-                        dts = pd.to_datetime(dt, format = '%Y%m')              
-                    except ValueError:
-                        print('ValueError:', OwlError._dicts["ValueError"])
-                        return None
-                    
-                elif di.lower() == 'q':
-                    if len(dt) != 6:
-                        print('SeasonError:',OwlError._dicts['SeasonError'])
-                        return None
-                    if dt[4:6] in season:
-                        print('SeasonError2:',OwlError._dicts['SeasonError2'])
-                        return None
-                    
-                elif di.lower() == 'd':  
-                    if len(dt) != 8:
-                        print('DayError:',OwlError._dicts['DayError'])
-                        return None
-                    
-                    try:
-                        dts = pd.to_datetime(dt)
-                    except ValueError:
-                        print('ValueError:', OwlError._dicts["ValueError"])
-                        return None
+                key = _date_error(dt, di.lower())
+                if key is not None:
+                    return _fail(self, key)
                 return func(self, dt, colist)
             return wrap
         return inner_function
@@ -106,45 +89,277 @@ class OwlError():
     def _check_di(func):
         @wraps(func)
         def wrap(self, di, dt, colist = None):
-            
-            season = ['0' + str(x) for x in range(5,13)]
-            
-            if di.lower() == 'y':
-                if len(dt) != 4:
-                    print('YearError:',OwlError._dicts['YearError'])
-                    return None
-                try:
-                    dts = pd.to_datetime(dt, format = '%Y')             
-                except ValueError:
-                    print('ValueError:', OwlError._dicts["ValueError"])
-                    return None
-   
-            elif di.lower() == 'm':
-                if len(dt) != 6:
-                    print('MonthError:',OwlError._dicts['MonthError'])
-                    return None
-                try:
-                    dts = pd.to_datetime(dt, format = '%Y%m')              
-                except ValueError:
-                    print('ValueError:', OwlError._dicts["ValueError"])
-                    return None
-
-            elif di.lower() == 'q':
-                if len(dt) != 6:
-                    print('SeasonError:',OwlError._dicts['SeasonError'])
-                    return None
-                if dt[4:6] in season:
-                    print('SeasonError2:',OwlError._dicts['SeasonError2'])
-                    return None
-                
-            elif di.lower() == 'd':  
-                if len(dt) != 8:
-                    print('DayError:',OwlError._dicts['DayError'])
-                    return None 
-                try:
-                    dts = pd.to_datetime(dt)
-                except ValueError:
-                    print('ValueError:', OwlError._dicts["ValueError"])
-                    return None
+            freq = di.lower() if isinstance(di, str) else di
+            if freq in _DATE_SIZE:
+                key = _date_error(dt, freq)
+                if key is not None:
+                    return _fail(self, key)
             return func(self, di, dt, colist)
         return wrap
+
+# --------------------
+# BLOCK 輸入檢查
+# --------------------
+# 送出請求前的檢查，只做字串與整數比對，不載入時間表也不呼叫 pd.to_datetime
+
+# 各頻率的日期長度與長度不符時的錯誤代號
+_DATE_SIZE = {'y':(4, 'YearError'), 'm':(6, 'MonthError'), 'q':(6, 'SeasonError'), 'd':(8, 'DayError')}
+
+_QUARTERS = ('01', '02', '03', '04')
+
+# 各函數 (與頻率) 的欄位集合
+_COLUMNS = {}
+for _func, _cols in colist_dict.items():
+    if isinstance(_cols, dict):
+        for _freq, _names in _cols.items():
+            _COLUMNS[(_func, _freq)] = frozenset(_names)
+    else:
+        _COLUMNS[(_func, None)] = frozenset(_cols)
+
+# 日期格式檢查，回傳錯誤代號，正確時回傳 None
+def _date_error(dt:str, freq:str) -> str:
+    size, key = _DATE_SIZE[freq]
+    if not isinstance(dt, str) or len(dt) != size:
+        return key
+    if not (dt.isascii() and dt.isdigit()) or int(dt[:4]) == 0:
+        return 'ValueError'
+    if freq == 'q':
+        return None if dt[4:6] in _QUARTERS else 'SeasonError2'
+    if freq == 'm' and not '01' <= dt[4:6] <= '12':
+        return 'ValueError'
+    if freq == 'd':
+        try:
+            datetime.date(int(dt[:4]), int(dt[4:6]), int(dt[6:8]))
+        except ValueError:
+            return 'ValueError'
+    return None
+
+# 區間檢查: 頻率、起迄日期格式與先後順序
+def _check_range(owl, start:str, end:str, freq:str) -> bool:
+    if freq not in _DATE_SIZE:
+        _fail(owl, 'YQMError')
+        return False
+    for dt in (start, end):
+        key = _date_error(dt, freq)
+        if key is not None:
+            _fail(owl, key)
+            return False
+    if int(start) > int(end):
+        _fail(owl, 'DateError')
+        return False
+    return True
+
+# 欄位檢查，依 config.colist_dict (付費等級的完整欄位)，送出請求前即擋下不存在的欄位
+def _check_colist(owl, func:str, colist, freq:str = None) -> bool:
+    if colist is None:
+        return True
+    names = [colist] if isinstance(colist, str) else colist
+    if len(names) == 0:
+        _fail(owl, 'ColumnsError', ', 請輸入欄位')
+        return False
+    known = _COLUMNS.get((func, freq), _COLUMNS.get((func, None)))
+    unknown = [name for name in names if not isinstance(name, str) or (known is not None and name not in known)]
+    if len(unknown) > 0:
+        _fail(owl, 'ColumnsError', ': ' + ', '.join(map(str, unknown)))
+        return False
+    return True
+
+# 股票代號檢查: 非空字串，不含空白與 /
+def _check_sid(owl, sid:str) -> bool:
+    if isinstance(sid, str) and sid and not any(char in sid for char in ' /\t\n?#'):
+        return True
+    _fail(owl, 'SidError', ', 股票代號: ' + repr(sid))
+    return False
+
+# --------------------
+# BLOCK 例外類別
+# --------------------
+# 目前執行緒或 task 的錯誤處理方式，None 時依 OwlData.errors
+_ERRORS = contextvars.ContextVar('owl_errors', default = None)
+
+class OwlException(Exception):
+    # 錯誤代號，對應 OwlError._dicts
+    key = 'ExError'
+
+    # 是否值得重試
+    retryable = False
+
+    def __init__(self, key:str = None, detail:str = '', status:int = None, pdid:str = None, url:str = None):
+        '''
+        owldata 例外的基底類別
+
+        [NOTES]
+        ----------
+            - key: 錯誤代號，如 'DayError'、'PdError'
+            - message: OwlError 對應的提示訊息
+            - status, pdid, url: 可得時記錄 HTTP 狀態碼、商品代碼與網址
+            - target: 批次查詢時為失敗的股票代號或日期
+        '''
+        if key is not None:
+            self.key = key
+        self.message = OwlError._dicts.get(self.key, '') + detail
+        self.status = status
+        self.pdid = pdid
+        self.url = url
+        self.target = None
+        super().__init__(self.message)
+
+    def __str__(self):
+        return '{}: {}'.format(self.key, self.message)
+
+    # 複製或序列化時保留屬性，DataFrame.attrs 會複製錯誤報告
+    def __reduce__(self):
+        return _rebuild, (type(self), self.args, self.__dict__)
+
+def _rebuild(cls, args:tuple, state:dict) -> 'OwlException':
+    error = cls.__new__(cls, *args)
+    error.args = args
+    error.__dict__.update(state)
+    return error
+
+class OwlInputError(OwlException, ValueError):
+    '''
+    參數輸入錯誤，送出請求前即可判斷
+    '''
+
+class OwlDateError(OwlInputError):
+    key = 'DayError'
+
+class OwlColumnError(OwlInputError):
+    key = 'ColumnsError'
+
+class OwlSidError(OwlException, LookupError):
+    '''
+    查無資料，股票代號錯誤或該期間無資料
+    '''
+    key = 'SidError'
+
+class OwlPermissionError(OwlException, PermissionError):
+    '''
+    未開通商品權限，或回應無法解析
+    '''
+    key = 'PdError'
+
+class OwlConnectionError(OwlException, ConnectionError):
+    key = 'ConnectionError'
+    retryable = True
+
+    def __init__(self, detail:str = '', **info):
+        super().__init__(detail = detail, **info)
+        self.message = '連線錯誤，請洽業務人員' + detail
+        self.args = (self.message,)
+
+class OwlHTTPError(OwlException):
+    key = 'HTTPError'
+
+    def __init__(self, status:int, detail:str = '', **info):
+        super().__init__(detail = detail, status = status, **info)
+        self.message = OwlError._http_error.get(status, 'HTTP 錯誤') + detail
+        self.args = (self.message,)
+
+    def __str__(self):
+        return '錯誤代碼: {} {}'.format(self.status, self.message)
+
+class OwlAuthError(OwlHTTPError, PermissionError):
+    '''
+    401 認證失敗或 403 無存取權限
+    '''
+
+class OwlNotFoundError(OwlHTTPError, LookupError):
+    pass
+
+class OwlServerError(OwlHTTPError):
+    retryable = True
+
+# 錯誤代號對應的例外類別
+_KEY_EXCEPTION = {
+    'YearError':OwlDateError, 'SeasonError':OwlDateError, 'SeasonError2':OwlDateError,
+    'MonthError':OwlDateError, 'DayError':OwlDateError, 'DateError':OwlDateError,
+    'ValueError':OwlDateError, 'CannotFind':OwlDateError,
+    'YQMError':OwlInputError, 'ExError':OwlInputError,
+    'ColumnsError':OwlColumnError,
+    'SidError':OwlSidError,
+    'PdError':OwlPermissionError
+    }
+
+_HTTP_EXCEPTION = {401:OwlAuthError, 403:OwlAuthError, 404:OwlNotFoundError}
+
+def _raising(owl) -> bool:
+    mode = _ERRORS.get()
+    if mode is None:
+        mode = getattr(owl, 'errors', 'print')
+    return mode == 'raise'
+
+# 依錯誤處理方式輸出提示或拋出例外，輸出提示時回傳 None
+def _fail(owl, key:str, detail:str = '', **info):
+    if _raising(owl):
+        raise OwlError.exception(key)(key, detail, **info)
+    print(key + ':', OwlError._dicts[key] + detail)
+
+def _fail_http(owl, status:int, **info):
+    if _raising(owl):
+        raise OwlError.http_exception(status)(status, **info)
+    if status in OwlError._http_error:
+        print('錯誤代碼: {} '.format(status), OwlError._http_error[status])
+
+def _fail_connection(owl, **info):
+    if _raising(owl):
+        raise OwlConnectionError(**info)
+    print("連線錯誤，請洽業務人員")
+
+# 以拋出例外的方式執行，供批次查詢收集各檔的錯誤
+def _as_raise(func, *args, **kwargs):
+    token = _ERRORS.set('raise')
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _ERRORS.reset(token)
+
+# 批次查詢的錯誤報告
+class OwlBatchErrors(dict):
+    def __init__(self, errors:dict = None, unit:str = '檔'):
+        '''
+        批次查詢失敗的項目，{股票代號或日期: OwlException}
+
+        [NOTES]
+        ----------
+            - 存於批次查詢結果的 DataFrame.attrs['errors']
+            - classify() 依例外類別分組，retryable() 列出可重試的項目
+        '''
+        super().__init__(errors or {})
+        self.unit = unit
+
+    def __repr__(self):
+        return 'OwlBatchErrors({} {}: {})'.format(len(self), self.unit, dict.__repr__(self.classify()))
+
+    # 依例外類別分組
+    def classify(self) -> dict:
+        groups = {}
+        for target, error in sorted(self.items()):
+            groups.setdefault(type(error).__name__, []).append(target)
+        return groups
+
+    # 可重試的項目，如連線錯誤與 5xx
+    def retryable(self) -> list:
+        return sorted(target for target, error in self.items() if getattr(error, 'retryable', False))
+
+    # 不需重試的項目，如查無資料與權限不足
+    def permanent(self) -> list:
+        return sorted(target for target, error in self.items() if not getattr(error, 'retryable', False))
+
+    def frame(self) -> 'DataFrame':
+        '''
+        Returns
+        ----------
+        DataFrame
+            - target, type, key, status, message
+        '''
+        rows = [(target, type(error).__name__, getattr(error, 'key', None), getattr(error, 'status', None),
+                 getattr(error, 'message', str(error))) for target, error in sorted(self.items())]
+        return pd.DataFrame(rows, columns = ['target', 'type', 'key', 'status', 'message'])
+
+    # 有失敗項目時拋出第一個例外
+    def raise_first(self):
+        if len(self) > 0:
+            target = sorted(self)[0]
+            raise self[target]
@@ -0,0 +1,134 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import random
+import requests
+from requests.adapters import HTTPAdapter
+
+# --------------------
+# BLOCK 連線池
+# --------------------
+class OwlSession():
+    def __init__(self, pool_size:int = 10, timeout = (10, 60), keep_alive:bool = True):
+        '''
+        共用的 HTTP 連線池
+
+        Parameters
+        ----------
+        :param pool_size: int, default 10
+            - 每個主機保留的連線數上限
+
+        :param timeout: float or tuple, default (10, 60)
+            - 連線與讀取逾時秒數，(connect, read)
+
+        :param keep_alive: bool, default True
+            - 是否保持連線重複使用
+
+        [NOTES]
+        ----------
+            - 所有資料請求共用同一組 TCP/TLS 連線，避免每次請求重新交握
+        '''
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+
+        self._adapter = HTTPAdapter(pool_connections = pool_size, pool_maxsize = pool_size, pool_block = False)
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+
+    def __repr__(self):
+        return 'OwlSession(pool_size={}, timeout={})'.format(self.pool_size, self.timeout)
+
+    def request(self, method:str, url:str, **kwargs) -> 'Response':
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    # 連線池狀態
+    def stats(self) -> dict:
+        '''
+        Returns
+        ----------
+        :dict: 以主機為鍵值
+            - connections: 累計建立的連線數
+            - requests: 累計送出的請求數
+            - idle: 目前閒置可重複使用的連線數
+            - reuse: 連線重複使用率 (1 - connections / requests)
+        '''
+        result = {}
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = '{}://{}:{}'.format(pool.scheme, pool.host, pool.port)
+            result[host] = {
+                'connections':pool.num_connections,
+                'requests':pool.num_requests,
+                'idle':sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0,
+                'reuse':1 - pool.num_connections / pool.num_requests if pool.num_requests else 0.0
+                }
+        return result
+
+# --------------------
+# BLOCK 重試策略
+# --------------------
+class OwlRetry():
+    def __init__(self, retries:int = 3, backoff:float = 0.5, max_backoff:float = 8, deadline:float = 120,
+                 statuses:tuple = (500, 502, 503, 504)):
+        '''
+        請求失敗時的重試策略
+
+        Parameters
+        ----------
+        :param retries: int, default 3
+            - 5xx 或連線錯誤的最多重試次數，0 為不重試
+
+        :param backoff: float, default 0.5
+            - 第一次重試的等待秒數上限，之後每次加倍
+
+        :param max_backoff: float, default 8
+            - 單次等待秒數上限
+
+        :param deadline: float, default 120
+            - 單次呼叫 (含重試與重新認證) 的總秒數上限
+
+        :param statuses: tuple, default (500, 502, 503, 504)
+            - 視為暫時性錯誤而重試的狀態碼
+
+        [NOTES]
+        ----------
+            - 等待時間取 0 到指數上限之間的亂數 (full jitter)，避免多執行緒同時重試
+            - 401 不計入重試次數，重新取得 Token 後重送一次
+        '''
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.statuses = tuple(statuses)
+
+    def __repr__(self):
+        return 'OwlRetry(retries={}, backoff={}, deadline={})'.format(self.retries, self.backoff, self.deadline)
+
+    # 第 attempt 次重試前的等待秒數
+    def delay(self, attempt:int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    # 依剩餘時間縮短逾時設定
+    @staticmethod
+    def clip(timeout, remaining:float):
+        remaining = max(remaining, 0.001)
+        if isinstance(timeout, tuple):
+            return tuple(min(t, remaining) for t in timeout)
+        return min(timeout, remaining)
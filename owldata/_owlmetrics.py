@@ -0,0 +1,251 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import collections
+import json
+import os
+import threading
+import time
+import pandas as pd
+
+# --------------------
+# BLOCK 效能監控
+# --------------------
+# 各階段耗時欄位
+_STAGES = ['http', 'decode', 'check', 'total']
+
+# 總耗時分布的上界 (秒)
+_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 網址中商品代碼之後的股票代號 .../{pdid}/{sid}/...
+def _url_sid(url:str, pdid:str) -> str:
+    if not pdid:
+        return ''
+    head, sep, tail = url.partition('/' + pdid + '/')
+    return tail.split('/', 1)[0] if sep else ''
+
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class OwlMetrics():
+    def __init__(self, log:str = None, keep:int = 1000, buckets:tuple = _BUCKETS):
+        '''
+        查詢效能統計，記錄每次呼叫的各階段耗時、回應大小與筆數
+
+        Parameters
+        ----------
+        :param log: str, default None
+            - 逐筆記錄檔路徑 (JSON Lines)，未輸入則只保留統計
+
+        :param keep: int, default 1000
+            - 保留最近幾筆記錄供 recent() 查詢
+
+        :param buckets: tuple, default (0.01, ..., 10.0)
+            - 總耗時分布的上界秒數
+
+        [NOTES]
+        ----------
+            - 每筆記錄: time, func, pdid, sid, url, status, cache, http, decode, check, total, bytes, rows, error
+            - http 為送出請求至收到回應標頭的秒數，decode 含讀取回應內容與解析
+            - cache 為 'hit'、'miss'，未啟用快取時為 None
+        '''
+        self.log = log
+        self.buckets = tuple(sorted(buckets))
+        self._recent = collections.deque(maxlen = keep)
+        self._hooks = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __repr__(self):
+        return 'OwlMetrics(calls={}, log={})'.format(self._calls, self.log)
+
+    def reset(self):
+        with self._lock:
+            self._calls = 0
+            self._products = {}
+            self._sids = {}
+            self._recent.clear()
+
+    # 註冊每筆記錄的回呼函數
+    def hook(self, callback):
+        '''
+        每次查詢完成後呼叫 callback(record)，回呼內的例外不影響查詢
+        '''
+        self._hooks.append(callback)
+        return callback
+
+    # 寫入一筆記錄
+    def observe(self, record:dict):
+        key = (record['func'], record['pdid'])
+        total = record['total']
+        with self._lock:
+            self._calls += 1
+            stat = self._products.get(key)
+            if stat is None:
+                stat = self._products[key] = {
+                    'calls':0, 'errors':0, 'hits':0, 'misses':0, 'bytes':0, 'rows':0,
+                    'seconds':dict.fromkeys(_STAGES, 0.0), 'buckets':[0] * (len(self.buckets) + 1), 'max':0.0
+                    }
+            stat['calls'] += 1
+            stat['errors'] += record['error']
+            stat['bytes'] += record['bytes']
+            stat['rows'] += record['rows']
+            if record['cache'] == 'hit':
+                stat['hits'] += 1
+            elif record['cache'] == 'miss':
+                stat['misses'] += 1
+            seconds = stat['seconds']
+            for stage in _STAGES:
+                seconds[stage] += record[stage]
+            stat['buckets'][self._bucket(total)] += 1
+            stat['max'] = max(stat['max'], total)
+
+            if record['sid']:
+                sid = self._sids.setdefault((record['func'], record['sid']), [0, 0.0, 0.0])
+                sid[0] += 1
+                sid[1] += total
+                sid[2] = max(sid[2], total)
+
+            self._recent.append(record)
+            if self.log is not None:
+                with open(self.log, 'a', encoding = 'utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii = False) + '\n')
+
+        for callback in self._hooks:
+            try:
+                callback(record)
+            except Exception:
+                pass
+
+    def _bucket(self, value:float) -> int:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                return i
+        return len(self.buckets)
+
+    # 最近的記錄
+    def recent(self, n:int = None) -> 'DataFrame':
+        with self._lock:
+            records = list(self._recent)
+        return pd.DataFrame(records[-n:] if n else records)
+
+    # 各商品統計
+    def summary(self) -> 'DataFrame':
+        '''
+        Returns
+        ----------
+        DataFrame
+            - 以 (func, pdid) 為索引，含呼叫數、錯誤數、快取命中、位元組、筆數、各階段平均與最大秒數
+        '''
+        rows = []
+        with self._lock:
+            for (func, pdid), stat in self._products.items():
+                row = {'func':func, 'pdid':pdid, 'calls':stat['calls'], 'errors':stat['errors'],
+                       'hits':stat['hits'], 'misses':stat['misses'], 'bytes':stat['bytes'], 'rows':stat['rows']}
+                for stage in _STAGES:
+                    row[stage] = stat['seconds'][stage] / stat['calls']
+                row['max'] = stat['max']
+                rows.append(row)
+        frame = pd.DataFrame(rows, columns = ['func', 'pdid', 'calls', 'errors', 'hits', 'misses', 'bytes', 'rows'] + _STAGES + ['max'])
+        return frame.set_index(['func', 'pdid']).sort_values('total', ascending = False)
+
+    # 平均耗時最長的股票
+    def slowest(self, n:int = 10) -> 'DataFrame':
+        '''
+        Returns
+        ----------
+        DataFrame
+            - 以 (func, sid) 為索引，依平均總耗時排序的前 n 檔
+        '''
+        with self._lock:
+            rows = [(func, sid, count, seconds / count, peak) for (func, sid), (count, seconds, peak) in self._sids.items()]
+        frame = pd.DataFrame(rows, columns = ['func', 'sid', 'calls', 'total', 'max'])
+        return frame.set_index(['func', 'sid']).sort_values('total', ascending = False).head(n)
+
+    # Prometheus 文字格式
+    def to_prometheus(self) -> str:
+        lines = []
+        def family(name, kind, doc):
+            lines.append('# HELP {} {}'.format(name, doc))
+            lines.append('# TYPE {} {}'.format(name, kind))
+
+        with self._lock:
+            products = [(func, pdid, dict(stat, seconds = dict(stat['seconds']), buckets = list(stat['buckets'])))
+                        for (func, pdid), stat in self._products.items()]
+
+        counters = [('owl_requests_total', 'calls', 'Number of queries.'),
+                    ('owl_errors_total', 'errors', 'Number of failed queries.'),
+                    ('owl_cache_hits_total', 'hits', 'Queries served from the local cache.'),
+                    ('owl_cache_misses_total', 'misses', 'Queries not found in the local cache.'),
+                    ('owl_response_bytes_total', 'bytes', 'Response body bytes.'),
+                    ('owl_rows_total', 'rows', 'Rows returned.')]
+        for name, field, doc in counters:
+            family(name, 'counter', doc)
+            for func, pdid, stat in products:
+                lines.append('{}{{func="{}",pdid="{}"}} {}'.format(name, _label(func), _label(pdid), stat[field]))
+
+        family('owl_stage_seconds_total', 'counter', 'Seconds spent per stage.')
+        for func, pdid, stat in products:
+            for stage in _STAGES:
+                lines.append('owl_stage_seconds_total{{func="{}",pdid="{}",stage="{}"}} {!r}'.format(
+                    _label(func), _label(pdid), stage, stat['seconds'][stage]))
+
+        family('owl_query_duration_seconds', 'histogram', 'Query duration in seconds.')
+        for func, pdid, stat in products:
+            labels = 'func="{}",pdid="{}"'.format(_label(func), _label(pdid))
+            count = 0
+            for bound, n in zip(self.buckets + (float('inf'),), stat['buckets']):
+                count += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('owl_query_duration_seconds_bucket{{{},le="{}"}} {}'.format(labels, le, count))
+            lines.append('owl_query_duration_seconds_sum{{{}}} {!r}'.format(labels, stat['seconds']['total']))
+            lines.append('owl_query_duration_seconds_count{{{}}} {}'.format(labels, stat['calls']))
+        return '\n'.join(lines) + '\n'
+
+    # 輸出統計檔
+    def write(self, path:str):
+        '''
+        輸出 Prometheus 文字格式，可供 node_exporter textfile collector 讀取
+
+        Parameters
+        ----------
+        :param path: str
+            - 輸出檔路徑，先寫入暫存檔再取代，讀取端不會讀到寫到一半的檔案
+        '''
+        tmp = path + '.{}.tmp'.format(os.getpid())
+        with open(tmp, 'w', encoding = 'utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+class _Trace():
+    '''
+    單次查詢的計時，只在啟用監控時建立
+    '''
+    __slots__ = ('start', 'http', 'decode', 'bytes', 'cache', 'status')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.http = 0.0
+        self.decode = 0.0
+        self.bytes = 0
+        self.cache = None
+        self.status = None
+
+    # 計算回應位元組數
+    def count(self, chunks):
+        for chunk in chunks:
+            self.bytes += len(chunk)
+            yield chunk
+
+    def record(self, url:str, pdid:str, func:str, result, checked:float, end:float) -> dict:
+        rows = len(result) if isinstance(result, pd.DataFrame) else 0
+        return {'time':time.time(), 'func':func or '', 'pdid':pdid or '', 'sid':_url_sid(url, pdid), 'url':url,
+                'status':self.status, 'cache':self.cache, 'http':self.http, 'decode':self.decode,
+                'check':end - checked, 'total':end - self.start, 'bytes':self.bytes, 'rows':rows,
+                'error':int(not isinstance(result, pd.DataFrame))}
@@ -0,0 +1,221 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+from ._owlerror import OwlBatchErrors, _as_raise, _check_colist, _check_range, _fail
+from ._owlrate import _as_bulk
+from ._owltime import _DATE_SPEC
+from ._owlbatch import _gather
+from ._owladjust import _stamp_int
+
+# --------------------
+# BLOCK 時點財報
+# --------------------
+# 期末日之後的法定公告期限 (日)：月營收次月 10 日、第一至三季 45 日、第四季與年報 90 日
+_LAGS = {'m':10, 'q':45, 'y':90}
+
+# 期末日對應 API 期別代碼
+def _period_code(dates, freq:str) -> list:
+    dates = pd.DatetimeIndex(dates)
+    if freq == 'y':
+        return ['{:04d}'.format(y) for y in dates.year]
+    if freq == 'q':
+        return ['{:04d}{:02d}'.format(y, (m - 1) // 3 + 1) for y, m in zip(dates.year, dates.month)]
+    return ['{:04d}{:02d}'.format(y, m) for y, m in zip(dates.year, dates.month)]
+
+# 各期資料可取得的日期
+def _available(periods, freq:str, lag = None) -> 'ndarray':
+    '''
+    Parameters
+    ----------
+    :param periods: array-like
+        - 期末日 (datetime)
+
+    :param lag: int, callable or None
+        - None: 法定公告期限，第四季為 90 日
+        - int: 期末日後的日數
+        - callable: lag(期末日 DatetimeIndex) 回傳可取得日
+
+    Returns
+    ----------
+    ndarray
+        - yyyymmdd 整數
+    '''
+    periods = pd.DatetimeIndex(periods)
+    if callable(lag):
+        return _stamp_int(lag(periods))
+    if lag is None:
+        days = np.full(len(periods), _LAGS[freq])
+        if freq == 'q':
+            days[periods.month == 12] = _LAGS['y']
+    else:
+        days = np.full(len(periods), int(lag))
+    return _stamp_int(periods + pd.to_timedelta(days, unit = 'D'))
+
+class _OwlPIT():
+    # 多股財報 區間
+    def fim_range(self, di:str, bpd:str, epd:str, colist = None, max_workers:int = None, callback = None) -> 'DataFrame':
+        '''
+        依資料頻率與期間，併發撈取各期全部股票的財務資訊
+
+        Parameters
+        ----------
+        :param di: str
+            - 查詢資料時間頻率，y = 年度, q = 季度, m = 月
+
+        :param bpd: str
+            - 起始期別，格式同 fim: y 為 yyyy，q 為 yyyyqq，m 為 yyyymm
+
+        :param epd: str
+            - 結束期別，格式同 bpd
+
+        :param colist: list, default None
+            - 填入欲查看的欄位名稱，未寫輸入則取全部欄位
+
+        :param max_workers: int, default None
+            - 同時請求數上限，預設為連線池大小
+
+        :param callback: callable, default None
+            - 每期完成時呼叫 callback(dt, DataFrame)
+
+        Returns
+        ----------
+        DataFrame
+            - 以 (股票代號, 年季 / 年度 / 年月) 為索引，期別為期末日
+            - 失敗期別 (OwlBatchErrors) 記錄於 DataFrame.attrs['errors']
+        '''
+        freq = di.lower() if isinstance(di, str) else di
+        if freq not in _LAGS:
+            return _fail(self, 'YQMError')
+        if not (_check_colist(self, 'fim', colist, freq) and _check_range(self, bpd, epd, freq)):
+            return None
+        period = _DATE_SPEC[freq][0]
+        if colist is not None:
+            colist = [col for col in ('股票代號', period) if col not in colist] + list(colist)
+        if max_workers is None:
+            max_workers = self._session.pool_size
+        periods = [str(key) for key in self.calendar(freq).range(bpd, epd)]
+
+        frames = {}
+        errors = OwlBatchErrors(unit = '期')
+        with ThreadPoolExecutor(max_workers = max_workers) as pool:
+            futures = {pool.submit(_as_bulk, _as_raise, self.fim, freq, dt, colist):dt for dt in periods}
+            for dt, temp in _gather(self, futures, errors):
+                frames[dt] = temp
+                if callback is not None:
+                    callback(dt, temp)
+
+        if len(errors) > 0:
+            print('區間查詢失敗 {} 期:'.format(len(errors)), ', '.join(sorted(errors)))
+
+        if len(frames) == 0:
+            result = pd.DataFrame(index = pd.MultiIndex.from_arrays([[], []], names = ['股票代號', period]))
+        else:
+            parts = [frames[dt] for dt in sorted(frames)]
+            result = pd.concat(parts, ignore_index = True, sort = False)
+            for col in parts[0].columns:
+                if isinstance(parts[0][col].dtype, pd.CategoricalDtype) and not isinstance(result[col].dtype, pd.CategoricalDtype):
+                    result[col] = result[col].astype('category')
+            result = result.set_index(['股票代號', period]).sort_index()
+        result.attrs['errors'] = errors
+        return result
+
+    # 時點對齊
+    def fim_asof(self, fundamentals:'DataFrame', grid, lag = None) -> 'DataFrame':
+        '''
+        將財報依可取得日對齊至每日面板，每個交易日只使用當日已公告的最新一期
+
+        Parameters
+        ----------
+        :param fundamentals: DataFrame
+            - fim_range 的結果
+
+        :param grid: DataFrame or MultiIndex
+            - 以 (日期, 股票代號) 為索引的面板，如 msp_range 的結果，或其索引
+
+        :param lag: int, callable, default None
+            - None: 依法定公告期限，月營收為次月 10 日，第一至三季為期末後 45 日，第四季與年報為 90 日
+            - int: 期末日後的日數
+            - callable: lag(期末日 DatetimeIndex) 回傳可取得日
+
+        Returns
+        ----------
+        DataFrame
+            - 與 grid 相同索引，含期別與財報欄位；尚無已公告資料時為 NaN
+        '''
+        index = grid if isinstance(grid, pd.MultiIndex) else grid.index
+        period = [name for name in fundamentals.index.names if name != '股票代號'][0]
+        freq = [key for key, spec in _DATE_SPEC.items() if spec[0] == period][0]
+
+        table = fundamentals.reset_index().drop(columns = ['股票名稱'], errors = 'ignore')
+        table = table[table[period].notna()]
+        sids = pd.Index(table['股票代號'].astype(str).unique()).sort_values()
+
+        # 以 股票 x 10^8 + yyyymmdd 合併為單一排序鍵，一次二分搜尋完成對齊
+        code = sids.get_indexer(table['股票代號'].astype(str))
+        known = _available(table[period], freq, lag)
+        order = np.lexsort((_stamp_int(table[period]), known, code))
+        keys = (code * 10 ** 8 + known)[order]
+        table = table.iloc[order].reset_index(drop = True)
+
+        row_code = sids.get_indexer(index.get_level_values('股票代號').astype(str))
+        row_key = row_code * 10 ** 8 + _stamp_int(index.get_level_values('日期'))
+        pos = np.searchsorted(keys, row_key, 'right') - 1
+        safe = np.maximum(pos, 0)
+        valid = (row_code >= 0) & (pos >= 0)
+        if len(keys) > 0:
+            valid &= code[order][safe] == row_code
+        else:
+            valid[:] = False
+
+        result = table.drop(columns = ['股票代號']).reindex(np.where(valid, pos, -1))
+        result.index = index
+        return result
+
+    # 時點財報面板
+    def fim_pit(self, di:str, grid, colist = None, lag = None, max_workers:int = None) -> 'DataFrame':
+        '''
+        依每日面板的日期範圍撈取財報，並以可取得日對齊，避免使用當時尚未公告的資料
+
+        Parameters
+        ----------
+        :param di: str
+            - 查詢資料時間頻率，y = 年度, q = 季度, m = 月
+
+        :param grid: DataFrame or MultiIndex
+            - 以 (日期, 股票代號) 為索引的面板，如 msp_range 的結果
+
+        :param colist, lag, max_workers:
+            - 同 fim_range 與 fim_asof
+
+        Returns
+        ----------
+        DataFrame
+            - 同 fim_asof
+
+        Notes
+        ----------
+        - 起始期別往前多取一年，第一個交易日即可對應到已公告的財報
+        '''
+        freq = di.lower() if isinstance(di, str) else di
+        index = grid if isinstance(grid, pd.MultiIndex) else grid.index
+        dates = index.get_level_values('日期')
+        if len(dates) == 0:
+            return pd.DataFrame(index = index)
+        first, last = dates.min() - pd.DateOffset(years = 1), dates.max()
+        bpd, epd = _period_code([first, last], freq) if freq in _LAGS else (None, None)
+        fundamentals = self.fim_range(di, bpd, epd, colist, max_workers = max_workers)
+        if fundamentals is None:
+            return None
+        result = self.fim_asof(fundamentals, index, lag)
+        result.attrs['errors'] = fundamentals.attrs.get('errors', {})
+        return result
@@ -0,0 +1,318 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import requests
+
+from ._owlerror import OwlError, OwlConnectionError, OwlPermissionError, OwlSidError, OwlBatchErrors, _as_raise, _raising
+from ._owlrate import PRIORITY_INTERACTIVE
+
+# --------------------
+# BLOCK 即時報價輪詢
+# --------------------
+# 報價表的數值欄位
+_QUOTE_FIELDS = ['成交價', '漲跌', '漲跌幅', '總量', '開盤價', '最高價', '最低價', '成交量']
+
+# 判斷是否有變動的欄位
+_WATCH_FIELDS = ['成交價', '總量', '成交量']
+
+class OwlQuotes():
+    def __init__(self, owl, sids:list, interval:float = 1.0, max_interval:float = 10.0,
+                 backoff:float = 1.5, max_workers:int = None, callback = None, on_error = None):
+        '''
+        以 tsp 併發輪詢觀察清單的即時報價，只送出有變動的股票
+
+        Parameters
+        ----------
+        :param owl: OwlData
+            - 已連線的 OwlData
+
+        :param sids: list
+            - 觀察清單
+
+        :param interval: float, default 1.0
+            - 最短輪詢間隔秒數，有變動時回到此間隔
+
+        :param max_interval: float, default 10.0
+            - 最長輪詢間隔秒數，連續無變動或失敗時逐步拉長至此
+
+        :param backoff: float, default 1.5
+            - 無變動時間隔的放大倍數
+
+        :param max_workers: int, default None
+            - 同時請求數上限，預設為連線池大小
+
+        :param callback: callable, default None
+            - 有變動時呼叫 callback(changes)，changes 為變動列的 list of dict
+
+        :param on_error: callable, default None
+            - 查詢失敗時呼叫 on_error(sid, 例外)，例外多為 OwlException
+
+        [NOTES]
+        ----------
+            - 報價存於預先配置的陣列，每輪只比對與複製，不重建表格
+            - 變動以 成交價、總量、成交量 判斷
+            - 請求為互動優先，啟用限流時優先於批次查詢
+            - 股票代號格式錯誤者不列入觀察清單；errors = 'raise' 時拋出 OwlSidError
+            - 各股最近一次的失敗記錄於 errors (OwlBatchErrors)，下次成功時移除
+        '''
+        self.owl = owl
+        self.errors = OwlBatchErrors(unit = '檔')
+        self.sids, self._urls = [], []
+        for sid in dict.fromkeys(sids):
+            try:
+                self._urls.append(_as_raise(owl._req_tsp, sid)[0])
+            except OwlSidError as e:
+                e.target = sid
+                self.errors[sid] = e
+                if _raising(owl):
+                    raise
+                continue
+            self.sids.append(sid)
+        if len(self.errors) > 0:
+            print('觀察清單略過 {} 檔:'.format(len(self.errors)), ', '.join(map(str, self.errors)))
+        self.min_interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.backoff = backoff
+        self.interval = interval
+        self.max_workers = max_workers if max_workers is not None else owl._session.pool_size
+
+        size = len(self.sids)
+        self._pos = {sid:i for i, sid in enumerate(self.sids)}
+        self._names = np.array([''] * size, dtype = object)
+        self._values = np.full((size, len(_QUOTE_FIELDS)), np.nan)
+        self._times = np.zeros(size, dtype = np.int64)
+        self._next = np.full((size, len(_QUOTE_FIELDS)), np.nan)
+        self._next_times = np.zeros(size, dtype = np.int64)
+        self._ok = np.zeros(size, dtype = bool)
+        self._watch = [_QUOTE_FIELDS.index(f) for f in _WATCH_FIELDS]
+        self._index = None
+
+        # 每個執行緒負責固定的一段清單，每輪的工作數不隨清單長度增加
+        workers = max(1, min(self.max_workers, size))
+        self._slices = [range(i, size, workers) for i in range(workers)]
+        self._pool = ThreadPoolExecutor(max_workers = workers)
+
+        self._callbacks = [] if callback is None else [callback]
+        self._error_callbacks = [] if on_error is None else [on_error]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'polls':0, 'requests':0, 'errors':0, 'changes':0}
+
+    def __repr__(self):
+        return 'OwlQuotes({} sids, interval={:.2f})'.format(len(self.sids), self.interval)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # 註冊變動通知
+    def on_change(self, callback):
+        self._callbacks.append(callback)
+        return callback
+
+    # 註冊失敗通知
+    def on_error(self, callback):
+        self._error_callbacks.append(callback)
+        return callback
+
+    # 單檔查詢，失敗時拋出 OwlException
+    def _get(self, i:int) -> list:
+        url = self._urls[i]
+        try:
+            resp = self.owl._send('GET', url, priority = PRIORITY_INTERACTIVE)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise OwlConnectionError(detail = ', ' + type(e).__name__, url = url)
+        if resp.status_code != 200:
+            raise OwlError.http_exception(resp.status_code)(resp.status_code, url = url)
+        try:
+            data = json.loads(resp.content)
+        except ValueError:
+            raise OwlPermissionError('PdError', ', 回應無法解析', status = 200, url = url)
+        if not data.get('Data'):
+            raise OwlSidError('SidError', ', 股票代號: ' + self.sids[i], status = 200, url = url)
+        return data
+
+    # 下載並解析一段清單，回傳失敗的 (位置, 例外)，不中斷輪詢
+    def _fetch(self, positions:range) -> list:
+        failed = []
+        for i in positions:
+            self._ok[i] = False
+            try:
+                data = self._get(i)
+            except Exception as e:
+                failed.append((i, e))
+                continue
+
+            row = data['Data'][0]
+            if self._index is None:
+                title = data.get('Title')
+                self._index = ([title.index(f) if f in title else -1 for f in _QUOTE_FIELDS],
+                               title.index('時間') if '時間' in title else -1,
+                               title.index('股票名稱') if '股票名稱' in title else -1)
+            cols, t, name = self._index
+            target = self._next[i]
+            for j, c in enumerate(cols):
+                try:
+                    target[j] = float(row[c]) if c >= 0 and row[c] != '' else np.nan
+                except ValueError:
+                    target[j] = np.nan
+            try:
+                self._next_times[i] = int(row[t]) if t >= 0 else 0
+            except ValueError:
+                self._next_times[i] = 0
+            if name >= 0 and not self._names[i]:
+                self._names[i] = row[name]
+            self._ok[i] = True
+        return failed
+
+    # 輪詢一次
+    def poll(self) -> list:
+        '''
+        併發查詢整份清單一次，更新報價表並回傳變動列
+
+        Returns
+        ----------
+        list of dict
+            - 股票代號、時間、成交價、總量、成交量
+        '''
+        with self._lock:
+            failed = [item for part in self._pool.map(self._fetch, self._slices) for item in part]
+            for i in np.flatnonzero(self._ok):
+                self.errors.pop(self.sids[i], None)
+            for i, error in failed:
+                error.target = self.sids[i]
+                self.errors[self.sids[i]] = error
+
+            new, old = self._next[:, self._watch], self._values[:, self._watch]
+            diff = (new != old) & ~(np.isnan(new) & np.isnan(old))
+            changed = np.flatnonzero(self._ok & diff.any(axis = 1))
+            self._values[changed] = self._next[changed]
+            self._times[changed] = self._next_times[changed]
+
+            self.stats['polls'] += 1
+            self.stats['requests'] += len(self.sids)
+            self.stats['errors'] += len(failed)
+            self.stats['changes'] += len(changed)
+
+            # 有變動時回到最短間隔，否則逐步拉長
+            if len(changed) > 0:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.max_interval, self.interval * self.backoff)
+
+            changes = [self._row(i) for i in changed]
+
+        for i, error in failed:
+            for callback in self._error_callbacks:
+                callback(self.sids[i], error)
+        if len(changes) > 0:
+            for callback in self._callbacks:
+                callback(changes)
+        return changes
+
+    def _row(self, i:int) -> dict:
+        values = self._values[i]
+        row = {'股票代號':self.sids[i], '時間':str(self._times[i])}
+        for f, j in zip(_WATCH_FIELDS, self._watch):
+            row[f] = float(values[j])
+        return row
+
+    # 目前報價表
+    def snapshot(self) -> 'DataFrame':
+        '''
+        Returns
+        ----------
+        DataFrame
+            - 觀察清單的最新報價，尚未取得報價的股票為 NaN
+        '''
+        with self._lock:
+            frame = pd.DataFrame(self._values.copy(), columns = _QUOTE_FIELDS)
+            frame.insert(0, '時間', [str(t) if t else '' for t in self._times])
+            frame.insert(0, '股票名稱', self._names.copy())
+            frame.insert(0, '股票代號', self.sids)
+        return frame
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            self.poll()
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - start)))
+
+    # 背景執行
+    def start(self) -> 'OwlQuotes':
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target = self._run, daemon = True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        self._pool.shutdown()
+
+    # async for change in quotes
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        self._stop.clear()
+        while not self._stop.is_set():
+            start = loop.time()
+            for change in await loop.run_in_executor(None, self.poll):
+                yield change
+            await asyncio.sleep(max(0.0, self.interval - (loop.time() - start)))
+
+class _OwlQuote():
+    # 即時報價輪詢
+    def quotes(self, sids:list, interval:float = 1.0, max_interval:float = 10.0,
+               max_workers:int = None, callback = None, on_error = None) -> OwlQuotes:
+        '''
+        建立觀察清單的即時報價輪詢
+
+        Parameters
+        ----------
+        :param sids: list
+            - 觀察清單
+
+        :param interval: float, default 1.0
+            - 最短輪詢間隔秒數
+
+        :param max_interval: float, default 10.0
+            - 無變動時的最長輪詢間隔秒數
+
+        :param max_workers: int, default None
+            - 同時請求數上限，預設為連線池大小
+
+        :param callback: callable, default None
+            - 有變動時呼叫 callback(changes)
+
+        :param on_error: callable, default None
+            - 查詢失敗時呼叫 on_error(sid, 例外)，例外多為 OwlException
+
+        Returns
+        ----------
+        OwlQuotes
+            - start() 於背景輪詢，poll() 輪詢一次，或以 async for 逐筆取得變動
+        '''
+        return OwlQuotes(self, sids, interval = interval, max_interval = max_interval,
+                         max_workers = max_workers, callback = callback, on_error = on_error)
@@ -0,0 +1,213 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# --------------------
+# BLOCK 流量控制
+# --------------------
+# 請求優先順序，數字越小越優先
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+# 目前執行緒或 task 的請求優先順序
+_PRIORITY = contextvars.ContextVar('owl_priority', default = PRIORITY_NORMAL)
+
+# 以批次優先順序執行
+def _as_bulk(func, *args, **kwargs):
+    token = _PRIORITY.set(PRIORITY_BULK)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _PRIORITY.reset(token)
+
+# 跨行程檔案鎖
+class _FileLock():
+    def __init__(self, path:str):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+        return self._fd
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._fd)
+        self._fd = None
+
+class OwlRateLimiter():
+    def __init__(self, rps:float = 10, burst:int = None, path:str = None, reserve:int = 1):
+        '''
+        Token bucket 限流器，執行緒共用，可經由檔案於多個行程間共用
+
+        Parameters
+        ----------
+        :param rps: float, default 10
+            - 每秒補充的請求數
+
+        :param burst: int, default None
+            - 可累積的請求數上限，預設為 rps
+
+        :param path: str, default None
+            - 共用狀態檔路徑，多個行程指定同一檔案即共用同一個額度
+
+        :param reserve: int, default 1
+            - 保留給互動查詢 (如 tsp) 的額度，批次查詢不會用到這部分
+
+        [NOTES]
+        ----------
+            - 同一行程內依優先順序排隊: 互動 > 一般 > 批次，同順序先到先得
+            - 跨行程時以 reserve 讓批次查詢讓出額度給互動查詢
+        '''
+        if rps <= 0:
+            raise ValueError('rps 需大於 0')
+        self.rps = float(rps)
+        self.burst = int(burst) if burst is not None else max(1, int(rps))
+        self.reserve = max(0, min(int(reserve), self.burst - 1))
+        self.path = path
+
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._stats = {'acquired':0, 'waited':0, 'wait_seconds':0.0, 'timeouts':0}
+
+    def __repr__(self):
+        return 'OwlRateLimiter(rps={}, burst={}, path={})'.format(self.rps, self.burst, self.path)
+
+    # 補充額度並嘗試取用，成功回傳 0，否則回傳需等待秒數
+    def _refill(self, tokens:float, stamp:float, now:float, floor:float) -> tuple:
+        tokens = min(self.burst, tokens + max(0.0, now - stamp) * self.rps)
+        if tokens >= floor:
+            return tokens - 1, 0.0
+        return tokens, (floor - tokens) / self.rps
+
+    def _take(self, priority:int) -> float:
+        floor = 1 + (self.reserve if priority >= PRIORITY_BULK else 0)
+        if self.path is None:
+            now = time.monotonic()
+            self._tokens, wait = self._refill(self._tokens, self._stamp, now, floor)
+            self._stamp = now
+            return wait
+
+        # 跨行程以牆上時間計算補充量
+        with _FileLock(self.path + '.lock'):
+            try:
+                with open(self.path, 'r') as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {'tokens':float(self.burst), 'stamp':time.time()}
+            now = time.time()
+            tokens, wait = self._refill(state['tokens'], state['stamp'], now, floor)
+            tmp = self.path + '.{}.tmp'.format(os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump({'tokens':tokens, 'stamp':now}, f)
+            os.replace(tmp, self.path)
+        return wait
+
+    # 取得一次請求額度
+    def acquire(self, priority:int = PRIORITY_NORMAL, timeout:float = None) -> bool:
+        '''
+        依優先順序等待額度
+
+        Parameters
+        ----------
+        :param priority: int, default PRIORITY_NORMAL
+            - PRIORITY_INTERACTIVE, PRIORITY_NORMAL 或 PRIORITY_BULK
+
+        :param timeout: float, default None
+            - 最多等待秒數，未輸入則等到取得為止
+
+        Returns
+        ----------
+        bool
+            - 逾時未取得額度時回傳 False
+        '''
+        start = time.monotonic()
+        entry = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            self._cond.notify_all()
+            try:
+                while True:
+                    wait = None
+                    if self._waiters[0] == entry:
+                        wait = self._take(priority)
+                        if wait == 0:
+                            elapsed = time.monotonic() - start
+                            self._stats['acquired'] += 1
+                            if elapsed > 0.001:
+                                self._stats['waited'] += 1
+                                self._stats['wait_seconds'] += elapsed
+                            return True
+
+                    if timeout is not None:
+                        left = timeout - (time.monotonic() - start)
+                        if left <= 0:
+                            self._stats['timeouts'] += 1
+                            return False
+                        wait = left if wait is None else min(wait, left)
+                    self._cond.wait(wait)
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    # 非阻塞取用，供 asyncio 使用
+    def poll(self, priority:int = PRIORITY_NORMAL) -> float:
+        '''
+        Returns
+        ----------
+        float
+            - 0 表示已取得額度，否則為建議等待秒數
+        '''
+        with self._cond:
+            if len(self._waiters) > 0 and self._waiters[0][0] < priority:
+                return 1 / self.rps
+            wait = self._take(priority)
+            if wait == 0:
+                self._stats['acquired'] += 1
+            return wait
+
+    def stats(self) -> dict:
+        '''
+        Returns
+        ----------
+        :dict:
+            - acquired: 累計取得的請求數
+            - waited: 需等待的請求數
+            - wait_seconds: 累計等待秒數
+            - timeouts: 逾時未取得的請求數
+        '''
+        with self._cond:
+            return dict(self._stats)
@@ -0,0 +1,283 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+# --------------------
+# BLOCK 錄製與重播
+# --------------------
+# 錄製檔以網址路徑為鍵值，不含主機，重播時可改由本機伺服器提供
+def _record_key(url:str) -> str:
+    parts = urlsplit(url)
+    return parts.path + ('?' + parts.query if parts.query else '')
+
+def _entry_name(key:str) -> str:
+    return hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json'
+
+class OwlRecorder():
+    def __init__(self, path:str):
+        '''
+        將 API 回應錄製至壓縮檔 (zip)，供 OwlReplayServer 重播
+
+        Parameters
+        ----------
+        :param path: str
+            - 錄製檔路徑，已存在時接續寫入
+
+        [NOTES]
+        ----------
+            - 每個回應為一個 deflate 壓縮的項目，網址路徑記錄於項目註解
+            - 同一網址只保留第一次錄製的內容
+        '''
+        self.path = path
+        self._lock = threading.Lock()
+        folder = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self._zip = zipfile.ZipFile(path, 'a', compression = zipfile.ZIP_DEFLATED)
+        self._names = set(self._zip.namelist())
+        self.count = 0
+
+    def __repr__(self):
+        return 'OwlRecorder(path={}, count={})'.format(self.path, self.count)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, url:str, body:bytes):
+        key = _record_key(url)
+        info = zipfile.ZipInfo(_entry_name(key), date_time = time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.comment = key.encode('utf-8')
+        with self._lock:
+            if self._zip is None or info.filename in self._names:
+                return
+            self._zip.writestr(info, body)
+            self._names.add(info.filename)
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+                self._zip = None
+
+# 讀取錄製檔
+def _load_records(path:str) -> dict:
+    records = {}
+    with zipfile.ZipFile(path, 'r') as archive:
+        for info in archive.infolist():
+            records[info.comment.decode('utf-8')] = archive.read(info)
+    return records
+
+class _ReplayHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    # 用戶端關閉保持中的連線屬正常情況，不輸出錯誤
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class OwlReplayServer():
+    def __init__(self, path:str, latency:float = 0.0, jitter:float = 0.0, error_rate:float = 0.0,
+                 error_status:int = 503, expire_every:int = 0, seed:int = 0, port:int = 0):
+        '''
+        以本機 HTTP 伺服器重播錄製的回應，網址格式與 Owl API 相同
+
+        Parameters
+        ----------
+        :param path: str or dict
+            - OwlRecorder 錄製的檔案，或 {網址路徑: 回應內容}
+
+        :param latency: float, default 0.0
+            - 每次回應前固定延遲秒數
+
+        :param jitter: float, default 0.0
+            - 額外延遲的上限秒數，依網址與次數決定，可重現
+
+        :param error_rate: float, default 0.0
+            - 回傳 error_status 的比例，依網址與次數決定，可重現
+
+        :param error_status: int, default 503
+            - 注入錯誤時的狀態碼
+
+        :param expire_every: int, default 0
+            - 每隔幾次資料請求讓 Token 過期 (回傳 401)，0 為不過期
+
+        :param seed: int, default 0
+            - 延遲與錯誤注入的亂數種子
+
+        :param port: int, default 0
+            - 監聽埠號，0 為自動選擇
+
+        [NOTES]
+        ----------
+            - 以 OwlData(appid, appsecret, base_url = server.url) 連線
+            - 未錄製的網址回傳 404
+        '''
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.expire_every = expire_every
+        self.seed = seed
+        self.stats = {'auth':0, 'hits':0, 'misses':0, 'errors':0, 'expired':0}
+
+        self._records = _load_records(path) if isinstance(path, str) else dict(path)
+        self._seen = {}
+        self._token = 0
+        self._requests = 0
+        self._lock = threading.Lock()
+
+        self._httpd = _ReplayHTTPServer(('127.0.0.1', port), self._handler())
+        self._thread = None
+
+    def __repr__(self):
+        return 'OwlReplayServer(url={}, records={})'.format(self.url, len(self._records))
+
+    # 新增或取代重播內容
+    def add(self, url:str, body:bytes):
+        self._records[_record_key(url)] = body
+
+    def discard(self, url:str):
+        self._records.pop(_record_key(url), None)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self) -> 'OwlReplayServer':
+        if self._thread is None:
+            self._thread = threading.Thread(target = self._httpd.serve_forever, daemon = True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    # 依網址與第幾次請求產生 0-1 之間的固定數值
+    def _draw(self, key:str, n:int, salt:str) -> float:
+        digest = hashlib.sha1('{}|{}|{}|{}'.format(self.seed, salt, key, n).encode('utf-8')).digest()
+        return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+    def _auth(self) -> tuple:
+        with self._lock:
+            self._token += 1
+            self.stats['auth'] += 1
+            token = 'replay-{}'.format(self._token)
+        return 200, json.dumps({'token':token}).encode('utf-8')
+
+    def _data(self, key:str, authorization:str) -> tuple:
+        with self._lock:
+            n = self._seen.get(key, 0)
+            self._seen[key] = n + 1
+            self._requests += 1
+            if self.expire_every and self._requests % self.expire_every == 0:
+                self._token += 1
+            valid = authorization == 'Bearer replay-{}'.format(self._token)
+
+        delay = self.latency + (self.jitter * self._draw(key, n, 'jitter') if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        if not valid:
+            status, body, stat = 401, b'{"Message":"token expired"}', 'expired'
+        elif self.error_rate and self._draw(key, n, 'error') < self.error_rate:
+            status, body, stat = self.error_status, b'{"Message":"injected error"}', 'errors'
+        elif key not in self._records:
+            status, body, stat = 404, b'{"Message":"not recorded"}', 'misses'
+        else:
+            status, body, stat = 200, self._records[key], 'hits'
+        with self._lock:
+            self.stats[stat] += 1
+        return status, body
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _reply(self, status:int, body:bytes):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                if urlsplit(self.path).path.endswith('/OwlApi/auth'):
+                    self._reply(*server._auth())
+                else:
+                    self._reply(404, b'{}')
+
+            def do_GET(self):
+                self._reply(*server._data(self.path, self.headers.get('authorization')))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+class _OwlRecord():
+    # 啟用錄製
+    def enable_record(self, path:str) -> OwlRecorder:
+        '''
+        將之後所有成功的回應錄製至壓縮檔，供 OwlReplayServer 離線重播
+
+        Parameters
+        ----------
+        :param path: str
+            - 錄製檔路徑 (zip)
+
+        Returns
+        ----------
+        OwlRecorder
+
+        Notes
+        ----------
+        - 會重新下載商品表與已載入的時間表並錄製，重播時才能完成連線
+        '''
+        self._recorder = OwlRecorder(path)
+        self._pdid_map()
+        for freq in list(self._calendars()):
+            self._date_table(freq)
+        return self._recorder
+
+    def disable_record(self):
+        if getattr(self, '_recorder', None) is not None:
+            self._recorder.close()
+        self._recorder = None
@@ -0,0 +1,455 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import collections
+import re
+import threading
+import numpy as np
+import pandas as pd
+
+from ._owlerror import _fail
+from ._owlarchive import _ARCHIVE_FUNC
+from .config import colist_dict
+
+# --------------------
+# BLOCK 選股
+# --------------------
+# 可篩選的多股商品，同名欄位以先列出的商品為準
+_SCREEN_FUNC = ('msp', 'chm', 'tim', 'cim')
+
+# 各 OwlData 的選股快取 (_screens) 於建立、取用與淘汰時共用的鎖
+_SCREENS_LOCK = threading.Lock()
+
+_SCREEN_COLUMNS = {}
+for _func in _SCREEN_FUNC:
+    for _col in colist_dict[_func]:
+        if _col != '股票代號':
+            _SCREEN_COLUMNS.setdefault(_col, _func)
+
+# 條件字串: 欄位 運算子 數值，運算子前後需有空白
+_OPERATORS = ('not in', 'between', 'contains', 'in', '<=', '>=', '==', '!=', '<', '>')
+_PATTERN = re.compile(r'^\s*(.+?)\s+(' + '|'.join(re.escape(op) for op in _OPERATORS) + r')\s+(.+?)\s*$')
+
+# 解析條件
+def _parse_filter(expr) -> tuple:
+    '''
+    ('外資買賣超', '>', 1000) 或 '外資買賣超 > 1000'
+    '''
+    if not isinstance(expr, str):
+        col, op, value = expr
+        return col, op, value
+    match = _PATTERN.match(expr)
+    if match is None:
+        raise ValueError('無法解析條件: {}'.format(expr))
+    col, op, value = match.groups()
+    if op in ('in', 'not in', 'between'):
+        value = [v.strip().strip('\'"') for v in value.strip('[]()').split(',')]
+    else:
+        value = value.strip('\'"')
+    return col, op, value
+
+class OwlScreen():
+    def __init__(self, dt:str = None):
+        '''
+        單日全市場的欄式資料，供多條件篩選與排序
+
+        Parameters
+        ----------
+        :param dt: str, default None
+            - 資料日期，格式:yyyymmdd
+
+        [NOTES]
+        ----------
+            - 各商品以 股票代號 對齊，數值欄位存為 float64 陣列，其餘欄位存為類別代碼
+            - 數值欄位於第一次比較時建立排序索引，之後以二分搜尋取出符合的區間
+            - 類別欄位以各類別的布林陣列 (bitmap) 快取，== / in 直接取用
+            - 同一日重複篩選時不重新讀取資料也不重建索引
+            - 加入資料、建立索引與篩選皆持有同一把鎖，可由多個執行緒共用
+        '''
+        self.date = dt
+        self.sids = np.array([], dtype = object)
+        self.products = set()
+        self._pos = {}
+        self._numeric = {}
+        self._codes = {}
+        self._categories = {}
+        self._sorted = {}
+        self._bitmaps = {}
+        # 載入商品、建立索引與篩選共用，可重入
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return 'OwlScreen(date={}, sids={}, columns={})'.format(self.date, len(self.sids), len(self.columns))
+
+    def __len__(self):
+        return len(self.sids)
+
+    @property
+    def columns(self) -> list:
+        return list(self._numeric) + list(self._codes)
+
+    # 加入商品資料
+    def add(self, frame:'DataFrame', name:str = None, expand:bool = True) -> 'OwlScreen':
+        '''
+        以 股票代號 對齊加入一個商品的多股資料，已存在的欄位不覆蓋
+
+        Parameters
+        ----------
+        :param frame: DataFrame
+            - 含 股票代號 欄位的多股表格
+
+        :param name: str, default None
+            - 商品名稱，記錄於 products
+
+        :param expand: bool, default True
+            - 是否加入原本沒有的股票；False 時只對齊既有股票 (如公司基本資料)
+
+        [NOTES]
+        ----------
+            - 沒有可加入的列 (如當日尚未公布) 時不建立欄位也不記錄於 products，之後可再次加入
+        '''
+        with self._lock:
+            if len(frame) == 0:
+                return self
+            sids = frame['股票代號'].astype(str).to_numpy()
+            if expand or len(self.sids) == 0:
+                new = [sid for sid in pd.unique(sids) if sid not in self._pos]
+                if len(new) > 0:
+                    self._grow(new)
+            pos = np.array([self._pos.get(sid, -1) for sid in sids], dtype = np.int64)
+            keep = pos >= 0
+            if not keep.any():
+                return self
+            pos = pos[keep]
+
+            for col in frame.columns:
+                if col == '股票代號' or col in self._numeric or col in self._codes:
+                    continue
+                values = frame[col][keep]
+                if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+                    array = np.full(len(self.sids), np.nan)
+                    array[pos] = values.to_numpy(dtype = np.float64, na_value = np.nan)
+                    self._numeric[col] = array
+                else:
+                    cat = pd.Categorical(values)
+                    codes = np.full(len(self.sids), -1, dtype = np.int32)
+                    codes[pos] = cat.codes
+                    self._codes[col] = codes
+                    self._categories[col] = cat.categories
+            if name is not None:
+                self.products.add(name)
+        return self
+
+    # 新增股票，既有欄位補缺值
+    def _grow(self, new:list):
+        for sid in new:
+            self._pos[sid] = len(self._pos)
+        self.sids = np.concatenate([self.sids, np.array(new, dtype = object)])
+        for col, array in self._numeric.items():
+            self._numeric[col] = np.concatenate([array, np.full(len(new), np.nan)])
+        for col, codes in self._codes.items():
+            self._codes[col] = np.concatenate([codes, np.full(len(new), -1, dtype = np.int32)])
+        self._sorted.clear()
+        self._bitmaps.clear()
+
+    # 數值欄位的排序索引，不含缺值
+    def _sorted_index(self, col:str) -> tuple:
+        with self._lock:
+            index = self._sorted.get(col)
+            if index is None:
+                values = self._numeric[col]
+                order = np.argsort(values, kind = 'stable')
+                order = order[:np.count_nonzero(~np.isnan(values))]
+                index = self._sorted[col] = (order, values[order])
+            return index
+
+    # 數值區間
+    def _range(self, col:str, low = None, high = None, low_inclusive:bool = True, high_inclusive:bool = True) -> 'ndarray':
+        order, values = self._sorted_index(col)
+        start = 0 if low is None else np.searchsorted(values, low, 'left' if low_inclusive else 'right')
+        end = len(values) if high is None else np.searchsorted(values, high, 'right' if high_inclusive else 'left')
+        mask = np.zeros(len(self.sids), dtype = bool)
+        mask[order[start:end]] = True
+        return mask
+
+    # 類別的布林陣列
+    def _bitmap(self, col:str, value) -> 'ndarray':
+        with self._lock:
+            key = (col, value)
+            mask = self._bitmaps.get(key)
+            if mask is None:
+                categories = self._categories[col]
+                code = categories.get_loc(value) if value in categories else -2
+                mask = self._bitmaps[key] = self._codes[col] == code
+            return mask
+
+    def _category_value(self, col:str, value):
+        categories = self._categories[col]
+        if categories.dtype.kind == 'M':
+            return pd.Timestamp(value)
+        if categories.dtype.kind in 'iuf':
+            return float(value)
+        return str(value)
+
+    # 單一條件的布林陣列
+    def mask(self, col:str, op:str, value) -> 'ndarray':
+        '''
+        Parameters
+        ----------
+        :param col: str
+            - 欄位名稱
+
+        :param op: str
+            - '<', '<=', '>', '>=', '==', '!=', 'in', 'not in', 'between'；類別欄位另支援 'contains'
+
+        :param value:
+            - 比較值；in / not in 為 list，between 為 (下限, 上限)，皆含端點
+
+        Returns
+        ----------
+        ndarray
+            - bool，缺值一律不符合
+        '''
+        with self._lock:
+            if col in self._numeric:
+                if op == 'between':
+                    low, high = (float(v) for v in value)
+                    return self._range(col, low, high)
+                if op in ('in', 'not in'):
+                    mask = np.zeros(len(self.sids), dtype = bool)
+                    for v in value:
+                        mask |= self._range(col, float(v), float(v))
+                    return mask if op == 'in' else ~mask & ~np.isnan(self._numeric[col])
+                value = float(value)
+                if op == '>':
+                    return self._range(col, low = value, low_inclusive = False)
+                if op == '>=':
+                    return self._range(col, low = value)
+                if op == '<':
+                    return self._range(col, high = value, high_inclusive = False)
+                if op == '<=':
+                    return self._range(col, high = value)
+                if op == '==':
+                    return self._range(col, value, value)
+                if op == '!=':
+                    return ~self._range(col, value, value) & ~np.isnan(self._numeric[col])
+
+            elif col in self._codes:
+                codes = self._codes[col]
+                valid = codes >= 0
+                if op in ('in', 'not in'):
+                    mask = np.zeros(len(self.sids), dtype = bool)
+                    for v in value:
+                        mask |= self._bitmap(col, self._category_value(col, v))
+                    return mask if op == 'in' else ~mask & valid
+                if op == '==':
+                    return self._bitmap(col, self._category_value(col, value))
+                if op == '!=':
+                    return ~self._bitmap(col, self._category_value(col, value)) & valid
+                if op == 'contains':
+                    hits = np.flatnonzero(self._categories[col].astype(str).str.contains(str(value), regex = False))
+                    return np.isin(codes, hits)
+                # 類別已排序，比較大小即比較代碼
+                categories = self._categories[col]
+                if op == 'between':
+                    low, high = (self._category_value(col, v) for v in value)
+                    return valid & (codes >= categories.searchsorted(low, 'left')) & (codes < categories.searchsorted(high, 'right'))
+                value = self._category_value(col, value)
+                if op == '>':
+                    return valid & (codes >= categories.searchsorted(value, 'right'))
+                if op == '>=':
+                    return valid & (codes >= categories.searchsorted(value, 'left'))
+                if op == '<':
+                    return valid & (codes < categories.searchsorted(value, 'left'))
+                if op == '<=':
+                    return valid & (codes < categories.searchsorted(value, 'right'))
+            else:
+                raise KeyError(col)
+            raise ValueError('不支援的運算子: {}'.format(op))
+
+    def _values(self, col:str) -> 'ndarray':
+        if col in self._numeric:
+            return self._numeric[col]
+        return self._codes[col]
+
+    def _column(self, col:str, rows:'ndarray'):
+        if col in self._numeric:
+            return self._numeric[col][rows]
+        return pd.Categorical.from_codes(self._codes[col][rows], categories = self._categories[col])
+
+    # 篩選與排序
+    def query(self, filters = None, rank = None, ascending = True, top:int = None, colist = None) -> 'DataFrame':
+        '''
+        Parameters
+        ----------
+        :param filters: list, default None
+            - 條件清單，全部成立才選入；每個條件為 (欄位, 運算子, 數值) 或 '欄位 運算子 數值' 字串
+
+        :param rank: str or list, default None
+            - 排序欄位
+
+        :param ascending: bool or list, default True
+            - 是否遞增排序，缺值排在最後
+
+        :param top: int, default None
+            - 只取前幾檔
+
+        :param colist: list, default None
+            - 輸出欄位，未輸入則輸出條件與排序用到的欄位
+
+        Returns
+        ----------
+        DataFrame
+            - 股票代號 + 輸出欄位
+        '''
+        with self._lock:
+            filters = [_parse_filter(expr) for expr in (filters or [])]
+            ranks = [rank] if isinstance(rank, str) else list(rank or [])
+            orders = [ascending] * len(ranks) if isinstance(ascending, bool) else list(ascending)
+
+            mask = np.ones(len(self.sids), dtype = bool)
+            for col, op, value in filters:
+                mask &= self.mask(col, op, value)
+            rows = np.flatnonzero(mask)
+
+            if len(ranks) > 0:
+                keys = []
+                for col, asc in zip(ranks[::-1], orders[::-1]):
+                    values = self._values(col)[rows].astype(np.float64)
+                    if col in self._codes:
+                        values[values < 0] = np.nan
+                    keys.append(values if asc else -values)
+                # 缺值排在最後
+                rows = rows[np.lexsort(keys)]
+            if top is not None:
+                rows = rows[:top]
+
+            if colist is None:
+                colist = list(dict.fromkeys(['股票名稱'] * ('股票名稱' in self._codes) + [f[0] for f in filters] + ranks))
+            result = pd.DataFrame({'股票代號':self.sids[rows]})
+            for col in colist:
+                result[col] = self._column(col, rows)
+            return result
+
+class _OwlScreen():
+    # 每個 OwlData 保留的選股日期數
+    _screen_keep = 8
+
+    # 取得單日選股資料
+    def screener(self, dt:str, products = _SCREEN_FUNC) -> OwlScreen:
+        '''
+        載入指定日期的 msp、chm、tim 與 cim，依 股票代號 對齊為欄式資料
+
+        Parameters
+        ----------
+        :param dt: str
+            - 指定一個交易日期，格式:yyyymmdd，8碼
+
+        :param products: tuple, default ('msp', 'chm', 'tim', 'cim')
+            - 需要的商品，已載入的商品不重複讀取
+
+        Returns
+        ----------
+        OwlScreen
+
+        Notes
+        ----------
+        - 啟用 enable_archive 時先讀取本地分區，沒有的日期下載後寫入分區
+        - 未啟用時以一般查詢取得，啟用 cache_dir 時由回應快取提供
+        - 最近使用的 8 個日期保留於記憶體
+        - 回應沒有資料的商品不記錄為已載入，下次呼叫時重新讀取
+        '''
+        if self._date_freq(dt, dt, 'd') == 'error':
+            return None
+        with _SCREENS_LOCK:
+            if getattr(self, '_screens', None) is None:
+                self._screens = collections.OrderedDict()
+            screens = self._screens
+            screen = screens.get(dt)
+            if screen is None:
+                screen = screens[dt] = OwlScreen(dt)
+            screens.move_to_end(dt)
+            while len(screens) > self._screen_keep:
+                screens.popitem(last = False)
+
+        # 日資料先加入以決定股票清單，公司基本資料只對齊；載入期間持有該日的鎖，同一商品只讀取一次
+        with screen._lock:
+            for func in sorted(set(products) - screen.products, key = _SCREEN_FUNC.index):
+                frame = self._screen_frame(func, dt)
+                if frame is None:
+                    return None
+                screen.add(frame, func, expand = func != 'cim')
+        return screen
+
+    def _screen_frame(self, func:str, dt:str) -> 'DataFrame':
+        if func == 'cim':
+            return self.cim()
+        archive = getattr(self, '_archive', None)
+        if archive is None:
+            return getattr(self, func)(dt)
+        pdid = self._get_pdid(_ARCHIVE_FUNC[func]['d'])
+        if len(archive.partitions(pdid, 'd', dt, dt)) > 0:
+            return archive.read(pdid, 'd', dt).to_pandas()
+        return self.archive(func, dt)
+
+    # 全市場選股
+    def screen(self, dt:str, filters = None, rank = None, ascending = True, top:int = None, colist = None) -> 'DataFrame':
+        '''
+        依指定日期，以 msp、chm、tim、cim 欄位的條件篩選全市場股票並排序
+
+        Parameters
+        ----------
+        :param dt: str
+            - 指定一個交易日期，格式:yyyymmdd，8碼
+
+        :param filters: list, default None
+            - 條件清單，全部成立才選入，例如
+              [('外資買賣超', '>', 1000), 'RSI(5) < 30', ('產業名稱', '==', '半導體')]
+            - 運算子: <, <=, >, >=, ==, !=, in, not in, between, contains (文字)
+
+        :param rank: str or list, default None
+            - 排序欄位，如 '外資買賣超'
+
+        :param ascending: bool or list, default True
+            - 是否遞增排序
+
+        :param top: int, default None
+            - 只取前幾檔
+
+        :param colist: list, default None
+            - 輸出欄位，未輸入則輸出股票名稱與條件、排序用到的欄位
+
+        Returns
+        ----------
+        DataFrame
+
+        Notes
+        ----------
+        - 只載入條件與輸出欄位所屬的商品，同一日再次篩選時直接使用記憶體中的資料與索引
+        - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空
+        '''
+        try:
+            filters = [_parse_filter(expr) for expr in (filters or [])]
+        except (ValueError, TypeError):
+            return _fail(self, 'ExError', ', 條件格式為 (欄位, 運算子, 數值)')
+        ranks = [rank] if isinstance(rank, str) else list(rank or [])
+        cols = [f[0] for f in filters] + ranks + list(colist or [])
+        if any(col not in _SCREEN_COLUMNS for col in cols):
+            return _fail(self, 'ColumnsError')
+
+        products = {_SCREEN_COLUMNS[col] for col in cols} | {'msp'}
+        screen = self.screener(dt, products)
+        if screen is None:
+            return None
+        try:
+            return screen.query(filters, rank, ascending, top, colist)
+        except KeyError:
+            return _fail(self, 'ColumnsError')
+        except ValueError as e:
+            return _fail(self, 'ExError', ', {}'.format(e))
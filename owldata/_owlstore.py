@@ -0,0 +1,173 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import datetime
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+from ._owlerror import OwlError, _fail, _check_colist
+from ._owlrate import _as_bulk
+
+# --------------------
+# BLOCK 增量資料庫
+# --------------------
+class OwlStore():
+    def __init__(self, path:str):
+        '''
+        個股歷史資料的本地儲存，每檔股票一個檔案
+
+        Parameters
+        ----------
+        :param path: str
+            - 資料夾路徑，依 函數/股票代號.pkl 存放
+
+        [NOTES]
+        ----------
+            - data: 已下載的資料列
+            - covered: 已查詢過的交易日 (yyyymmdd 整數)，用以避免重複下載停牌日
+        '''
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'OwlStore(path={})'.format(self.path)
+
+    def _file(self, func:str, sid:str) -> str:
+        return os.path.join(self.path, func, sid + '.pkl')
+
+    def load(self, func:str, sid:str) -> dict:
+        fp = self._file(func, sid)
+        if not os.path.exists(fp):
+            return {'data':None, 'covered':np.array([], dtype = np.int64)}
+        return pd.read_pickle(fp)
+
+    def save(self, func:str, sid:str, entry:dict):
+        fp = self._file(func, sid)
+        with self._lock:
+            if not os.path.exists(os.path.dirname(fp)):
+                os.makedirs(os.path.dirname(fp))
+        tmp = fp + '.{}.tmp'.format(threading.get_ident())
+        pd.to_pickle(entry, tmp)
+        os.replace(tmp, fp)
+
+class _OwlSync():
+    # 支援增量同步的函數
+    _sync_func = ('ssp', 'chs', 'tis')
+
+    # 無資料的交易日超過此日數才視為停牌並列入已查詢，較近的日子可能尚未公告或補登
+    _sync_settle = 7
+
+    # 啟用增量資料庫
+    def enable_store(self, path:str) -> OwlStore:
+        '''
+        啟用個股歷史資料的本地增量資料庫，供 sync 使用
+
+        Parameters
+        ----------
+        :param path: str
+            - 資料夾路徑
+
+        Returns
+        ----------
+        OwlStore
+        '''
+        self._store = OwlStore(path)
+        return self._store
+
+    # 增量同步
+    def sync(self, func:str, sid:str, bpd:str, epd:str, colist=None) -> 'DataFrame':
+        '''
+        只下載本地尚未擁有的交易日，合併後回傳完整區間
+
+        Parameters
+        ----------
+        :param func: str
+            - 'ssp', 'chs' 或 'tis'
+
+        :param sid: str
+            - 台股股票代號
+
+        :param bpd: str
+            - 起始日，格式:yyyymmdd 8碼
+
+        :param epd: str
+            - 結束日，格式:yyyymmdd 8碼
+
+        :param colist: list, default None
+            - 填入欲查看的欄位名稱，未寫輸入則取全部欄位
+
+        Returns
+        ----------
+        DataFrame
+
+        Notes
+        ----------
+        - 需先以 enable_store 啟用
+        - 以交易日表計算缺少的交易日，僅請求涵蓋缺口的最小區間
+        - 無資料的交易日於 _sync_settle (預設 7) 日後才視為停牌，之前每次同步皆會重新查詢
+        - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空
+
+        '''
+        if getattr(self, '_store', None) is None:
+            _fail(self, 'ExError', ', 請先執行 enable_store')
+            return None
+        if func not in self._sync_func:
+            _fail(self, 'ExError', ', 僅支援 ' + ', '.join(self._sync_func))
+            return None
+        if not _check_colist(self, func, colist) or self._date_freq(bpd, epd, 'd') == 'error':
+            return None
+
+        # 區間內的交易日
+        days = self.calendar('d').range(bpd, epd)
+
+        entry = self._store.load(func, sid)
+        missing = np.setdiff1d(days, entry['covered'])
+
+        if len(missing) > 0:
+            start, end = str(missing.min()), str(missing.max())
+            spec = getattr(self, '_req_' + func)(sid, start, end)
+            if spec is None:
+                return None
+            get_data_url, pdid, opts = spec
+            opts['colists'] = None
+            result = self._check(result = _as_bulk(self._data_from_owl, get_data_url, pdid), pd_id = pdid, **opts)
+            if result is None:
+                return None
+
+            data = entry['data']
+            if len(result) > 0:
+                if data is None or len(data) == 0:
+                    data = result
+                else:
+                    data = pd.concat([data, result], ignore_index = True, sort = False)
+                data = data.drop_duplicates('日期', keep = 'last').sort_values('日期').reset_index(drop = True)
+
+            # 有資料或已無資料超過 _sync_settle 日的交易日才列入已查詢，其餘下次同步再補
+            settled = int((datetime.date.today() - datetime.timedelta(days = self._sync_settle)).strftime('%Y%m%d'))
+            window = days[(days >= missing.min()) & (days <= missing.max())]
+            returned = [] if data is None else data['日期'].dt.strftime('%Y%m%d').astype(np.int64).values
+            done = window[(window < settled) | np.isin(window, returned)]
+
+            entry = {'data':data, 'covered':np.union1d(entry['covered'], done)}
+            self._store.save(func, sid, entry)
+
+        data = entry['data']
+        if data is None or len(data) == 0:
+            _fail(self, 'SidError')
+            return data
+
+        data = data[data['日期'].between(pd.to_datetime(bpd), pd.to_datetime(epd))].reset_index(drop = True)
+        if colist is not None:
+            try:
+                data = data[colist].copy()
+            except KeyError:
+                return _fail(self, 'ColumnsError')
+        return data
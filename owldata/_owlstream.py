@@ -0,0 +1,212 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import codecs
+import json
+import numpy as np
+import pandas as pd
+
+# --------------------
+# BLOCK 串流解析
+# --------------------
+# 每次讀取的位元組數
+_CHUNK = 64 * 1024
+
+# 每批轉置為欄位的列數
+_BLOCK = 4096
+
+_WHITESPACE = ' \t\n\r'
+
+class _Reader():
+    '''
+    以片段讀入 UTF-8 位元組，保留尚未解析的部分
+    '''
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    # 讀入下一個片段，並丟棄已解析的部分
+    def more(self) -> bool:
+        if self.eof:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.buf = self.buf[self.pos:] + self._decoder.decode(b'', final = True)
+            self.pos = 0
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + self._decoder.decode(chunk)
+        self.pos = 0
+        return True
+
+    # 略過空白並回傳下一個字元
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.more():
+                raise ValueError('JSON 內容不完整')
+
+    def expect(self, char:str):
+        if self.peek() != char:
+            raise ValueError('JSON 格式錯誤，預期 {}'.format(char))
+        self.pos += 1
+
+    # 解析一個完整的值，片段不足時繼續讀入
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self._json.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.more():
+                    continue
+                raise
+            # 數字可能被片段截斷，需確認其後仍有字元
+            if end == len(self.buf) and not self.eof and self.more():
+                continue
+            self.pos = end
+            return obj
+
+    # 以一次 C 解析取出緩衝區內所有完整的列，至少一列
+    def rows(self) -> list:
+        self.peek()
+        end = len(self.buf)
+        for _ in range(2):
+            end = self.buf.rfind(']', self.pos, end)
+            if end < 0:
+                break
+            try:
+                rows = json.loads('[' + self.buf[self.pos:end + 1] + ']')
+            except ValueError:
+                # 右括號位於字串內或為 Data 結尾，改試前一個
+                continue
+            self.pos = end + 1
+            return rows
+        return [self.value()]
+
+# 解析 Data 陣列至欄位暫存
+def _read_rows(reader:_Reader, numeric:list) -> list:
+    columns = None
+    block = []
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return []
+
+    while True:
+        block.extend(reader.rows())
+        if len(block) >= _BLOCK:
+            columns = _extend(columns, block, numeric)
+            block = []
+        char = reader.peek()
+        reader.pos += 1
+        if char == ']':
+            break
+        if char != ',':
+            raise ValueError('JSON 格式錯誤，預期 , 或 ]')
+
+    columns = _extend(columns, block, numeric)
+    return [_join(col) for col in columns] if columns is not None else []
+
+# 將一批列轉置為欄位，數值欄位直接轉為浮點數陣列
+def _extend(columns:list, block:list, numeric:list) -> list:
+    if len(block) == 0:
+        return columns
+    values = list(zip(*block))
+    if columns is None:
+        columns = [[] for _ in values]
+    if len(values) != len(columns) or any(len(row) != len(columns) for row in block):
+        raise ValueError('各列欄位數不一致')
+    for i, col in enumerate(values):
+        if i < len(numeric) and numeric[i]:
+            try:
+                col = pd.to_numeric(np.array(col, dtype = object)).astype(np.float64)
+            except (TypeError, ValueError):
+                numeric[i] = False
+        columns[i].append(col)
+    return columns
+
+def _join(blocks:list):
+    if all(isinstance(block, np.ndarray) for block in blocks):
+        return np.concatenate(blocks)
+    result = []
+    for block in blocks:
+        result.extend(block.tolist() if isinstance(block, np.ndarray) else block)
+    return result
+
+# 串流解析 API 回應
+def _decode_stream(chunks, numeric:set = None) -> 'DataFrame':
+    '''
+    自位元組片段逐批解析 {"Title": [...], "Data": [[...], ...]}，直接寫入欄位暫存
+
+    Parameters
+    ----------
+    :param chunks: iterable of bytes
+        - 回應內容片段，如 Response.iter_content()
+
+    :param numeric: set, default None
+        - 解析時即轉為浮點數的欄位名稱，轉換失敗的欄位保留字串
+
+    Returns
+    ----------
+    DataFrame
+        - 未指定 numeric 時與 pd.DataFrame(data['Data'], columns = data['Title']) 相同
+
+    [NOTES]
+    ----------
+        - 不建立完整的回應字串與二維串列，數值欄位不保留逐格字串
+    '''
+    reader = _Reader(chunks)
+    title = None
+    columns = None
+    has_data = False
+
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+    else:
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            if key == 'Data' and reader.peek() == '[':
+                flags = [col in numeric for col in title] if numeric and title is not None else []
+                columns = _read_rows(reader, flags)
+                has_data = True
+            elif key == 'Title':
+                title = reader.value()
+            else:
+                reader.value()
+            char = reader.peek()
+            reader.pos += 1
+            if char == '}':
+                break
+            if char != ',':
+                raise ValueError('JSON 格式錯誤，預期 , 或 }')
+
+    if not has_data or not columns:
+        return pd.DataFrame(None, columns = title)
+    if title is None:
+        title = range(len(columns))
+    if len(title) != len(columns):
+        raise ValueError('欄位數與資料不符')
+    return pd.DataFrame(dict(zip(range(len(columns)), columns))).set_axis(list(title), axis = 1)
+
+# 將完整位元組切為片段
+def _chunked(body:bytes, size:int = _CHUNK):
+    view = memoryview(body)
+    for start in range(0, len(view), size):
+        yield view[start:start + size]
@@ -0,0 +1,832 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from ._owlerror import OwlException, OwlDateError, OwlSidError, _as_raise, _check_range, _fail, _raising
+
+# --------------------
+# BLOCK 技術指標
+# --------------------
+# 運算皆以 日期 x 股票 的二維陣列進行，遞迴指標逐日計算、每日同時更新所有股票
+# 缺值 (未上市、停牌) 當日輸出 NaN，遞迴狀態沿用前一個有效值
+
+# 指數平滑，alpha 為新值權重；未給 seed 時以第一個有效值為起點
+def _smooth(x:'ndarray', alpha:float, seed:float = None) -> 'ndarray':
+    out = np.empty(x.shape)
+    state = np.full(x.shape[1:], np.nan if seed is None else float(seed))
+    for t in range(len(x)):
+        v = x[t]
+        np.copyto(state, v, where = np.isnan(state))
+        # v 為缺值時 out 亦為缺值，state 不更新
+        row = out[t]
+        np.subtract(v, state, out = row)
+        row *= alpha
+        row += state
+        np.copyto(state, row, where = ~np.isnan(v))
+    return out
+
+def _ema(x:'ndarray', n:int) -> 'ndarray':
+    return _smooth(x, 2 / (n + 1))
+
+# Wilder 平滑 (RSI、DMI)
+def _wilder(x:'ndarray', n:int) -> 'ndarray':
+    return _smooth(x, 1 / n)
+
+# 各股的有效交易日 (有收盤價) 依序移至前端，滾動視窗只計入有效交易日，停牌日不佔視窗
+def _bar_order(close:'ndarray') -> 'ndarray':
+    return np.argsort(np.isnan(close), axis = 0, kind = 'stable')
+
+def _pack(x:'ndarray', order:'ndarray') -> 'ndarray':
+    return np.take_along_axis(x, order, axis = 0)
+
+# 還原為 日期 x 股票，非交易日為 NaN
+def _unpack(packed:'ndarray', order:'ndarray', close:'ndarray') -> 'ndarray':
+    out = np.empty(packed.shape)
+    np.put_along_axis(out, order, packed, axis = 0)
+    out[np.isnan(close)] = np.nan
+    return out
+
+# 近 n 列的最大、最小值，缺值不列入
+def _rolling_extreme(x:'ndarray', n:int, func) -> 'ndarray':
+    fill = -np.inf if func is np.max else np.inf
+    filled = np.where(np.isnan(x), fill, x)
+    out = np.full(x.shape, np.nan)
+    if len(x) == 0:
+        return out
+    pad = np.concatenate([np.full((n - 1,) + x.shape[1:], fill), filled])
+    out[:] = func(sliding_window_view(pad, n, axis = 0), axis = -1)
+    out[np.isinf(out)] = np.nan
+    return out
+
+# 近 n 列的平均與標準差，視窗內有缺值時為 NaN
+def _rolling_mean_std(x:'ndarray', n:int) -> tuple:
+    valid = ~np.isnan(x)
+    zero = np.zeros((1,) + x.shape[1:])
+    s1 = np.concatenate([zero, np.cumsum(np.where(valid, x, 0.0), axis = 0)])
+    s2 = np.concatenate([zero, np.cumsum(np.where(valid, x * x, 0.0), axis = 0)])
+    cnt = np.concatenate([zero, np.cumsum(valid, axis = 0)])
+
+    mean = np.full(x.shape, np.nan)
+    std = np.full(x.shape, np.nan)
+    if len(x) >= n:
+        k = slice(n - 1, None)
+        c = cnt[n:] - cnt[:-n]
+        m = (s1[n:] - s1[:-n]) / n
+        var = np.maximum((s2[n:] - s2[:-n]) / n - m * m, 0.0)
+        full = c == n
+        mean[k] = np.where(full, m, np.nan)
+        std[k] = np.where(full, np.sqrt(var), np.nan)
+    return mean, std
+
+# 前一個有效值
+def _previous(x:'ndarray') -> 'ndarray':
+    frame = pd.DataFrame(x)
+    return frame.ffill().shift(1).where(frame.notna()).to_numpy()
+
+def _ratio(num:'ndarray', den:'ndarray', default:float = np.nan) -> 'ndarray':
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        out = 100 * num / den
+    return np.where(den == 0, default, out)
+
+class OwlIndicators():
+    def __init__(self, kd:int = 9, rsi:tuple = (5, 10), macd:tuple = (12, 26, 9), wr:tuple = (5, 10),
+                 dmi:int = 14, ma:tuple = (), bbands:tuple = None):
+        '''
+        以 NumPy 計算技術指標，欄位名稱與 tis / tim 相同
+
+        Parameters
+        ----------
+        :param kd: int, default 9
+            - KD 的 RSV 期數，輸出 K(9)、D(9)；None 為不計算
+
+        :param rsi: tuple, default (5, 10)
+            - RSI 期數，輸出 RSI(5)、RSI(10)
+
+        :param macd: tuple, default (12, 26, 9)
+            - (短期, 長期, 訊號) EMA 期數，輸出 DIF、MACD、DIF-MACD；None 為不計算
+
+        :param wr: tuple, default (5, 10)
+            - 威廉指標期數，輸出 W%R(5)、W%R(10)
+
+        :param dmi: int, default 14
+            - DMI 期數，輸出 +DI(14)、-DI(14)、ADX(14)；None 為不計算
+
+        :param ma: tuple, default ()
+            - 收盤價移動平均期數，輸出 MA(5) 等
+
+        :param bbands: tuple, default None
+            - (期數, 標準差倍數)，如 (20, 2)，輸出 BB上軌(20)、BB中軌(20)、BB下軌(20)
+
+        [NOTES]
+        ----------
+            - K、D 起始值 50，K = 2/3 前K + 1/3 RSV，D = 2/3 前D + 1/3 K
+            - RSI、DMI 以 Wilder 平滑 (1/n)；MACD 以 EMA (2/(n+1)) 平滑 DI = (最高 + 最低 + 2 收盤) / 4
+            - W%R = (n 日最高 - 收盤) / (n 日最高 - n 日最低) x 100
+            - KD、W%R、MA、布林通道的 n 日為各股最近 n 個有收盤價的交易日，停牌日不計入
+            - 遞迴指標需足夠的前置資料才會收斂，建議多取 100 個交易日以上
+        '''
+        self.kd = kd
+        self.rsi = tuple(rsi or ())
+        self.macd = tuple(macd) if macd else None
+        self.wr = tuple(wr or ())
+        self.dmi = dmi
+        self.ma = tuple(ma or ())
+        self.bbands = tuple(bbands) if bbands else None
+
+    def __repr__(self):
+        return 'OwlIndicators({})'.format(', '.join(self.columns))
+
+    # 輸出欄位
+    @property
+    def columns(self) -> list:
+        cols = []
+        if self.kd:
+            cols += ['K({})'.format(self.kd), 'D({})'.format(self.kd)]
+        cols += ['RSI({})'.format(n) for n in self.rsi]
+        if self.macd:
+            cols += ['DIF', 'MACD', 'DIF-MACD']
+        cols += ['W%R({})'.format(n) for n in self.wr]
+        if self.dmi:
+            cols += ['+DI({})'.format(self.dmi), '-DI({})'.format(self.dmi), 'ADX({})'.format(self.dmi)]
+        cols += ['MA({})'.format(n) for n in self.ma]
+        if self.bbands:
+            n = self.bbands[0]
+            cols += ['BB上軌({})'.format(n), 'BB中軌({})'.format(n), 'BB下軌({})'.format(n)]
+        return cols
+
+    # 最長回溯期數，作為預設前置資料長度的參考
+    @property
+    def lookback(self) -> int:
+        periods = [self.kd or 0, self.dmi or 0] + list(self.rsi) + list(self.wr) + list(self.ma)
+        if self.macd:
+            periods += [self.macd[1] + self.macd[2]]
+        if self.bbands:
+            periods += [self.bbands[0]]
+        return max(periods)
+
+    # 陣列運算
+    def arrays(self, high:'ndarray', low:'ndarray', close:'ndarray') -> dict:
+        '''
+        Parameters
+        ----------
+        :param high, low, close: ndarray
+            - 日期 x 股票 的最高價、最低價、收盤價，日期由舊到新，缺值為 NaN
+
+        Returns
+        ----------
+        dict
+            - {欄位名稱: 日期 x 股票 ndarray}
+        '''
+        high, low, close = (np.asarray(x, dtype = np.float64) for x in (high, low, close))
+        out = {}
+        hh, ll = {}, {}
+        order = _bar_order(close)
+        def extreme(n):
+            if n not in hh:
+                hh[n] = _unpack(_rolling_extreme(_pack(high, order), n, np.max), order, close)
+                ll[n] = _unpack(_rolling_extreme(_pack(low, order), n, np.min), order, close)
+            return hh[n], ll[n]
+        def mean_std(n):
+            mean, std = _rolling_mean_std(_pack(close, order), n)
+            return _unpack(mean, order, close), _unpack(std, order, close)
+
+        if self.kd:
+            h, l = extreme(self.kd)
+            rsv = _ratio(close - l, h - l)
+            k = _smooth(rsv, 1 / 3, seed = 50)
+            # 區間無振幅時 RSV 無意義，K、D 沿用前值
+            k = np.where(np.isnan(rsv) & ~np.isnan(close), pd.DataFrame(k).ffill().to_numpy(), k)
+            out['K({})'.format(self.kd)] = k
+            out['D({})'.format(self.kd)] = _smooth(k, 1 / 3, seed = 50)
+
+        if len(self.rsi) > 0:
+            change = close - _previous(close)
+            up, down = np.fmax(change, 0), np.fmax(-change, 0)
+            up[np.isnan(change)] = np.nan
+            down[np.isnan(change)] = np.nan
+            for n in self.rsi:
+                gain, loss = _wilder(up, n), _wilder(down, n)
+                out['RSI({})'.format(n)] = _ratio(gain, gain + loss, 50.0)
+
+        if self.macd:
+            short, long, signal = self.macd
+            di = (high + low + 2 * close) / 4
+            dif = _ema(di, short) - _ema(di, long)
+            macd = _ema(dif, signal)
+            out['DIF'] = dif
+            out['MACD'] = macd
+            out['DIF-MACD'] = dif - macd
+
+        for n in self.wr:
+            h, l = extreme(n)
+            out['W%R({})'.format(n)] = _ratio(h - close, h - l)
+
+        if self.dmi:
+            n = self.dmi
+            prev_close, prev_high, prev_low = _previous(close), _previous(high), _previous(low)
+            tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+            tr[np.isnan(close)] = np.nan
+            move_up, move_down = high - prev_high, prev_low - low
+            plus = np.where((move_up > move_down) & (move_up > 0), move_up, 0.0)
+            minus = np.where((move_down > move_up) & (move_down > 0), move_down, 0.0)
+            first = np.isnan(prev_high)
+            plus[first], minus[first] = np.nan, np.nan
+            tr[first] = np.nan
+
+            atr = _wilder(tr, n)
+            pdi = _ratio(_wilder(plus, n), atr)
+            mdi = _ratio(_wilder(minus, n), atr)
+            dx = _ratio(np.abs(pdi - mdi), pdi + mdi, 0.0)
+            dx[np.isnan(pdi)] = np.nan
+            out['+DI({})'.format(n)] = pdi
+            out['-DI({})'.format(n)] = mdi
+            out['ADX({})'.format(n)] = _wilder(dx, n)
+
+        for n in self.ma:
+            out['MA({})'.format(n)] = mean_std(n)[0]
+
+        if self.bbands:
+            n, width = self.bbands
+            mid, std = mean_std(n)
+            out['BB上軌({})'.format(n)] = mid + width * std
+            out['BB中軌({})'.format(n)] = mid
+            out['BB下軌({})'.format(n)] = mid - width * std
+        return out
+
+    # 表格運算
+    def compute(self, prices:'DataFrame') -> 'DataFrame':
+        '''
+        計算價格表的技術指標
+
+        Parameters
+        ----------
+        :param prices: DataFrame
+            - ssp 表格: 輸出 日期 + 指標欄位，同 tis
+            - ssp_many 長表格 (含 股票代號、日期 欄位): 輸出 股票代號、日期 + 指標欄位
+            - msp_range 面板 (索引為 日期、股票代號): 輸出相同索引的指標面板，同 tim_range
+
+        Returns
+        ----------
+        DataFrame
+        '''
+        fields = ['最高價', '最低價', '收盤價']
+        index = prices.index
+        if isinstance(index, pd.MultiIndex):
+            dates, sids = index.get_level_values('日期'), index.get_level_values('股票代號')
+        elif '股票代號' in prices.columns:
+            dates, sids = pd.Index(prices['日期']), pd.Index(prices['股票代號'])
+        else:
+            dates, sids = pd.Index(prices['日期']), pd.Index(np.zeros(len(prices), dtype = np.int64))
+
+        # 轉為 日期 x 股票 陣列
+        date_keys = pd.Index(dates.unique()).sort_values()
+        sid_keys = pd.Index(sids.unique())
+        i, j = date_keys.get_indexer(dates), sid_keys.get_indexer(sids)
+        arrays = []
+        for field in fields:
+            array = np.full((len(date_keys), len(sid_keys)), np.nan)
+            array[i, j] = pd.to_numeric(prices[field], errors = 'coerce').to_numpy(dtype = np.float64, na_value = np.nan)
+            arrays.append(array)
+
+        values = self.arrays(*arrays)
+        result = pd.DataFrame({col:values[col][i, j] for col in self.columns}, index = index)
+        if isinstance(index, pd.MultiIndex):
+            return result
+
+        keys = ['股票代號', '日期'] if '股票代號' in prices.columns else ['日期']
+        for pos, key in enumerate(keys):
+            result.insert(pos, key, prices[key].to_numpy())
+        return result.reset_index(drop = True)
+
+    # 與 API 結果比對
+    def parity(self, computed:'DataFrame', recorded:'DataFrame', skip:int = 0, tol:float = 0.01) -> 'DataFrame':
+        '''
+        比對本地計算與 tis / tim 回應的差異
+
+        Parameters
+        ----------
+        :param computed: DataFrame
+            - compute() 的結果
+
+        :param recorded: DataFrame
+            - tis、tis_many 或 tim_range 的結果
+
+        :param skip: int, default 0
+            - 每檔略過前幾筆，排除遞迴指標尚未收斂的部分
+
+        :param tol: float, default 0.01
+            - 視為相符的絕對誤差，API 數值四捨五入至小數第二位
+
+        Returns
+        ----------
+        DataFrame
+            - 以欄位為索引: rows 比對筆數、max_abs 最大誤差、mean_abs 平均誤差、match 相符比例
+        '''
+        keys = [key for key in ('股票代號', '日期') if key in recorded.columns]
+        left = computed if len(keys) == 0 else computed.set_index(keys)
+        right = recorded if len(keys) == 0 else recorded.set_index(keys)
+        left = left.sort_index()
+        if skip > 0:
+            order = left.groupby(level = '股票代號').cumcount() if '股票代號' in left.index.names else pd.Series(np.arange(len(left)), index = left.index)
+            left = left[order.to_numpy() >= skip]
+
+        rows = []
+        for col in self.columns:
+            if col not in right.columns:
+                continue
+            a, b = left[col].align(pd.to_numeric(right[col], errors = 'coerce'), join = 'inner')
+            both = a.notna() & b.notna()
+            diff = (a[both] - b[both]).abs()
+            rows.append((col, int(both.sum()), diff.max() if len(diff) else np.nan,
+                         diff.mean() if len(diff) else np.nan, (diff <= tol + 1e-9).mean() if len(diff) else np.nan))
+        return pd.DataFrame(rows, columns = ['column', 'rows', 'max_abs', 'mean_abs', 'match']).set_index('column')
+
+# 單步指數平滑，回傳 (輸出, 新狀態)，規則同 _smooth
+def _advance(state:'ndarray', v:'ndarray', alpha:float) -> tuple:
+    base = np.where(np.isnan(state), v, state)
+    out = (v - base) * alpha + base
+    return out, np.where(np.isnan(v), state, out)
+
+# 狀態檔格式版本
+_STATE_VERSION = 2
+
+class OwlIndicatorState():
+    def __init__(self, indicators:OwlIndicators = None):
+        '''
+        逐日累加的技術指標狀態，每檔只保留固定大小的遞迴值與近期價格，新增一日的成本與歷史長度無關
+
+        Parameters
+        ----------
+        :param indicators: OwlIndicators, default None
+            - 指標與期數設定，預設同 tis
+
+        [NOTES]
+        ----------
+            - update() 以一日的 msp 橫斷面更新並回傳當日指標，結果與 OwlIndicators.compute() 相同
+            - preview() 以盤中 tsp 報價試算，不改變狀態
+            - 近期價格存於各股的環狀緩衝區，長度為 KD、W%R、MA、布林通道的最長期數，只寫入有收盤價的交易日
+            - save() / load() 保存狀態，重新啟動後可接續更新
+        '''
+        self.indicators = indicators if indicators is not None else OwlIndicators()
+        self.sids = []
+        self.date = None
+        self._pos = {}
+        ind = self.indicators
+        windows = [ind.kd or 0] + list(ind.wr) + list(ind.ma) + ([ind.bbands[0]] if ind.bbands else [])
+        self._size = max([1] + [n - 1 for n in windows])
+        # 各股已寫入緩衝區的交易日數
+        self._count = np.zeros(0, dtype = np.int64)
+
+        # 各狀態的初始值，新股票加入時以此補齊
+        self._init = {'high':np.nan, 'low':np.nan, 'close':np.nan}
+        if ind.kd:
+            self._init.update({'k':50.0, 'k_last':np.nan, 'd':50.0})
+        for n in ind.rsi:
+            self._init.update({'gain{}'.format(n):np.nan, 'loss{}'.format(n):np.nan})
+        if ind.macd:
+            self._init.update({'ema_short':np.nan, 'ema_long':np.nan, 'ema_signal':np.nan})
+        if ind.dmi:
+            self._init.update({'atr':np.nan, 'plus':np.nan, 'minus':np.nan, 'adx':np.nan})
+        self._state = {key:np.empty(0) for key in self._init}
+        self._buffers = {field:np.empty((self._size, 0)) for field in ('high', 'low', 'close')}
+
+    def __repr__(self):
+        return 'OwlIndicatorState({} sids, date={})'.format(len(self.sids), self.date)
+
+    # 股票代號對應的位置，新股票補上初始狀態
+    def _locate(self, sids) -> 'ndarray':
+        new = [sid for sid in dict.fromkeys(sids) if sid not in self._pos]
+        if len(new) > 0:
+            for sid in new:
+                self._pos[sid] = len(self.sids)
+                self.sids.append(sid)
+            for key, init in self._init.items():
+                self._state[key] = np.concatenate([self._state[key], np.full(len(new), init)])
+            for field, buf in self._buffers.items():
+                self._buffers[field] = np.concatenate([buf, np.full((self._size, len(new)), np.nan)], axis = 1)
+            self._count = np.concatenate([self._count, np.zeros(len(new), dtype = np.int64)])
+        return np.array([self._pos[sid] for sid in sids], dtype = np.int64)
+
+    # 各股近 n - 1 個交易日的價格 (不含當日)，不足時為 NaN
+    def _recent(self, field:str, n:int) -> 'ndarray':
+        idx = (self._count - 1 - np.arange(n - 1)[:, None]) % self._size
+        return np.take_along_axis(self._buffers[field], idx, axis = 0)
+
+    def _extreme(self, high:'ndarray', low:'ndarray', n:int) -> tuple:
+        return (np.fmax.reduce(np.vstack([self._recent('high', n), high]), axis = 0),
+                np.fmin.reduce(np.vstack([self._recent('low', n), low]), axis = 0))
+
+    def _mean_std(self, close:'ndarray', n:int) -> tuple:
+        window = np.vstack([self._recent('close', n), close])
+        full = ~np.isnan(window).any(axis = 0)
+        return np.where(full, window.mean(axis = 0), np.nan), np.where(full, window.std(axis = 0), np.nan)
+
+    # 以一日價格計算指標與新狀態
+    def _step(self, high:'ndarray', low:'ndarray', close:'ndarray') -> tuple:
+        ind = self.indicators
+        state = self._state
+        new = {}
+        out = {}
+
+        # 前一個有效值，當日缺值時為 NaN，同 _previous
+        prev_high = np.where(np.isnan(high), np.nan, state['high'])
+        prev_low = np.where(np.isnan(low), np.nan, state['low'])
+        prev_close = np.where(np.isnan(close), np.nan, state['close'])
+        new['high'] = np.where(np.isnan(high), state['high'], high)
+        new['low'] = np.where(np.isnan(low), state['low'], low)
+        new['close'] = np.where(np.isnan(close), state['close'], close)
+
+        if ind.kd:
+            h, l = self._extreme(high, low, ind.kd)
+            rsv = _ratio(close - l, h - l)
+            k, new['k'] = _advance(state['k'], rsv, 1 / 3)
+            new['k_last'] = np.where(np.isnan(rsv), state['k_last'], k)
+            k = np.where(np.isnan(rsv) & ~np.isnan(close), state['k_last'], k)
+            d, new['d'] = _advance(state['d'], k, 1 / 3)
+            out['K({})'.format(ind.kd)] = k
+            out['D({})'.format(ind.kd)] = d
+
+        if len(ind.rsi) > 0:
+            change = close - prev_close
+            up, down = np.fmax(change, 0), np.fmax(-change, 0)
+            up[np.isnan(change)] = np.nan
+            down[np.isnan(change)] = np.nan
+            for n in ind.rsi:
+                gain, new['gain{}'.format(n)] = _advance(state['gain{}'.format(n)], up, 1 / n)
+                loss, new['loss{}'.format(n)] = _advance(state['loss{}'.format(n)], down, 1 / n)
+                out['RSI({})'.format(n)] = _ratio(gain, gain + loss, 50.0)
+
+        if ind.macd:
+            short, long, signal = ind.macd
+            di = (high + low + 2 * close) / 4
+            fast, new['ema_short'] = _advance(state['ema_short'], di, 2 / (short + 1))
+            slow, new['ema_long'] = _advance(state['ema_long'], di, 2 / (long + 1))
+            dif = fast - slow
+            macd, new['ema_signal'] = _advance(state['ema_signal'], dif, 2 / (signal + 1))
+            out['DIF'] = dif
+            out['MACD'] = macd
+            out['DIF-MACD'] = dif - macd
+
+        for n in ind.wr:
+            h, l = self._extreme(high, low, n)
+            out['W%R({})'.format(n)] = _ratio(h - close, h - l)
+
+        if ind.dmi:
+            n = ind.dmi
+            tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+            tr[np.isnan(close)] = np.nan
+            move_up, move_down = high - prev_high, prev_low - low
+            plus = np.where((move_up > move_down) & (move_up > 0), move_up, 0.0)
+            minus = np.where((move_down > move_up) & (move_down > 0), move_down, 0.0)
+            first = np.isnan(prev_high)
+            plus[first], minus[first], tr[first] = np.nan, np.nan, np.nan
+
+            atr, new['atr'] = _advance(state['atr'], tr, 1 / n)
+            plus, new['plus'] = _advance(state['plus'], plus, 1 / n)
+            minus, new['minus'] = _advance(state['minus'], minus, 1 / n)
+            pdi, mdi = _ratio(plus, atr), _ratio(minus, atr)
+            dx = _ratio(np.abs(pdi - mdi), pdi + mdi, 0.0)
+            dx[np.isnan(pdi)] = np.nan
+            adx, new['adx'] = _advance(state['adx'], dx, 1 / n)
+            out['+DI({})'.format(n)] = pdi
+            out['-DI({})'.format(n)] = mdi
+            out['ADX({})'.format(n)] = adx
+
+        for n in ind.ma:
+            out['MA({})'.format(n)] = self._mean_std(close, n)[0]
+
+        if ind.bbands:
+            n, width = ind.bbands
+            mid, std = self._mean_std(close, n)
+            out['BB上軌({})'.format(n)] = mid + width * std
+            out['BB中軌({})'.format(n)] = mid
+            out['BB下軌({})'.format(n)] = mid - width * std
+        return out, new
+
+    # 寫入新狀態與當日價格，當日無收盤價的股票不寫入緩衝區
+    def _commit(self, new:dict, high:'ndarray', low:'ndarray', close:'ndarray', dt:str):
+        self._state.update(new)
+        traded = np.flatnonzero(~np.isnan(close))
+        slot = self._count[traded] % self._size
+        for field, row in (('high', high), ('low', low), ('close', close)):
+            self._buffers[field][slot, traded] = row[traded]
+        self._count[traded] += 1
+        self.date = dt
+
+    # 將表格轉為全部股票的價格列，未出現的股票為 NaN
+    def _rows(self, prices:'DataFrame', close:str) -> tuple:
+        sids = prices['股票代號'].astype(str).to_numpy()
+        pos = self._locate(sids)
+        rows = []
+        for field in ('最高價', '最低價', close):
+            row = np.full(len(self.sids), np.nan)
+            row[pos] = pd.to_numeric(prices[field], errors = 'coerce').to_numpy(dtype = np.float64, na_value = np.nan)
+            rows.append(row)
+        return sids, pos, rows
+
+    def _frame(self, out:dict, sids:'ndarray', pos:'ndarray', dt:str = None) -> 'DataFrame':
+        result = pd.DataFrame({col:out[col][pos] for col in self.indicators.columns})
+        if dt is not None:
+            result.insert(0, '日期', pd.Timestamp(dt))
+        result.insert(0, '股票代號', sids)
+        return result
+
+    # 收盤後更新一日
+    def update(self, prices:'DataFrame', dt:str = None) -> 'DataFrame':
+        '''
+        以一日的多股股價更新狀態
+
+        Parameters
+        ----------
+        :param prices: DataFrame
+            - msp 結果，需含 股票代號、最高價、最低價、收盤價；未列出的股票視為當日無交易
+
+        :param dt: str, default None
+            - 資料日期，格式:yyyymmdd，未輸入則取 prices 的 日期 欄位
+
+        Returns
+        ----------
+        DataFrame
+            - 股票代號、日期 + 指標欄位，同 tim
+        '''
+        if dt is None:
+            dt = pd.Timestamp(prices['日期'].iloc[0]).strftime('%Y%m%d')
+        dt = str(dt)
+        if self.date is not None and dt <= self.date:
+            raise OwlDateError('DateError', '，狀態已更新至 {}'.format(self.date))
+        sids, pos, rows = self._rows(prices, '收盤價')
+        out, new = self._step(*rows)
+        self._commit(new, *rows, dt)
+        return self._frame(out, sids, pos, dt)
+
+    # 盤中試算
+    def preview(self, quotes:'DataFrame') -> 'DataFrame':
+        '''
+        以盤中報價試算當日收盤時的指標，不改變狀態
+
+        Parameters
+        ----------
+        :param quotes: DataFrame
+            - tsp 結果或 OwlQuotes.snapshot()，以 成交價 為收盤價；含 收盤價 欄位時則以其為準
+
+        Returns
+        ----------
+        DataFrame
+            - 股票代號 + 指標欄位
+        '''
+        close = '收盤價' if '收盤價' in quotes.columns else '成交價'
+        sids, pos, rows = self._rows(quotes, close)
+        out, new = self._step(*rows)
+        return self._frame(out, sids, pos)
+
+    # 依序加入多日
+    def extend(self, prices:'DataFrame') -> 'OwlIndicatorState':
+        '''
+        以歷史股價建立或補齊狀態，已更新的日期略過
+
+        Parameters
+        ----------
+        :param prices: DataFrame
+            - msp_range 面板 (索引為 日期、股票代號) 或含 日期、股票代號 欄位的長表格
+        '''
+        frame = prices.reset_index() if isinstance(prices.index, pd.MultiIndex) else prices
+        codes, uniques = pd.factorize(pd.to_datetime(frame['日期']), sort = True)
+        date_keys = pd.DatetimeIndex(uniques).strftime('%Y%m%d')
+        start = date_keys.searchsorted(self.date, 'right') if self.date is not None else 0
+        keep = codes >= start
+        frame, date_keys = frame[keep], date_keys[start:]
+
+        # 一次轉為 日期 x 股票 陣列，再逐日更新
+        i = codes[keep] - start
+        j = self._locate(frame['股票代號'].astype(str).to_numpy())
+        arrays = []
+        for field in ('最高價', '最低價', '收盤價'):
+            array = np.full((len(date_keys), len(self.sids)), np.nan)
+            array[i, j] = pd.to_numeric(frame[field], errors = 'coerce').to_numpy(dtype = np.float64, na_value = np.nan)
+            arrays.append(array)
+        for t, dt in enumerate(date_keys):
+            rows = [array[t] for array in arrays]
+            self._commit(self._step(*rows)[1], *rows, dt)
+        return self
+
+    # 保存狀態
+    def save(self, path:str):
+        '''
+        以 pickle 保存狀態，先寫入暫存檔再取代
+        '''
+        ind = self.indicators
+        snapshot = {'version':_STATE_VERSION, 'date':self.date, 'sids':list(self.sids), 'count':self._count,
+                    'indicators':{'kd':ind.kd, 'rsi':ind.rsi, 'macd':ind.macd, 'wr':ind.wr,
+                                  'dmi':ind.dmi, 'ma':ind.ma, 'bbands':ind.bbands},
+                    'state':self._state, 'buffers':self._buffers}
+        folder = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        tmp = path + '.{}.tmp'.format(os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump(snapshot, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    # 讀取狀態
+    @classmethod
+    def load(cls, path:str) -> 'OwlIndicatorState':
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+        if snapshot.get('version') != _STATE_VERSION:
+            raise ValueError('狀態檔版本不符: {}'.format(snapshot.get('version')))
+        state = cls(OwlIndicators(**snapshot['indicators']))
+        state.date = snapshot['date']
+        state.sids = list(snapshot['sids'])
+        state._pos = {sid:i for i, sid in enumerate(state.sids)}
+        state._count = snapshot['count']
+        state._state = snapshot['state']
+        state._buffers = snapshot['buffers']
+        return state
+
+class _OwlTA():
+    # 前置資料的起始日
+    def _warmup_start(self, bpd:str, warmup:int) -> str:
+        start = self.calendar('d').nth_before(bpd, warmup)
+        return start if start is not None else str(self.calendar('d').keys[0])
+
+    # 本地計算個股技術指標
+    def tis_local(self, sid:str, bpd:str, epd:str, colist = None, indicators:OwlIndicators = None,
+                  warmup:int = 120) -> 'DataFrame':
+        '''
+        以 ssp 股價在本地計算技術指標，欄位與 tis 相同
+
+        Parameters
+        ----------
+        :param sid: str
+            - 台股股票代號
+
+        :param bpd: str
+            - 起始日，格式:yyyymmdd 8碼
+
+        :param epd: str
+            - 結束日，格式:yyyymmdd 8碼
+
+        :param colist: list, default None
+            - 填入欲查看的欄位名稱，未寫輸入則取全部欄位
+
+        :param indicators: OwlIndicators, default None
+            - 指標與期數設定，預設同 tis
+
+        :param warmup: int, default 120
+            - 起始日前多取的交易日數，讓遞迴指標收斂
+
+        Returns
+        ----------
+        DataFrame
+        '''
+        indicators = indicators if indicators is not None else OwlIndicators()
+        if self._date_freq(bpd, epd, 'd') == 'error':
+            return None
+        prices = self.ssp(sid, self._warmup_start(bpd, warmup), epd, ['日期', '最高價', '最低價', '收盤價'])
+        if prices is None or len(prices) == 0:
+            return prices
+        result = indicators.compute(prices)
+        result = result[result['日期'] >= pd.Timestamp(bpd)].reset_index(drop = True)
+        return self._select(result, colist)
+
+    # 本地計算多股技術指標
+    def tim_range_local(self, bpd:str, epd:str, colist = None, indicators:OwlIndicators = None,
+                        warmup:int = 120, max_workers:int = None) -> 'DataFrame':
+        '''
+        以 msp_range 股價面板在本地計算全市場技術指標，欄位與 tim 相同
+
+        Parameters
+        ----------
+        同 tis_local，max_workers 同 msp_range
+
+        Returns
+        ----------
+        DataFrame
+            - 以 (日期, 股票代號) 為索引的面板，同 tim_range
+        '''
+        indicators = indicators if indicators is not None else OwlIndicators()
+        if self._date_freq(bpd, epd, 'd') == 'error':
+            return None
+        panel = self.msp_range(self._warmup_start(bpd, warmup), epd, ['最高價', '最低價', '收盤價'], max_workers = max_workers)
+        if panel is None or len(panel) == 0:
+            return panel
+        result = indicators.compute(panel)
+        result = result[result.index.get_level_values('日期') >= pd.Timestamp(bpd)]
+        result.attrs['errors'] = panel.attrs.get('errors', {})
+        return self._select(result, colist)
+
+    # 比對本地計算與 tis
+    def tis_parity(self, sid:str, bpd:str, epd:str, indicators:OwlIndicators = None, warmup:int = 120,
+                   tol:float = 0.01) -> 'DataFrame':
+        '''
+        以同一區間的 tis 結果驗證本地計算，可搭配 OwlReplayServer 以錄製的回應離線執行
+
+        Returns
+        ----------
+        DataFrame
+            - 同 OwlIndicators.parity
+        '''
+        indicators = indicators if indicators is not None else OwlIndicators()
+        computed = self.tis_local(sid, bpd, epd, indicators = indicators, warmup = warmup)
+        recorded = self.tis(sid, bpd, epd)
+        if computed is None or recorded is None:
+            return None
+        return indicators.parity(computed, recorded, tol = tol)
+
+    # 建立逐日更新的指標狀態
+    def tim_state(self, epd:str, indicators:OwlIndicators = None, warmup:int = 250,
+                  max_workers:int = None) -> OwlIndicatorState:
+        '''
+        以 msp_range 取 epd 以前的股價建立全市場指標狀態，之後以 tim_update 逐日更新
+
+        Parameters
+        ----------
+        :param epd: str
+            - 狀態的最後一日，格式:yyyymmdd 8碼
+
+        :param indicators: OwlIndicators, default None
+            - 指標與期數設定，預設同 tis
+
+        :param warmup: int, default 250
+            - 建立狀態所用的交易日數，讓遞迴指標收斂
+
+        :param max_workers: int, default None
+            - 同 msp_range
+
+        Returns
+        ----------
+        OwlIndicatorState
+        '''
+        if not _check_range(self, epd, epd, 'd'):
+            return None
+        panel = self.msp_range(self._warmup_start(epd, warmup - 1), epd, ['最高價', '最低價', '收盤價'],
+                               max_workers = max_workers)
+        if panel is None:
+            return None
+        return OwlIndicatorState(indicators).extend(panel)
+
+    # 逐日更新指標狀態
+    def tim_update(self, state:OwlIndicatorState, dt:str = None) -> 'DataFrame':
+        '''
+        補齊 state 之後至 dt 的每個交易日，每日只查詢一次 msp
+
+        Parameters
+        ----------
+        :param state: OwlIndicatorState
+            - tim_state 或 OwlIndicatorState.load 取得的狀態
+
+        :param dt: str, default None
+            - 更新至此日，格式:yyyymmdd；未輸入則為最近一個已公告資料的交易日
+
+        Returns
+        ----------
+        DataFrame
+            - 最後一日的指標，同 tim；已是最新時回傳空表格
+            - 查詢失敗或當日無資料時回傳 None，狀態停在前一日
+        '''
+        calendar = self.calendar('d')
+        latest = dt is None
+        if latest:
+            dt = calendar.prev(pd.Timestamp.today().strftime('%Y%m%d'), inclusive = True)
+        elif not _check_range(self, dt, dt, 'd'):
+            return None
+        start = calendar.next(state.date) if state.date is not None else dt
+        days = calendar.range(start, dt) if start is not None else []
+        result = pd.DataFrame(None, columns = ['股票代號', '日期'] + state.indicators.columns)
+        for i, day in enumerate(days):
+            try:
+                prices = _as_raise(self.msp, str(day), ['股票代號', '最高價', '最低價', '收盤價'])
+            except OwlSidError:
+                prices = None
+            except OwlException as error:
+                if _raising(self):
+                    raise
+                print(error)
+                return None
+            # 空表格寫入狀態會讓全為 NaN 的一日進入滾動視窗
+            if prices is None or prices.empty:
+                # 未指定 dt 時，當日收盤資料可能尚未公告
+                if latest and i == len(days) - 1:
+                    break
+                return _fail(self, 'CannotFind', '，{} 無收盤資料'.format(day))
+            result = state.update(prices, str(day))
+        return result
+
+    def _select(self, result:'DataFrame', colist) -> 'DataFrame':
+        if colist is None:
+            return result
+        try:
+            return result[[col for col in result.columns if col in ('股票代號', '日期')] + [col for col in colist if col not in ('股票代號', '日期')]].copy()
+        except KeyError:
+            return _fail(self, 'ColumnsError')
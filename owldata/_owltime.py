@@ -8,17 +8,189 @@
 # =====================================================================
 
 import datetime
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from ._owlerror import OwlError
+from pandas.tseries.offsets import MonthEnd, QuarterEnd, YearEnd
+from ._owlerror import OwlError, OwlException, _fail, _check_range
+
+# --------------------
+# BLOCK 日期轉換
+# --------------------
+# 各頻率的日期欄位、格式與期末調整
+_DATE_SPEC = {
+    'd':('日期', '%Y%m%d', None),
+    'm':('年月', '%Y%m', MonthEnd(1)),
+    'q':('年季', '%Y%m', QuarterEnd(1)),
+    'y':('年度', '%Y', YearEnd(1))
+    }
+
+# 季別對應季初月份
+_QUARTER_MONTH = {'01':'01', '02':'04', '03':'07', '04':'10'}
+
+def _parse_dates(values:'Series', freq:str) -> 'Series':
+    '''
+    向量化日期轉換
+
+    Parameters
+    ----------
+    :param values: Series
+        - 原始日期字串，日: yyyymmdd、月: yyyymm、季: yyyyqq、年: yyyy
+
+    :param freq: str
+        - 日期頻率 d, m, q, y
+
+    Returns
+    ----------
+    Series
+        - datetime64[ns]，月、季、年為期末日，空字串轉為 NaT
+    '''
+    _, fmt, offset = _DATE_SPEC[freq]
+    values = values.where(values != '')
+
+    if freq == 'q':
+        month = values.str[4:6].map(_QUARTER_MONTH)
+        if (month.isna() & values.notna()).any():
+            raise ValueError(OwlError._dicts['SeasonError2'])
+        values = values.str[0:4] + month
+
+    dates = pd.to_datetime(values, format = fmt)
+    if offset is not None:
+        dates = dates + offset
+    return dates
+
+# --------------------
+# BLOCK 交易日曆
+# --------------------
+# 行程內所有 OwlData 共用的日曆，以 (資料網址, 頻率) 為鍵值，重播伺服器與正式連線互不影響
+_CALENDAR = {}
+_CALENDAR_LOCK = threading.Lock()
+
+# 各日曆的下載鎖，同一日曆只下載一次
+_CALENDAR_LOADING = {}
+
+def _calendar_lock(key:tuple) -> threading.Lock:
+    with _CALENDAR_LOCK:
+        return _CALENDAR_LOADING.setdefault(key, threading.Lock())
+
+# 移除某一資料網址的日曆
+def _drop_calendars(data_url:str):
+    with _CALENDAR_LOCK:
+        for key in [key for key in _CALENDAR if key[0] == data_url]:
+            del _CALENDAR[key]
+
+class OwlCalendar():
+    # 各頻率的期間代碼: 日 yyyymmdd -> 月 yyyymm、季 yyyyq、年 yyyy
+    _period = {
+        'm':lambda x: x // 100,
+        'q':lambda x: x // 10000 * 10 + (x // 100 % 100 - 1) // 3 + 1,
+        'y':lambda x: x // 10000
+        }
+
+    def __init__(self, values, freq:str = 'd'):
+        '''
+        已排序的交易日曆，以二分搜尋計算區間與前後交易日
+
+        Parameters
+        ----------
+        :param values: array-like
+            - 日期字串，日: yyyymmdd、月: yyyymm、季: yyyyqq、年: yyyy
+
+        :param freq: str, default 'd'
+            - 日曆頻率 d, m, q, y
+
+        [NOTES]
+        ----------
+            - 內部以 int64 排序陣列保存，查詢皆為 O(log n)
+            - 單一日期回傳字串，陣列查詢回傳 int64 陣列
+        '''
+        self.freq = freq
+        self.keys = np.unique(np.asarray(values, dtype = str).astype(np.int64))
+
+    def __repr__(self):
+        if len(self.keys) == 0:
+            return 'OwlCalendar(freq={}, empty)'.format(self.freq)
+        return 'OwlCalendar(freq={}, {} - {}, {} periods)'.format(self.freq, self.keys[0], self.keys[-1], len(self.keys))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, dt):
+        i = np.searchsorted(self.keys, int(dt))
+        return i < len(self.keys) and self.keys[i] == int(dt)
+
+    # 區間期數
+    def count(self, start, end) -> int:
+        return int(np.searchsorted(self.keys, int(end), 'right') - np.searchsorted(self.keys, int(start), 'left'))
+
+    # 區間內的日期
+    def range(self, start, end) -> 'ndarray':
+        return self.keys[np.searchsorted(self.keys, int(start), 'left'):np.searchsorted(self.keys, int(end), 'right')]
+
+    def _at(self, i:int):
+        return str(self.keys[i]) if 0 <= i < len(self.keys) else None
+
+    # 下一個交易日
+    def next(self, dt, inclusive:bool = False) -> str:
+        return self._at(int(np.searchsorted(self.keys, int(dt), 'left' if inclusive else 'right')))
+
+    # 上一個交易日
+    def prev(self, dt, inclusive:bool = False) -> str:
+        return self._at(int(np.searchsorted(self.keys, int(dt), 'right' if inclusive else 'left')) - 1)
+
+    # 往前第 n 個交易日
+    def nth_before(self, dt, n:int) -> str:
+        '''
+        dt 之前第 n 個交易日 (不含 dt)，n = 1 即上一個交易日，超出範圍回傳 None
+        '''
+        return self._at(int(np.searchsorted(self.keys, int(dt), 'left')) - n)
+
+    # 期末交易日
+    def period_end(self, dates, freq:str) -> 'ndarray':
+        '''
+        將日期對應至所屬月、季、年的最後一個交易日 (僅日曆頻率為 d 時適用)
+
+        Parameters
+        ----------
+        :param dates: array-like
+            - yyyymmdd 日期
+
+        :param freq: str
+            - 'm', 'q' 或 'y'
+
+        Returns
+        ----------
+        ndarray
+            - int64 期末交易日，期間不在日曆內時為 0
+        '''
+        period = self._period[freq.lower()]
+        dates = np.atleast_1d(np.asarray(dates, dtype = str).astype(np.int64))
+
+        key_period = period(self.keys)
+        last = np.r_[np.nonzero(np.diff(key_period))[0], len(self.keys) - 1]
+        periods = key_period[last]
+
+        idx = np.searchsorted(periods, period(dates))
+        idx = np.minimum(idx, len(periods) - 1)
+        found = periods[idx] == period(dates)
+        return np.where(found, self.keys[last][idx], 0)
 
 # --------------------
 # BLOCK 商品資訊與時間表
 # --------------------
 # 取得函數與商品對應表
 class _DataID():
+    # 快照有效秒數，逾時則重新下載
+    snapshot_max_age = 12 * 3600
+
     def __init__(self):
-        # 商品表
-        #self._fp = ''
+        # 商品表，延遲載入時於第一次使用才下載
+        self._fp = None
+        self._fp_lock = threading.Lock()
         
         # 商品時間對照表
         self._table_code = {
@@ -34,9 +206,6 @@ class _DataID():
             'y':'PYCtrl-14889b/'            
             }
         
-        # 商品時間表
-        self._table = {}
-        
         self._pdid_map
 
     # 取得函數與商品對應表
@@ -66,77 +235,171 @@ class _DataID():
         return self._fp
     # 取得函數對應商品
     def _get_pdid(self, funcname:str):
-        return self._fp.loc[funcname][0]
-    
+        if self._fp is None:
+            with self._fp_lock:
+                if self._fp is None:
+                    self._pdid_map()
+        return self._fp.loc[funcname].iloc[0]
+
+    # 取得商品對應函數
+    def _get_func(self, pdid:str):
+        if pdid is None or getattr(self, '_fp', None) is None:
+            return None
+        func = self._fp.index[self._fp[self._fp.columns[0]] == pdid]
+        return func[0] if len(func) else None
+
+    # 日曆鍵值，依資料網址區分伺服器
+    def _calendar_key(self, freq:str) -> tuple:
+        return (self._token['data_url'], freq.lower())
+
+    # 目前資料網址已載入的日曆 {頻率: OwlCalendar}
+    def _calendars(self) -> dict:
+        url = self._token['data_url']
+        return {key[1]:cal for key, cal in list(_CALENDAR.items()) if key[0] == url}
+
+    # 整批替換目前資料網址的日曆，其他執行緒只會看到完整的新表或舊表
+    def _swap_calendars(self, calendars:dict):
+        with _CALENDAR_LOCK:
+            for freq, cal in calendars.items():
+                _CALENDAR[self._calendar_key(freq)] = cal
+
     # 商品時間
     def _date_table(self, freq:str):
         get_data_url = self._token['data_url'] + self._table_code[freq.lower()]
-        data = self._data_from_owl(get_data_url)
+        try:
+            data = self._data_from_owl(get_data_url)
+        except OwlException:
+            data = 'error'
         if type(data) == str:
             get_data_url = self._token['data_url'] + self._table_code_test[freq.lower()]
         if freq.lower() == 'd':
             get_data_url = get_data_url + '/TWA00/9999'
         return self._data_from_owl(get_data_url)
+
+    # 交易日曆，行程內共用，只下載一次
+    def calendar(self, freq:str = 'd') -> OwlCalendar:
+        '''
+        取得交易日曆
+
+        Parameters
+        ----------
+        :param freq: str, default 'd'
+            - d = 交易日, m = 月, q = 季, y = 年
+
+        Returns
+        ----------
+        OwlCalendar
+            - count, range, next, prev, nth_before, period_end
+        '''
+        key = self._calendar_key(freq)
+        cal = _CALENDAR.get(key)
+        if cal is None:
+            with _calendar_lock(key):
+                cal = _CALENDAR.get(key)
+                if cal is None:
+                    table = self._date_table(key[1])
+                    cal = OwlCalendar(table[table.columns[0]].values, key[1])
+                    _CALENDAR[key] = cal
+        return cal
+
+    # 平行載入商品表與時間表
+    def warm_up(self, freqs = ('d', 'm', 'q', 'y')):
+        '''
+        同時下載商品表與各頻率時間表，取代第一次使用時的逐一下載
+
+        Parameters
+        ----------
+        :param freqs: tuple, default ('d', 'm', 'q', 'y')
+            - 欲載入的時間表頻率
+        '''
+        with ThreadPoolExecutor(max_workers = 1 + len(freqs)) as pool:
+            jobs = [pool.submit(self._get_pdid, 'ssp')] + [pool.submit(self.calendar, freq) for freq in freqs]
+            for job in jobs:
+                job.result()
+
+    # 儲存快照
+    def save_snapshot(self, path:str):
+        '''
+        將商品表與已載入的時間表存為本地快照，供下次啟動直接載入
+        '''
+        snapshot = {
+            'time':time.time(),
+            'pdid':self._fp,
+            'calendar':{freq:cal.keys for freq, cal in self._calendars().items()}
+            }
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(snapshot, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    # 載入快照
+    def load_snapshot(self, path:str, max_age:float = None) -> bool:
+        '''
+        載入本地快照，不產生任何網路請求
+
+        Parameters
+        ----------
+        :param path: str
+            - 快照檔案路徑
+
+        :param max_age: float, default None
+            - 快照有效秒數，未輸入則使用 snapshot_max_age
+
+        Returns
+        ----------
+        bool
+            - 快照不存在、損毀或過期時回傳 False
+        '''
+        if max_age is None:
+            max_age = self.snapshot_max_age
+        try:
+            with open(path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False
+        if time.time() - snapshot['time'] > max_age or snapshot['pdid'] is None:
+            return False
+
+        calendars = {}
+        for freq, keys in snapshot['calendar'].items():
+            calendars[freq] = OwlCalendar([], freq)
+            calendars[freq].keys = keys
+        self._fp = snapshot['pdid']
+        self._swap_calendars(calendars)
+        return True
+
+    # 重新下載商品表與時間表
+    def refresh(self, snapshot:str = None):
+        '''
+        平行重新下載商品表與時間表，下載完成後才替換，查詢中的其他執行緒沿用舊表
+
+        Parameters
+        ----------
+        :param snapshot: str, default None
+            - 下載後更新的快照檔案路徑
+        '''
+        freqs = ('d', 'm', 'q', 'y')
+        with ThreadPoolExecutor(max_workers = 1 + len(freqs)) as pool:
+            fp = pool.submit(self._pdid_map)
+            tables = {freq:pool.submit(self._date_table, freq) for freq in freqs}
+            calendars = {}
+            for freq, job in tables.items():
+                table = job.result()
+                calendars[freq] = OwlCalendar(table[table.columns[0]].values, freq)
+            fp.result()
+        self._swap_calendars(calendars)
+        if snapshot is not None:
+            self.save_snapshot(snapshot)
+
     # 商品時間頻率對照表
     def _date_freq(self, start:str, end:str, freq = 'd'):
-        season = ['0' + str(x) for x in range(5,13)]
-
-        if freq.lower() not in self._table.keys():
-            self._table[freq.lower()] = self._date_table(freq.lower())
-        
-        if freq.lower() == 'y':
-            if len(start) != 4 or len(end) != 4:
-                print('YearError:',OwlError._dicts['YearError'])
-                return 'error'
-            try:
-                dt = pd.to_datetime(start, format = '%Y')
-                dt = pd.to_datetime(end, format = '%Y')
-
-            except ValueError:
-                print('ValueError:', OwlError._dicts["ValueError"])
-                return 'error'
-
-        elif freq.lower() == 'm':
-            if len(start) != 6 or len(end) != 6:
-                print('MonthError:',OwlError._dicts['MonthError'])
-                return 'error'
-            try:
-                dt = pd.to_datetime(start, format = '%Y%m')
-                dt = pd.to_datetime(end, format = '%Y%m')
-                         
-            except ValueError:
-                print('ValueError:', OwlError._dicts["ValueError"])
-                return 'error'
-
-        elif freq.lower() == 'q':
-            if len(start) != 6 or len(end) != 6:
-                print('SeasonError:',OwlError._dicts['SeasonError'])
-                return 'error'
-
-            if start[4:6] in season or end[4:6] in season:
-                print('SeasonError2:',OwlError._dicts['SeasonError2'])
-                return 'error'
-
-        elif freq.lower() == 'd':
-            if len(start) != 8 or len(end) != 8:
-                print('DayError:',OwlError._dicts['DayError'])
-                return 'error'
-            
-            try:
-                dt = pd.to_datetime(start)
-                dt = pd.to_datetime(end)
-                
-            except ValueError:
-                print('ValueError:', OwlError._dicts["ValueError"])
-                return 'error'
-
-        if int(start) > int(end):
-            print('DateError:',OwlError._dicts['DateError'])
+        # 先檢查格式與先後順序，輸入錯誤時不載入時間表
+        freq = freq.lower()
+        if not _check_range(self, start, end, freq):
             return 'error'
-        
-        temp = self._table[freq.lower()].copy()
-        temp = temp[temp[temp.columns[0]].between(start, end)]
-        if len(temp) == 0:
-            print('CannotFind:', OwlError._dicts["CannotFind"])
+
+        count = self.calendar(freq).count(start, end)
+        if count == 0:
+            _fail(self, 'CannotFind')
             return 'error'
-        return str(len(temp))
+        return str(count)
@@ -10,12 +10,28 @@
 import requests
 import json 
 import pandas as pd
-from pandas.tseries.offsets import MonthEnd, QuarterEnd, YearEnd
 import datetime
 import os
+import threading
+import time
 
-from ._owlerror import OwlError
-from ._owltime import _DataID
+from ._owlerror import OwlError, OwlException, _fail, _fail_http, _fail_connection, _check_colist, _check_sid
+from ._owltime import _DataID, _DATE_SPEC, _parse_dates
+from ._owlcache import OwlCache
+from ._owlhttp import OwlSession, OwlRetry
+from ._owlstream import _decode_stream, _chunked, _CHUNK
+from ._owlrate import OwlRateLimiter, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, _PRIORITY
+from ._owlmetrics import OwlMetrics, _Trace
+from ._owlbatch import _OwlBatch
+from ._owlstore import _OwlSync
+from ._owlarchive import _OwlArchive
+from ._owlquote import _OwlQuote
+from ._owlreplay import _OwlRecord
+from ._owlta import _OwlTA
+from ._owladjust import _OwlAdjust
+from ._owlpit import _OwlPIT
+from ._owlscreen import _OwlScreen
+from .config import coltype_map
 
 # --------------------
 # BLOCK 起始設置
@@ -36,12 +52,378 @@ pd.set_option('display.float_format', lambda x: '%.2f' % x)
 #             if not os.path.exists(dirs):
 #                 os.makedirs(dirs)
 
+# --------------------
+# BLOCK 欄位型態
+# --------------------
+# 單欄型態轉換
+def _coerce(values:'Series', dtype:str) -> 'Series':
+    if dtype in ('str', 'datetime'):
+        return values
+    if dtype == 'category':
+        return values.astype('category')
+
+    values = pd.to_numeric(values)
+    if dtype in ('Int32', 'Int64'):
+        # 含小數時保留浮點數
+        try:
+            return values.astype(dtype)
+        except (TypeError, ValueError):
+            return values
+    return values.astype(dtype)
+
+# 串流解析時即轉為數值的欄位
+_NUMERIC = frozenset(col for col, dtype in coltype_map.items() if dtype not in ('str', 'datetime', 'category'))
+
+# 依欄位型態表建立表格
+def _typed_frame(result:'DataFrame', num_col:int = None) -> 'DataFrame':
+    '''
+    依 config.coltype_dict 轉換各欄位型態，一次建立新表格
+    
+    Parameters
+    ----------
+    :param result: DataFrame
+        - 原始表格
+        
+    :param num_col: int, default None
+        - 未登記型態的欄位，自此位置起數值化，None 表示保留字串
+        
+    Returns
+    ----------
+    DataFrame
+    '''
+    size = len(result.columns)
+    if num_col is not None and num_col < 0:
+        num_col = size + num_col
+    
+    columns = {}
+    for i, col in enumerate(result.columns):
+        dtype = coltype_map.get(col)
+        if dtype is None:
+            dtype = 'float64' if num_col is not None and i >= num_col else 'str'
+        columns[i] = _coerce(result.iloc[:, i], dtype)
+    
+    typed = pd.DataFrame(columns, index = result.index)
+    typed.columns = result.columns
+    return typed
+
 # --------------------
 # BLOCK API擷取資料
 # --------------------
+# 查詢共用邏輯
+class _OwlBase(_DataID):
+    # 連線設定
+    def _token_config(self, auid:str, ausrt:str, base_url:str = None) -> dict:
+        base_url = (base_url or "https://owl.cmoney.com.tw").rstrip('/')
+        return {
+            'token_url':base_url + "/OwlApi/auth",
+            'token_params':"appId=" + auid + "&appSecret=" + ausrt,
+            'token_headers':{'content-type': "application/x-www-form-urlencoded"},  #POST表單，預設的編碼方式 (enctype)
+            'data_url':base_url + "/OwlApi/api/v2/json/",
+            'ctrlmap':"PYCtrl-14778b",
+            'testmap':"PYCtrl-14881b",
+            'pythonmap':"PYCtrl-14882b"
+            }
+
+    # 啟用限流
+    def enable_rate_limit(self, rps:float = 10, burst:int = None, path:str = None, reserve:int = 1) -> OwlRateLimiter:
+        '''
+        以 token bucket 限制每秒請求數，避免超過 API 流量上限
+
+        Parameters
+        ----------
+        :param rps: float, default 10
+            - 每秒請求數
+
+        :param burst: int, default None
+            - 可瞬間送出的請求數上限，預設為 rps
+
+        :param path: str, default None
+            - 共用狀態檔路徑，多個行程指定同一檔案即共用同一個額度
+
+        :param reserve: int, default 1
+            - 保留給 tsp 等互動查詢的額度
+
+        Returns
+        ----------
+        OwlRateLimiter
+
+        Notes
+        ----------
+        - 亦可直接傳入 OwlRateLimiter，於多個 OwlData 間共用
+        - 優先順序: tsp > 一般查詢 > 批次查詢 (*_many、sync、archive)
+        '''
+        self._limiter = rps if isinstance(rps, OwlRateLimiter) else OwlRateLimiter(rps, burst, path, reserve)
+        return self._limiter
+
+    def disable_rate_limit(self):
+        self._limiter = None
+
+    # 啟用效能監控
+    def enable_metrics(self, log:str = None, keep:int = 1000) -> OwlMetrics:
+        '''
+        記錄每次查詢的 HTTP、解析、修正耗時、回應大小、筆數與快取命中
+
+        Parameters
+        ----------
+        :param log: str, default None
+            - 逐筆記錄檔路徑 (JSON Lines)
+
+        :param keep: int, default 1000
+            - 保留最近幾筆記錄
+
+        Returns
+        ----------
+        OwlMetrics
+
+        Notes
+        ----------
+        - 亦可直接傳入 OwlMetrics，於多個 OwlData 間共用
+        - 未啟用時查詢流程不計時，不增加額外成本
+        - summary() 各商品統計，slowest() 最慢的股票，write(path) 輸出 Prometheus 格式
+        '''
+        self._metrics = log if isinstance(log, OwlMetrics) else OwlMetrics(log, keep)
+        return self._metrics
+
+    def disable_metrics(self):
+        self._metrics = None
+
+    # 完成一次查詢的記錄
+    def _observe(self, trace:_Trace, url:str, pdid:str, result, checked:float):
+        metrics = self._metrics
+        if metrics is not None:
+            func = self._get_func(pdid) if pdid else ''
+            metrics.observe(trace.record(url, pdid, func, result, checked, time.perf_counter()))
+
+    # 請求優先順序: 即時報價優先，批次查詢以 _as_bulk 標記為低優先
+    def _priority(self, pdid:str = None) -> int:
+        if getattr(self, '_limiter', None) is None:
+            return PRIORITY_NORMAL
+        if pdid is not None and self._get_func(pdid) == 'mnp':
+            return PRIORITY_INTERACTIVE
+        return _PRIORITY.get()
+
+    # 回應內容轉換為表格
+    def _to_frame(self, body) -> 'DataFrame':
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        return _decode_stream(_chunked(body), _NUMERIC)
+
+    # 修正資料
+    def _check(self, result:'DataFrame', freq=None, num_col=2, colists=None, pd_id=None) -> 'DataFrame':
+        '''
+        商品檢查點
+        Parameters
+        ----------
+        :param result: DataFrame
+            - 輸入原始表格
+            
+        :param freq: str
+            - 表格頻率
+            
+        :param num_col: int
+            - 未登記於 config.coltype_dict 的欄位，自此位置起數值化
+            
+        :param colists: list, default None
+            - 填入欲查看的欄位名稱，未寫輸入則取全部欄位
+            
+        :param pd_id: str
+            - 商品代碼
+            
+        Returns
+        ----------
+        DataFrame
+        '''
+        try:
+            if result.empty:
+                _fail(self, 'SidError', pdid = pd_id)
+                return result
+            
+            if result is not 'error':
+                # 日期修正
+                if freq in _DATE_SPEC:
+                    date_col = _DATE_SPEC[freq][0]
+                    result[date_col] = _parse_dates(result[date_col], freq)
+                    if '股票代號' not in result.columns:
+                        result.sort_values(date_col, inplace = True)
+                        result.reset_index(drop = True, inplace = True)
+
+                # 型態轉換，未登記於欄位型態表的欄位自 num_col 起數值化
+                result = _typed_frame(result, num_col)
+                
+                # 欄位選擇
+                if colists != None:
+                    result = result[colists].copy()
+                    
+                elif colists == []:
+                    print('ColumnsError: 請輸入欄位')
+                    return None
+                return result
+
+        except OwlException:
+            raise
+        except ValueError:
+            _fail(self, 'ValueError', pdid = pd_id)
+        except KeyError:
+            _fail(self, 'ColumnsError', pdid = pd_id)
+        except:
+            _fail(self, 'PdError', ", 商品代碼: " + pd_id, pdid = pd_id)
+    
+    # --------------------
+    # 各商品請求參數: 回傳 (網址, 商品代碼, _check 參數)，輸入錯誤時回傳 None
+    # --------------------
+    def _req_ssp(self, sid:str, bpd:str, epd:str, colist=None) -> tuple:
+        if not (_check_sid(self, sid) and _check_colist(self, 'ssp', colist)):
+            return None
+        dt = self._date_freq(bpd, epd, 'd')
+        if (dt != 'error'):
+            pdid = self._get_pdid("ssp")
+            get_data_url = self._token['data_url']+"date/" + epd + "/" + pdid + "/" + sid + "/" + dt
+            return get_data_url, pdid, {'freq':'d', 'num_col':2, 'colists':colist}
+
+    @OwlError._check_dt(di = 'd')
+    def _req_msp(self, dt:str, colist=None) -> tuple:
+        if not _check_colist(self, 'msp', colist):
+            return None
+        pdid = self._get_pdid("msp")
+        get_data_url = self._token['data_url'] + 'date/' + dt + '/' + pdid
+        return get_data_url, pdid, {'freq':'d', 'num_col':3, 'colists':colist}
+
+    def _req_fis(self, sid:str, di:str, bpd:str, epd:str, colist=None) -> tuple:
+        if not (_check_sid(self, sid) and _check_colist(self, 'fis', colist, di.lower())):
+            return None
+        if di.lower() not in ('y', 'q', 'm'):
+            return _fail(self, 'YQMError')
+
+        dt = self._date_freq(bpd, epd, di.lower())
+        if (dt != 'error'):
+            if di.lower() == 'y':
+                pdid = self._get_pdid("sby")
+                get_data_url=self._token['data_url']+"date/"+epd+"0101/"+pdid+"/"+sid+"/"+dt
+
+            elif di.lower() == 'q':
+                pdid = self._get_pdid("sbq")
+                get_data_url=self._token['data_url']+"date/"+epd+"01/"+pdid+"/"+sid+"/"+dt
+
+            else:
+                pdid = self._get_pdid("sbm")
+                get_data_url=self._token['data_url']+"date/"+epd+"01/"+pdid+"/"+sid+"/"+dt
+            return get_data_url, pdid, {'freq':di.lower(), 'num_col':1, 'colists':colist}
+
+    @OwlError._check_di
+    def _req_fim(self, di:str, dt:str, colist=None) -> tuple:
+        if not _check_colist(self, 'fim', colist, di.lower()):
+            return None
+        if di.lower() == 'y':
+            pdid = self._get_pdid("mby")
+            get_data_url=self._token['data_url']+"date/"+dt+"0101/"+pdid
+        
+        elif di.lower() == 'q':
+            pdid = self._get_pdid("mbq")
+            if int(dt[4:6]) == 1:
+                pass
+            elif int(dt[4:6]) == 2:
+                dt = str(int(dt)+2)
+            elif int(dt[4:6]) == 3:
+                dt = str(int(dt)+4)
+            elif int(dt[4:6]) == 4:
+                dt = str(int(dt)+6)
+            get_data_url=self._token['data_url']+"date/"+dt+"01/"+pdid
+            
+        elif di.lower() == 'm':
+            pdid = self._get_pdid("mbm")
+            get_data_url=self._token['data_url']+"date/"+dt+"01/"+pdid
+
+        else:
+            return _fail(self, 'YQMError')
+        return get_data_url, pdid, {'freq':di.lower(), 'num_col':3, 'colists':colist}
+
+    def _req_chs(self, sid:str, bpd:str, epd:str, colist=None) -> tuple:
+        if not (_check_sid(self, sid) and _check_colist(self, 'chs', colist)):
+            return None
+        dt = self._date_freq(bpd, epd, 'd')
+        if (dt != 'error'):
+            pdid = self._get_pdid("sch")
+            get_data_url = self._token['data_url']+"date/" + epd + "/" + pdid + "/" + sid + "/" + dt
+            return get_data_url, pdid, {'freq':'d', 'num_col':1, 'colists':colist}
+
+    @OwlError._check_dt(di = 'd')
+    def _req_chm(self, dt:str, colist=None) -> tuple:
+        if not _check_colist(self, 'chm', colist):
+            return None
+        pdid = self._get_pdid("mch")
+        get_data_url = self._token['data_url'] + 'date/' + dt + '/' + pdid
+        return get_data_url, pdid, {'freq':'d', 'num_col':3, 'colists':colist}
+
+    def _req_tis(self, sid:str, bpd:str, epd:str, colist=None) -> tuple:
+        if not (_check_sid(self, sid) and _check_colist(self, 'tis', colist)):
+            return None
+        dt = self._date_freq(bpd, epd, 'd')
+        if (dt != 'error'):
+            pdid = self._get_pdid("sth")
+            get_data_url = self._token['data_url']+"date/" + epd + "/" + pdid + "/" + sid + "/" + dt
+            return get_data_url, pdid, {'freq':'d', 'num_col':1, 'colists':colist}
+
+    @OwlError._check_dt(di = 'd')
+    def _req_tim(self, dt:str, colist=None) -> tuple:
+        if not _check_colist(self, 'tim', colist):
+            return None
+        pdid = self._get_pdid("mth")
+        get_data_url = self._token['data_url'] + 'date/' + dt + '/' + pdid
+        return get_data_url, pdid, {'freq':'d', 'num_col':3, 'colists':colist}
+
+    def _req_cim(self, colist=None) -> tuple:
+        if not _check_colist(self, 'cim', colist):
+            return None
+        pdid = self._get_pdid("mcm")
+        get_data_url = self._token['data_url']  + pdid
+        return get_data_url, pdid, {'num_col':-1, 'colists':colist}
+
+    def _req_dps(self, sid:str, bpd:str, epd:str, colist=None) -> tuple:
+        if not (_check_sid(self, sid) and _check_colist(self, 'dps', colist)):
+            return None
+        dt = self._date_freq(bpd, epd, 'y')
+        if (dt != 'error'):
+            pdid = self._get_pdid("scm1")
+            get_data_url = self._token['data_url']+"date/" + epd + '0101' + "/" + pdid + "/" + sid + "/" + dt
+            return get_data_url, pdid, {'freq':'y', 'num_col':3, 'colists':colist}
+
+    @OwlError._check_dt(di = 'y')
+    def _req_dpm(self, dt:str, colist=None) -> tuple:
+        if not _check_colist(self, 'dpm', colist):
+            return None
+        pdid = self._get_pdid("mcm1")
+        get_data_url = self._token['data_url'] + 'date/' + dt + '1231/' + pdid
+        return get_data_url, pdid, {'freq':'y', 'num_col':5, 'colists':colist}
+
+    def _req_edps(self, sid:str, bpd:str, epd:str, colist=None) -> tuple:
+        if not (_check_sid(self, sid) and _check_colist(self, 'edps', colist)):
+            return None
+        dt = self._date_freq(bpd, epd, 'y')
+        if (dt != 'error'):
+            pdid = self._get_pdid("scm2")
+            get_data_url = self._token['data_url']+"date/" + epd + '0101' + "/" + pdid + "/" + sid + "/" + dt
+            return get_data_url, pdid, {'freq':'y', 'num_col':None, 'colists':colist}
+
+    @OwlError._check_dt(di = 'y')
+    def _req_edpm(self, dt:str, colist=None) -> tuple:
+        if not _check_colist(self, 'edpm', colist):
+            return None
+        pdid = self._get_pdid("mcm2")
+        get_data_url = self._token['data_url'] + 'date/' + dt + '0101/' + pdid
+        return get_data_url, pdid, {'freq':'y', 'num_col':None, 'colists':colist}
+
+    def _req_tsp(self, sid:str, colist=None) -> tuple:
+        if not (_check_sid(self, sid) and _check_colist(self, 'tsp', colist)):
+            return None
+        pdid = self._get_pdid("mnp")
+        get_data_url = self._token['data_url'] + pdid + "/" + sid
+        return get_data_url, pdid, {'num_col':3, 'colists':colist}
+
 # 核心程式
-class OwlData(_DataID):
-    def __init__(self, auid:str, ausrt:str):
+class OwlData(_OwlBase, _OwlBatch, _OwlSync, _OwlArchive, _OwlQuote, _OwlRecord, _OwlTA, _OwlAdjust, _OwlPIT, _OwlScreen):
+    def __init__(self, auid:str, ausrt:str, cache_dir:str = None, pool_size:int = 10, timeout = (10, 60), keep_alive:bool = True,
+                 startup:str = 'eager', snapshot:str = None, refresh:bool = False, retry:OwlRetry = None,
+                 base_url:str = None, errors:str = 'print'):
         '''
         Please insert your personal information
         Parameters
@@ -50,16 +432,39 @@ class OwlData(_DataID):
             - Owl account's appId
         :param ausrt: str
             - Owl application's secret key
+        :param cache_dir: str, default None
+            - Local cache directory, responses are cached on disk when given
+        :param pool_size: int, default 10
+            - Max pooled connections kept alive per host
+        :param timeout: float or tuple, default (10, 60)
+            - (connect, read) timeout in seconds for every request
+        :param keep_alive: bool, default True
+            - Reuse pooled connections between requests
+        :param startup: str, default 'eager'
+            - 'eager': load the product map on construction
+            - 'parallel': load the product map and d/m/q/y calendars concurrently
+            - 'lazy': load each table on first use
+        :param snapshot: str, default None
+            - Local snapshot file of the product map and calendars, loaded
+              instead of downloading when fresh and rewritten after download;
+              with a fresh snapshot the token is requested on first use
+        :param refresh: bool, default False
+            - Ignore the snapshot and download again
+        :param retry: OwlRetry, default None
+            - Retry policy for 5xx and connection errors, expired tokens are
+              renewed automatically; OwlRetry(retries = 0) disables retries
+        :param base_url: str, default None
+            - API host, e.g. OwlReplayServer.url for offline replay
+        :param errors: str, default 'print'
+            - 'print': print the OwlError message and return None
+            - 'raise': raise OwlException subclasses, e.g. OwlDateError, OwlPermissionError
         '''
-        self._token = {
-            'token_url':"https://owl.cmoney.com.tw/OwlApi/auth",
-            'token_params':"appId=" + auid + "&appSecret=" + ausrt,
-            'token_headers':{'content-type': "application/x-www-form-urlencoded"},  #POST表單，預設的編碼方式 (enctype)
-            'data_url':"https://owl.cmoney.com.tw/OwlApi/api/v2/json/",
-            'ctrlmap':"PYCtrl-14778b",
-            'testmap':"PYCtrl-14881b",
-            'pythonmap':"PYCtrl-14882b"
-            }
+        super().__init__()
+        
+        # 錯誤處理方式
+        self.errors = errors
+        
+        self._token = self._token_config(auid, ausrt, base_url)
         
         # 取得 TOKEN 結果
         self._token_result = ''
@@ -67,34 +472,174 @@ class OwlData(_DataID):
         # data token
         self._data_headers = {}
         
-        # 連線進入並輸出連線狀態
-        self.status_code = self._request_token_authorization()
+        # 共用連線池
+        self._session = OwlSession(pool_size = pool_size, timeout = timeout, keep_alive = keep_alive)
         
-        super().__init__()
+        # 重試策略與重新認證鎖
+        self._retry = retry if retry is not None else OwlRetry()
+        self._auth_lock = threading.Lock()
+        
+        # 限流與效能監控
+        self._limiter = None
+        self._metrics = None
+        
+        # 本地快取、增量資料庫、欄式儲存與錄製
+        self._recorder = None
+        self._cache = None
+        self._store = None
+        self._archive = None
+        if cache_dir is not None:
+            self.enable_cache(cache_dir)
+        
+        # 快照有效時不連線，第一次請求時才取得 Token；否則連線進入並輸出連線狀態
+        if snapshot is not None and not refresh and self.load_snapshot(snapshot):
+            self.status_code = None
+        else:
+            self.status_code = self._request_token_authorization()
+            if self.status_code == 200:
+                self._startup(startup, snapshot, refresh)
         
     def __repr__(self):
         return '歡迎使用數據貓頭鷹資料庫, 連線狀態: {}'.format(str(self.status_code))
     
     # Token 取得
     def _request_token_authorization(self) -> int:
-        self._token_result = requests.request("POST",self._token['token_url'],
+        self._token_result = self._send("POST",self._token['token_url'], auth = False, priority = PRIORITY_INTERACTIVE,
                                         data = self._token['token_params'],
                                         headers = self._token['token_headers'])
 
         if (self._token_result.status_code == 200):    
             token = json.loads(self._token_result.text).get("token")
             self._data_headers = {'authorization':'Bearer ' + token}
-            self._pdid_map()
             return self._token_result.status_code
 
         elif(self._token_result.status_code in OwlError._http_error.keys()):
-            print('錯誤代碼: {} '.format(str(self._token_result.status_code)),OwlError._http_error[self._token_result.status_code])
+            _fail_http(self, self._token_result.status_code, url = self._token['token_url'])
         
         else:
-            print("連線錯誤，請洽業務人員")
+            _fail_connection(self, url = self._token['token_url'])
             
+    # Token 過期時重新取得，多執行緒同時收到 401 只重新認證一次
+    def _reauthorize(self, used:dict):
+        with self._auth_lock:
+            if self._data_headers is used:
+                self.status_code = self._request_token_authorization()
+
+    # 送出請求: 401 重新認證，5xx 與連線錯誤以指數退避重試，總時間不超過 deadline
+    def _send(self, method:str, url:str, auth:bool = True, priority:int = PRIORITY_NORMAL, **kwargs) -> 'Response':
+        retry = self._retry
+        deadline = time.monotonic() + retry.deadline
+        attempt = 0
+        renewed = False
+        while True:
+            if auth:
+                # 以快照啟動時尚未取得 Token
+                if not self._data_headers:
+                    self._reauthorize(self._data_headers)
+                kwargs['headers'] = self._data_headers
+            if self._limiter is not None and not self._limiter.acquire(priority, deadline - time.monotonic()):
+                raise requests.Timeout('等待流量額度逾時')
+            kwargs['timeout'] = retry.clip(self._session.timeout, deadline - time.monotonic())
+
+            error = None
+            try:
+                result = self._session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                result, error = None, e
+            else:
+                if auth and result.status_code == 401 and not renewed:
+                    renewed = True
+                    self._reauthorize(kwargs['headers'])
+                    if self._data_headers is not kwargs['headers']:
+                        result.close()
+                        continue
+                if result.status_code not in retry.statuses:
+                    return result
+
+            delay = retry.delay(attempt)
+            attempt += 1
+            if attempt > retry.retries or time.monotonic() + delay >= deadline:
+                if error is not None:
+                    raise error
+                return result
+            if result is not None:
+                result.close()
+            time.sleep(delay)
+
+    # 載入商品表與時間表
+    def _startup(self, startup:str, snapshot:str, refresh:bool):
+        if refresh or snapshot is not None:
+            self.refresh(snapshot)
+        elif startup == 'parallel':
+            self.warm_up()
+        elif startup == 'eager':
+            self._pdid_map()
+        elif startup != 'lazy':
+            _fail(self, 'ExError', ", startup 請輸入 'eager', 'parallel' 或 'lazy'")
+    
+    # 啟用本地快取
+    def enable_cache(self, path:str, max_bytes:int = 512 * 1024 ** 2, ttl:int = 3600, rules:dict = None) -> OwlCache:
+        '''
+        啟用回應資料的本地磁碟快取
+        
+        Parameters
+        ----------
+        :param path: str
+            - 快取資料夾路徑
+            
+        :param max_bytes: int, default 512MB
+            - 快取容量上限，超過時淘汰最久未使用的資料
+            
+        :param ttl: int, default 3600
+            - 未收盤區間的存活秒數
+            
+        :param rules: dict, default None
+            - 個別商品的存活秒數，例如 {'msp': 600}；0 表示不快取，None 表示永不過期
+            
+        Returns
+        ----------
+        OwlCache
+
+        Notes
+        ----------
+        - 已過公告期限的歷史區間永不過期 (如季報為期末後 45 日，第四季 90 日)，即時報價 (tsp) 不快取
+        
+        '''
+        self._cache = OwlCache(path, max_bytes = max_bytes, ttl = ttl, rules = rules)
+        return self._cache
+    
+    # 停用本地快取
+    def disable_cache(self):
+        self._cache = None
+    
+    # 快取命中統計
+    def cache_info(self) -> dict:
+        '''
+        Returns
+        ----------
+        dict: hits, misses, entries, bytes；未啟用快取時回傳 None
+        '''
+        if self._cache is None:
+            return None
+        return self._cache.info()
+    
+    # 連線池狀態
+    def pool_stats(self) -> dict:
+        '''
+        查詢連線池使用狀況，用以確認連線是否重複使用
+        
+        Returns
+        ----------
+        dict: 以主機為鍵值，connections - 建立連線數, requests - 請求數, idle - 閒置連線數, reuse - 重複使用率
+        '''
+        return self._session.stats()
+    
+    # 關閉連線池
+    def close(self):
+        self._session.close()
+    
     # 呼叫 OwlData 資料下載
-    def _data_from_owl(self, url:str) -> 'DataFrame':
+    def _data_from_owl(self, url:str, pdid:str = None, trace:_Trace = None) -> 'DataFrame':
         '''
         輸入API網址，獲取對應的數據資料
         
@@ -104,6 +649,14 @@ class OwlData(_DataID):
 
             - 在url的地方輸入API網址，回傳數據資料 - 個股/多股
         
+        :param pdid: str, default None
+
+            - 商品代碼，作為快取鍵值與存活規則的依據
+        
+        :param trace: _Trace, default None
+
+            - 啟用效能監控時記錄各階段耗時
+        
         Returns
         --------
         :DataFrame: 輸出分別為個股與多股
@@ -133,91 +686,87 @@ class OwlData(_DataID):
         個股: 假設基準日: 20190701、股票代號: 1101、期數: 20，則會撈取自20190701往前20筆 1101的資料
         多股: 取指定日期當天，各檔的數據資料
         '''
-        data_result = requests.request("GET", url, headers = self._data_headers)
+        if self._cache is not None:
+            func = self._get_func(pdid)
+            body = self._cache.get(url, pdid, func)
+            if body is not None:
+                if self._recorder is not None:
+                    self._recorder.record(url, body)
+                if trace is None:
+                    return self._to_frame(body)
+                trace.cache, trace.bytes = 'hit', len(body)
+                start = time.perf_counter()
+                result = self._to_frame(body)
+                trace.decode = time.perf_counter() - start
+                return result
+            if trace is not None:
+                trace.cache = 'miss'
+        
+        try:
+            if trace is not None:
+                start = time.perf_counter()
+            data_result = self._send("GET", url, priority = self._priority(pdid), stream = True)
+            if trace is not None:
+                trace.http, trace.status = time.perf_counter() - start, data_result.status_code
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _fail_connection(self, detail = ', ' + type(e).__name__, pdid = pdid, url = url)
+            return 'error'
 
         try:
             if (data_result.status_code == 200):
-                data=json.loads(data_result.text)
-                return pd.DataFrame(data.get('Data'), columns = data.get('Title'))
-            elif(data_result.status_code in OwlError._http_error.keys()):
-                print('錯誤代碼: {} '.format(self._token_result.status_code),OwlError._http_error[self._token_result.status_code])
+                # 逐段解析回應內容，不建立完整字串與二維串列；啟用快取或錄製時另存原始片段
+                chunks = data_result.iter_content(_CHUNK)
+                if self._cache is not None or self._recorder is not None:
+                    raw = []
+                    chunks = (raw.append(chunk) or chunk for chunk in chunks)
+                if trace is None:
+                    result = _decode_stream(chunks, _NUMERIC)
+                else:
+                    start = time.perf_counter()
+                    result = _decode_stream(trace.count(chunks), _NUMERIC)
+                    trace.decode = time.perf_counter() - start
+                
+                if self._recorder is not None:
+                    self._recorder.record(url, b''.join(raw))
+                
+                # 空資料不寫入快取，避免資料尚未公布時被永久保存
+                if self._cache is not None and len(result) > 0:
+                    self._cache.set(url, b''.join(raw), pdid, func)
+                return result
+            else:
+                _fail_http(self, data_result.status_code, pdid = pdid, url = url)
                 return 'error'
+        except OwlException:
+            raise
         except:
             return 'error'
+        finally:
+            data_result.close()
 
-    # 修正資料
-    def _check(self, result:'DataFrame', freq=None, num_col=2, colists=None, pd_id=None) -> 'DataFrame':
-        '''
-        商品檢查點
-        Parameters
-        ----------
-        :param result: DataFrame
-            - 輸入原始表格
-            
-        :param freq: str
-            - 表格頻率
-            
-        :param num_col: int
-            - 數值化資料欄位起點
-            
-        :param colists: list, default None
-            - 填入欲查看的欄位名稱，未寫輸入則取全部欄位
-            
-        :param pd_id: str
-            - 商品代碼
-            
-        Returns
-        ----------
-        DataFrame
-        '''
+    # 查詢流程: 組合網址、下載資料、修正資料
+    def _query(self, req, *args) -> 'DataFrame':
+        pdid = get_data_url = ''
+        trace = _Trace() if self._metrics is not None else None
         try:
-            if result.empty:
-                print('SidError:',OwlError._dicts["SidError"])
-                return result
-            
-            if result is not 'error':
-                # 日期修正
-                if freq == 'd':
-                    result['日期'] = [pd.to_datetime(i) if i !='' else '' for i in result['日期']]
-                    if '股票代號' not in result.columns:
-                        result.sort_values('日期', inplace = True)
-                        result.reset_index(drop = True, inplace = True)
-                elif freq == 'm':
-                    result['年月'] = [pd.to_datetime(i,format='%Y%m')+MonthEnd(1) if i !='' else '' for i in result['年月']]
-                    if '股票代號' not in result.columns:
-                        result.sort_values('年月', inplace = True)
-                        result.reset_index(drop = True, inplace = True)
-                elif freq == 'q':
-                    result['年季'] = result['年季'].apply(lambda x: x[0:4]+x[4:6].replace('0','Q'))
-                    result['年季'] = [pd.to_datetime(i)+QuarterEnd(1) if i !='' else '' for i in result['年季']]
-                    if '股票代號' not in result.columns:
-                        result.sort_values('年季', inplace = True)
-                        result.reset_index(drop = True, inplace = True)
-                elif freq == 'y':
-                    result['年度'] = [pd.to_datetime(i)+YearEnd(1) if i !='' else '' for i in result['年度']]
-                    if '股票代號' not in result.columns:
-                        result.sort_values('年度', inplace = True)
-                        result.reset_index(drop = True, inplace = True)
+            spec = req(*args)
+            if spec is None:
+                return None
+            get_data_url, pdid, opts = spec
+            if trace is None:
+                result = self._data_from_owl(get_data_url, pdid)
+                return self._check(result = result, pd_id = pdid, **opts)
 
-                # 數值化
-                if num_col != None:
-                    result.iloc[:,num_col:] = result.iloc[:,num_col:].apply(pd.to_numeric)
-                
-                # 欄位選擇
-                if colists != None:
-                    result = result[colists].copy()
-                    
-                elif colists == []:
-                    print('ColumnsError: 請輸入欄位')
-                    return None
-                return result
-
-        except ValueError:
-            print('ValueError:', OwlError._dicts["ValueError"])
-        except KeyError:
-            print('ColumnsError:', OwlError._dicts["ColumnsError"])                   
+            result = self._data_from_owl(get_data_url, pdid, trace)
+            checked = time.perf_counter()
+            result = self._check(result = result, pd_id = pdid, **opts)
+            self._observe(trace, get_data_url, pdid, result, checked)
+            return result
+        except OwlException:
+            if trace is not None and pdid:
+                self._observe(trace, get_data_url, pdid, None, time.perf_counter())
+            raise
         except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pd_id)
+            _fail(self, 'PdError', ", 商品代碼: " + pdid, pdid = pdid)
     
     # 個股日收盤行情 (Single Stock Price)
     def ssp(self, sid:str, bpd:str, epd:str, colist=None) -> 'DataFrame':
@@ -247,22 +796,9 @@ class OwlData(_DataID):
         - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空
         
         '''
-        try:
-            pdid = self._get_pdid("ssp")
-            dt = self._date_freq(bpd, epd, 'd')
-            
-            if (dt != 'error'):
-                # 獲取資料
-                get_data_url = self._token['data_url']+"date/" + epd + "/" + pdid + "/" + sid + "/" + dt
-                result = self._data_from_owl(get_data_url)
-                temp = self._check(result = result, freq = 'd', num_col = 2, colists = colist, pd_id = pdid)
-                return temp
+        return self._query(self._req_ssp, sid, bpd, epd, colist)
 
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
-   
     # 多股每日收盤行情 (Multi Stock Price)
-    @OwlError._check_dt(di = 'd')
     def msp(self, dt:str, colist=None) -> 'DataFrame':
         '''
         依指定日期，撈取全上市櫃台股的股價資訊
@@ -284,14 +820,7 @@ class OwlData(_DataID):
         - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空
 
         '''
-        try:
-            pdid = self._get_pdid("msp")
-            get_data_url = self._token['data_url'] + 'date/' + dt + '/' + pdid
-            result = self._data_from_owl(get_data_url)
-            temp = self._check(result = result, freq = 'd', num_col = 3, colists = colist, pd_id = pdid)
-            return temp
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
+        return self._query(self._req_msp, dt, colist)
 
     # 個股財務簡表 (Financial Statements Single )
     def fis(self, sid:str, di:str, bpd:str, epd:str, colist=None) -> 'DataFrame':
@@ -332,32 +861,9 @@ class OwlData(_DataID):
         - 參數 di 大小寫無異
         
         '''
-        try:
-            if di.lower() == 'y':
-                pdid = self._get_pdid("sby")
-                dt = self._date_freq(bpd, epd, di.lower())
-                get_data_url=self._token['data_url']+"date/"+epd+"0101/"+pdid+"/"+sid+"/"+dt
-            
-            elif di.lower() == 'q':
-                pdid = self._get_pdid("sbq")
-                dt = self._date_freq(bpd, epd, di.lower())
-                get_data_url=self._token['data_url']+"date/"+epd+"01/"+pdid+"/"+sid+"/"+dt
-                
-            elif di.lower() == 'm':
-                pdid = self._get_pdid("sbm")
-                dt = self._date_freq(bpd, epd, di.lower())
-                get_data_url=self._token['data_url']+"date/"+epd+"01/"+pdid+"/"+sid+"/"+dt
+        return self._query(self._req_fis, sid, di, bpd, epd, colist)
 
-            if (dt != 'error'):
-                # 獲取資料
-                result = self._data_from_owl(get_data_url)
-                temp = self._check(result = result, freq = di.lower(), num_col = 1, colists = colist, pd_id = pdid)
-                return temp
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
-    
     # 多股財務簡表 (Financial Statements Multi)
-    @OwlError._check_di
     def fim(self, di:str, dt:str , colist=None) -> 'DataFrame':
         '''
         依據 di 決定查詢資料頻率，並依指定區間，撈取全上市櫃台股的財務報表資訊
@@ -390,34 +896,8 @@ class OwlData(_DataID):
         - 參數 di 大小寫無異
         
         '''
-        try:
-            if di.lower() == 'y':
-                pdid = self._get_pdid("mby")
-                get_data_url=self._token['data_url']+"date/"+dt+"0101/"+pdid
-            
-            elif di.lower() == 'q':
-                pdid = self._get_pdid("mbq")
-                if int(dt[4:6]) == 1:
-                    pass
-                elif int(dt[4:6]) == 2:
-                    dt = str(int(dt)+2)
-                elif int(dt[4:6]) == 3:
-                    dt = str(int(dt)+4)
-                elif int(dt[4:6]) == 4:
-                    dt = str(int(dt)+6)
-                get_data_url=self._token['data_url']+"date/"+dt+"01/"+pdid
-                
-            elif di.lower() == 'm':
-                pdid = self._get_pdid("mbm")
-                get_data_url=self._token['data_url']+"date/"+dt+"01/"+pdid
-                
-            # 獲取資料
-            result = self._data_from_owl(get_data_url)
-            temp = self._check(result = result, freq = di.lower(), num_col = 3, colists = colist, pd_id = pdid)
-            return temp
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
-        
+        return self._query(self._req_fim, di, dt, colist)
+
     # 法人籌碼個股歷史資料 (Corporate Chip Single)
     def chs(self, sid:str, bpd:str, epd:str, colist=None) -> 'DataFrame':
         '''
@@ -446,21 +926,9 @@ class OwlData(_DataID):
         - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空
         
         '''
-        try:
-            pdid = self._get_pdid("sch")
-            dt = self._date_freq(bpd, epd, 'd')
-            
-            if (dt != 'error'):
-                # 獲取資料
-                get_data_url = self._token['data_url']+"date/" + epd + "/" + pdid + "/" + sid + "/" + dt
-                result = self._data_from_owl(get_data_url)
-                temp = self._check(result = result, freq = 'd', num_col = 1, colists = colist, pd_id = pdid)
-                return temp
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
+        return self._query(self._req_chs, sid, bpd, epd, colist)
 
     # 法人籌碼多股歷史資料 (Corporate Chip Multi)
-    @OwlError._check_dt(di = 'd')
     def chm(self, dt:str, colist=None) -> 'DataFrame':
         '''
         查詢指定日期，全上市櫃台股的三大法人買賣狀況和融資券狀況
@@ -482,15 +950,8 @@ class OwlData(_DataID):
         - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空
         
         '''
-        try:
-            pdid = self._get_pdid("mch")
-            get_data_url = self._token['data_url'] + 'date/' + dt + '/' + pdid
-            result = self._data_from_owl(get_data_url)
-            temp = self._check(result = result, freq = 'd', num_col = 3, colists = colist, pd_id = pdid)
-            return temp
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
-                       
+        return self._query(self._req_chm, dt, colist)
+
     # 技術指標 個股 (Technical indicators Single)
     def tis(self, sid:str, bpd:str, epd:str, colist=None) -> 'DataFrame':
         '''
@@ -519,21 +980,9 @@ class OwlData(_DataID):
         - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空
         
         '''
-        try:
-            pdid=self._get_pdid("sth")
-            dt = self._date_freq(bpd, epd, 'd')
-            
-            if (dt != 'error'):
-                # 獲取資料
-                get_data_url = self._token['data_url']+"date/" + epd + "/" + pdid + "/" + sid + "/" + dt
-                result = self._data_from_owl(get_data_url)
-                temp = self._check(result = result, freq = 'd', num_col = 1, colists = colist, pd_id = pdid)
-                return temp
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
-   
+        return self._query(self._req_tis, sid, bpd, epd, colist)
+
     # 技術指標 多股 (Technical indicators Multi) 
-    @OwlError._check_dt(di = 'd')
     def tim(self, dt:str, colist=None) -> 'DataFrame':
         '''
         查詢指定日期，全上市櫃台股的技術指標數值
@@ -555,15 +1004,8 @@ class OwlData(_DataID):
         - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空
         
         '''
-        try:
-            pdid = self._get_pdid("mth")
-            get_data_url = self._token['data_url'] + 'date/' + dt + '/' + pdid
-            result = self._data_from_owl(get_data_url)
-            temp = self._check(result = result, freq = 'd', num_col = 3, colists = colist, pd_id = pdid)
-            return temp
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
-    
+        return self._query(self._req_tim, dt, colist)
+
     # 公司基本資料 多股 (Company information Multi)
     def cim(self, colist=None) -> 'DataFrame':
         '''
@@ -583,17 +1025,8 @@ class OwlData(_DataID):
         - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空
         
         '''
-        try:
-            pdid = self._get_pdid("mcm")
-            # 獲取資料
-            get_data_url = self._token['data_url']  + pdid
-            
-            result = self._data_from_owl(get_data_url)
-            temp = self._check(result = result, num_col = -1, colists = colist, pd_id = pdid)
-            return temp
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
-    
+        return self._query(self._req_cim, colist)
+
     # 股利政策 個股 (Dividend Policy Single)
     def dps(self, sid:str, bpd:str, epd:str, colist=None) -> 'DataFrame':
         '''
@@ -622,21 +1055,9 @@ class OwlData(_DataID):
         - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空
         
         '''
-        try:
-            pdid = self._get_pdid("scm1")
-            dt = self._date_freq(bpd, epd, 'y')
-            
-            if (dt != 'error'):
-                # 獲取資料
-                get_data_url = self._token['data_url']+"date/" + epd + '0101' + "/" + pdid + "/" + sid + "/" + dt
-                result = self._data_from_owl(get_data_url)
-                temp = self._check(result = result, freq = 'y', num_col = 3, colists = colist, pd_id = pdid)
-                return temp
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
-    
+        return self._query(self._req_dps, sid, bpd, epd, colist)
+
     # 股利政策 多股 (Dividend Policy Multi)
-    @OwlError._check_dt(di = 'y')
     def dpm(self, dt:str, colist=None) -> 'DataFrame':
         '''
         依指定年度，撈取全上市櫃台股的配發股利狀況表
@@ -658,14 +1079,7 @@ class OwlData(_DataID):
         - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空
 
         '''
-        try:
-            pdid = self._get_pdid("mcm1")
-            get_data_url = self._token['data_url'] + 'date/' + dt + '1231/' + pdid
-            result = self._data_from_owl(get_data_url)
-            temp = self._check(result = result, freq = 'y', num_col = 5, colists = colist, pd_id = pdid)
-            return temp
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
+        return self._query(self._req_dpm, dt, colist)
 
     # 除權除息 個股 (Exemption Dividend Policy Single)
     def edps(self, sid:str, bpd:str, epd:str, colist=None) -> 'DataFrame':
@@ -695,21 +1109,9 @@ class OwlData(_DataID):
         - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空 
         
         '''
-        try:
-            pdid = self._get_pdid("scm2")
-            dt = self._date_freq(bpd, epd, 'y')
-            
-            if (dt != 'error'):
-                # 獲取資料
-                get_data_url = self._token['data_url']+"date/" + epd + '0101' + "/" + pdid + "/" + sid + "/" + dt
-                result = self._data_from_owl(get_data_url)
-                temp = self._check(result = result, freq = 'y', num_col = None, colists = colist, pd_id = pdid)
-                return temp
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
-    
+        return self._query(self._req_edps, sid, bpd, epd, colist)
+
     # 除權除息 多股 (Exemption Dividend Policy Multi)
-    @OwlError._check_dt(di = 'y')   
     def edpm(self, dt:str, colist=None) -> 'DataFrame':
         '''
         依指定日期，撈取全上市櫃台股的股東會日期及停止過戶的相關日期
@@ -731,16 +1133,8 @@ class OwlData(_DataID):
         - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空 
         
         '''
-        try:
-            pdid = self._get_pdid("mcm2")
-            # 獲取資料
-            get_data_url = self._token['data_url'] + 'date/' + dt + '0101/' + pdid
-            result = self._data_from_owl(get_data_url)
-            temp = self._check(result = result, freq = 'y', num_col = None, colists = colist, pd_id = pdid)
-            return temp
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
-    
+        return self._query(self._req_edpm, dt, colist)
+
     # 即時報價 (Timely Stock Price)
     def tsp(self, sid:str, colist=None) -> 'DataFrame':
         '''
@@ -763,13 +1157,4 @@ class OwlData(_DataID):
         - 發生錯誤時，會直接顯示錯誤訊息，回傳變數為空 
         
         '''
-        try:
-            pdid = self._get_pdid("mnp")
-            
-            # 獲取資料
-            get_data_url = self._token['data_url'] + pdid + "/" + sid
-            result = self._data_from_owl(get_data_url)
-            temp = self._check(result=result, num_col=3, colists=colist, pd_id=pdid)
-            return temp
-        except:
-            print('PdError:', OwlError._dicts["PdError"]+", 商品代碼: " + pdid)
+        return self._query(self._req_tsp, sid, colist)
\ No newline at end of file
@@ -0,0 +1,440 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# =====================================================================
+# Copyright (C) 2018-2019 by Owl Data
+# author: Danny, Destiny
+
+# =====================================================================
+
+import datetime
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from pandas.tseries.offsets import MonthEnd, QuarterEnd, YearEnd
+
+from ._owltime import _DATE_SPEC, _parse_dates, _drop_calendars
+from ._owlstream import _decode_stream, _chunked
+from ._owlreplay import OwlReplayServer
+from .__version__ import __version__
+from .config import colist_dict, coltype_map
+
+# --------------------
+# BLOCK 效能量測
+# --------------------
+# 合成資料
+def _synthetic_frame(rows:int = 2000, cols:int = 15, freq:str = 'd', blank:float = 0.01, seed:int = 0) -> 'DataFrame':
+    '''
+    產生與 API 回應相同型態 (皆為字串) 的合成表格
+
+    Parameters
+    ----------
+    :param rows: int
+        - 筆數
+
+    :param cols: int
+        - 欄位數，含日期欄位
+
+    :param freq: str
+        - 日期欄位頻率 d, m, q, y
+
+    :param blank: float
+        - 日期為空字串的比例
+    '''
+    rng = np.random.RandomState(seed)
+    days = pd.bdate_range(end = '2019-12-31', periods = rows)
+    if freq == 'd':
+        dates = days.strftime('%Y%m%d')
+    elif freq == 'm':
+        dates = days.strftime('%Y%m')
+    elif freq == 'q':
+        dates = days.year.astype(str) + ['0' + str(q) for q in days.quarter]
+    else:
+        dates = days.strftime('%Y')
+
+    dates = np.array(dates, dtype = object)
+    dates[rng.rand(rows) < blank] = ''
+
+    data = {_DATE_SPEC[freq][0]:dates}
+    for i in range(cols - 1):
+        data['col{}'.format(i)] = np.round(rng.rand(rows) * 1000, 2).astype(str)
+    return pd.DataFrame(data)
+
+# 舊版逐筆日期轉換，作為比較基準
+def _legacy_dates(values:'Series', freq:str) -> list:
+    if freq == 'd':
+        return [pd.to_datetime(i) if i !='' else '' for i in values]
+    elif freq == 'm':
+        return [pd.to_datetime(i,format='%Y%m')+MonthEnd(1) if i !='' else '' for i in values]
+    elif freq == 'q':
+        values = values.apply(lambda x: x[0:4]+x[4:6].replace('0','Q'))
+        return [pd.to_datetime(i)+QuarterEnd(1) if i !='' else '' for i in values]
+    return [pd.to_datetime(i)+YearEnd(1) if i !='' else '' for i in values]
+
+def _timeit(func, repeat:int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+# 日期轉換效能
+def bench_check_dates(rows:int = 2000, cols:int = 15, repeat:int = 5) -> 'DataFrame':
+    '''
+    比較 _check 日期轉換的逐筆與向量化版本
+
+    Parameters
+    ----------
+    :param rows: int, default 2000
+        - 合成表格筆數
+
+    :param cols: int, default 15
+        - 合成表格欄位數
+
+    :param repeat: int, default 5
+        - 重複次數，取最佳值
+
+    Returns
+    ----------
+    DataFrame
+        - index 為頻率，欄位為 legacy(s)、vectorized(s)、speedup
+    '''
+    records = {}
+    for freq in _DATE_SPEC:
+        frame = _synthetic_frame(rows, cols, freq)
+        values = frame[_DATE_SPEC[freq][0]]
+        legacy = _timeit(lambda: _legacy_dates(values, freq), repeat)
+        vectorized = _timeit(lambda: _parse_dates(values, freq), repeat)
+        records[freq] = {'legacy(s)':legacy, 'vectorized(s)':vectorized, 'speedup':legacy / vectorized}
+    return pd.DataFrame(records).T
+
+# 合成回應內容
+def _synthetic_body(rows:int = 2000, cols:int = 15, freq:str = 'd', seed:int = 0) -> bytes:
+    # 日期區間有限，超過時循環使用
+    frame = _synthetic_frame(min(rows, 2000), cols, freq, blank = 0, seed = seed)
+    frame = frame.iloc[np.arange(rows) % len(frame)]
+    frame.insert(0, '股票代號', ['{:04d}'.format(1101 + i) for i in range(rows)])
+    payload = {'Title':list(frame.columns), 'Data':frame.values.tolist()}
+    return json.dumps(payload, ensure_ascii = False).encode('utf-8')
+
+# 舊版解析: 完整字串 -> 二維串列 -> 表格，數值欄位於 _check 再轉換
+def _legacy_decode(body:bytes, numeric:set) -> 'DataFrame':
+    data = json.loads(body.decode('utf-8'))
+    frame = pd.DataFrame(data.get('Data'), columns = data.get('Title'))
+    for col in frame.columns:
+        if col in numeric:
+            frame[col] = pd.to_numeric(frame[col])
+    return frame
+
+def _peak(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+# 回應解析效能
+def bench_decode(sizes:tuple = (2000, 20000, 100000), cols:int = 15, repeat:int = 3) -> 'DataFrame':
+    '''
+    比較完整解析與串流解析的時間與峰值記憶體，皆含數值欄位轉換
+
+    Parameters
+    ----------
+    :param sizes: tuple, default (2000, 20000, 100000)
+        - 合成回應的筆數，2000 約為 msp 全市場一日
+
+    :param cols: int, default 15
+        - 合成回應的欄位數
+
+    :param repeat: int, default 3
+        - 重複次數，時間取最佳值
+
+    Returns
+    ----------
+    DataFrame
+        - index 為筆數，欄位為 body(MB)、legacy(s)、stream(s)、legacy peak(MB)、stream peak(MB)
+        - 峰值記憶體以 tracemalloc 量測，不含回應內容本身
+    '''
+    records = {}
+    for rows in sizes:
+        body = _synthetic_body(rows, cols)
+        numeric = {'col{}'.format(i) for i in range(cols - 1)}
+        legacy = lambda: _legacy_decode(body, numeric)
+        stream = lambda: _decode_stream(_chunked(body), numeric)
+        records[rows] = {
+            'body(MB)':len(body) / 1024 ** 2,
+            'legacy(s)':_timeit(legacy, repeat),
+            'stream(s)':_timeit(stream, repeat),
+            'legacy peak(MB)':_peak(legacy) / 1024 ** 2,
+            'stream peak(MB)':_peak(stream) / 1024 ** 2
+            }
+    return pd.DataFrame(records).T
+
+# --------------------
+# BLOCK 全函數效能量測
+# --------------------
+# 各函數的資料頻率與是否為多股
+_SUITE = {
+    'ssp':('d', False), 'chs':('d', False), 'tis':('d', False), 'fis':('q', False),
+    'dps':('y', False), 'edps':('y', False), 'tsp':(None, False),
+    'msp':('d', True), 'chm':('d', True), 'tim':('d', True), 'fim':('q', True),
+    'dpm':('y', True), 'edpm':('y', True), 'cim':(None, True)
+    }
+
+# 量測情境: (股票數, 期數)，(1800, 2500) 為全市場 10 年
+_SCENARIOS = [(1, 20), (1, 250), (50, 250), (1800, 20), (1800, 2500)]
+
+_STAGES = ['request', 'network', 'decode', 'dates', 'coerce', 'select', 'total']
+
+# 商品代碼
+_SUITE_PDID = {
+    'ssp':'PYPRI-1', 'msp':'PYPRI-2', 'sby':'PYBAL-1', 'sbq':'PYBAL-2', 'sbm':'PYBAL-3',
+    'mby':'PYBAL-4', 'mbq':'PYBAL-5', 'mbm':'PYBAL-6', 'sch':'PYCH-1', 'mch':'PYCH-2',
+    'sth':'PYTH-1', 'mth':'PYTH-2', 'mcm':'PYCM-1', 'scm1':'PYDV-1', 'mcm1':'PYDV-2',
+    'scm2':'PYED-1', 'mcm2':'PYED-2', 'mnp':'PYNP-1'
+    }
+
+def _payload(title:list, data) -> bytes:
+    return json.dumps({'Title':title, 'Data':data}, ensure_ascii = False).encode('utf-8')
+
+# 合成交易日曆，約 15 年
+def _suite_calendars() -> dict:
+    days = pd.bdate_range('2010-01-01', '2024-12-31')
+    return {
+        'd':list(days.strftime('%Y%m%d')),
+        'm':sorted(set(days.strftime('%Y%m'))),
+        'q':sorted(set(days.year.astype(str) + ['0' + str(q) for q in days.quarter])),
+        'y':sorted(set(days.strftime('%Y')))
+        }
+
+# 依欄位型態表合成一個函數的回應
+def _suite_body(func:str, freq:str, rows:int, dates:list, seed:int = 0) -> bytes:
+    # 欄位表已含多股回應的日期欄位
+    cols = colist_dict[func][freq] if isinstance(colist_dict[func], dict) else colist_dict[func]
+    rng = np.random.RandomState(seed)
+    data = {}
+    for col in cols:
+        dtype = coltype_map.get(col, 'float64')
+        if dtype == 'datetime':
+            data[col] = [dates[i % len(dates)] for i in range(rows)]
+        elif col == '股票代號':
+            data[col] = ['{:04d}'.format(1101 + i) for i in range(rows)]
+        elif dtype in ('str', 'category'):
+            data[col] = ['名{}'.format(i % 2000) for i in range(rows)]
+        else:
+            data[col] = list(np.round(rng.rand(rows) * 1000, 2).astype(str))
+    return _payload(cols, [list(row) for row in zip(*[data[col] for col in cols])])
+
+# 建立連線至合成資料的重播伺服器
+def _suite_server(calendars:dict) -> OwlReplayServer:
+    base = 'http://127.0.0.1/OwlApi/api/v2/json/'
+    records = {}
+    records[base + 'PYCtrl-14882b'] = _payload(['FuncID', 'pdid'], [[k, v] for k, v in _SUITE_PDID.items()])
+    for freq, code in {'d':'PYCtrl-14806a/', 'm':'PYCtrl-14809a/', 'q':'PYCtrl-14810a/', 'y':'PYCtrl-14811a/'}.items():
+        body = _payload([_DATE_SPEC[freq][0]], [[x] for x in calendars[freq]])
+        records[base + code] = body
+        if freq == 'd':
+            records[base + code + '/TWA00/9999'] = body
+    server = OwlReplayServer({})
+    for url, body in records.items():
+        server.add(url, body)
+    return server
+
+# 各函數的查詢參數
+def _suite_calls(func:str, freq:str, multi:bool, tickers:int, periods:int, calendars:dict) -> tuple:
+    if func == 'tsp':
+        return [('{:04d}'.format(1101 + i),) for i in range(tickers)], 1, calendars['d']
+    if func == 'cim':
+        return [() for _ in range(periods)], tickers, calendars['d']
+
+    keys = calendars[freq]
+    if multi:
+        dates = [keys[-1 - i % len(keys)] for i in range(periods)]
+        calls = [(freq, dt) if func == 'fim' else (dt,) for dt in dates]
+        return calls, tickers, None
+
+    rows = min(periods, len(keys))
+    bpd, epd = keys[-rows], keys[-1]
+    sids = ['{:04d}'.format(1101 + i) for i in range(tickers)]
+    calls = [(sid, freq, bpd, epd) if func == 'fis' else (sid, bpd, epd) for sid in sids]
+    return calls, rows, keys[-rows:][::-1]
+
+def _percentiles(values:list) -> dict:
+    values = np.asarray(values) * 1000
+    return {'p50_ms':float(np.percentile(values, 50)), 'p90_ms':float(np.percentile(values, 90)),
+            'p99_ms':float(np.percentile(values, 99)), 'mean_ms':float(values.mean()), 'n':int(len(values))}
+
+# 單次查詢的分段量測
+def _suite_stages(owl, func:str, args:tuple, colist:list, server, body:bytes, trace:bool = False) -> dict:
+    from .api import _NUMERIC, _typed_frame
+    clock = time.perf_counter
+    marks = {}
+    memory = {}
+
+    # 記憶體: peak 為階段內峰值，net 為階段結束時新增的配置量
+    def mark(stage, start):
+        marks[stage] = clock() - start
+        if trace:
+            current, peak = tracemalloc.get_traced_memory()
+            memory[stage] = {'peak_kb':(peak - base[0]) / 1024, 'net_kb':(current - base[0]) / 1024}
+            base[0] = current
+            tracemalloc.reset_peak()
+        return clock()
+
+    base = [tracemalloc.get_traced_memory()[0] if trace else 0]
+    if trace:
+        tracemalloc.reset_peak()
+
+    start = clock()
+    spec = getattr(owl, '_req_' + func)(*args)
+    url, pdid, opts = spec
+    server.add(url, body)
+    start = mark('request', start)
+
+    content = owl._send('GET', url).content
+    start = mark('network', start)
+
+    frame = _decode_stream(_chunked(content), _NUMERIC)
+    start = mark('decode', start)
+
+    freq = opts.get('freq')
+    if freq in _DATE_SPEC and _DATE_SPEC[freq][0] in frame.columns:
+        date_col = _DATE_SPEC[freq][0]
+        frame[date_col] = _parse_dates(frame[date_col], freq)
+    start = mark('dates', start)
+
+    frame = _typed_frame(frame, opts['num_col'])
+    start = mark('coerce', start)
+
+    frame = frame[[col for col in colist if col in frame.columns]].copy()
+    mark('select', start)
+
+    del content, frame
+    if trace:
+        base[0] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    start = clock()
+    result = getattr(owl, func)(*args)
+    mark('total', start)
+    server.discard(url)
+    return marks if not trace else memory
+
+def run_suite(path:str = 'owl_benchmark.json', methods:list = None, scenarios:list = None,
+              repeat:int = 3, max_calls:int = 50, full:bool = False) -> dict:
+    '''
+    以合成回應對 14 個查詢函數進行端對端量測，結果寫入 JSON 檔
+
+    Parameters
+    ----------
+    :param path: str, default 'owl_benchmark.json'
+        - 輸出檔案路徑，None 則不寫檔
+
+    :param methods: list, default None
+        - 量測的函數，預設為全部
+
+    :param scenarios: list, default None
+        - [(股票數, 期數), ...]，預設 (1, 20), (1, 250), (50, 250), (1800, 20), (1800, 2500)
+        - 個股函數每次回傳 期數 筆，共查詢 股票數 次；多股函數每次回傳 股票數 筆，共查詢 期數 次
+        - (1800, 2500) 為全市場 10 年
+
+    :param repeat: int, default 3
+        - 重複次數
+
+    :param max_calls: int, default 50
+        - 每個情境最多量測的查詢次數，None 為不限
+
+    :param full: bool, default False
+        - 完整量測: 不限查詢次數，每個情境執行全部 股票數 x 期數 的查詢，全市場 10 年需數小時
+
+    Returns
+    ----------
+    dict
+        - results: 每個函數與情境的各階段延遲百分位數 (ms)、各階段記憶體 (KB)、回應大小
+        - memory: peak_kb 為階段內峰值配置，net_kb 為階段結束時仍保留的配置
+
+    Notes
+    ----------
+    - 資料經由本機 OwlReplayServer 提供，network 為本機 HTTP 往返與讀取時間
+    - 階段: request 組合網址與檢查、network 下載、decode 解析、dates 日期轉換、
+      coerce 型態轉換、select 欄位選擇、total 公開函數端對端
+    '''
+    from .api import OwlData
+    methods = list(_SUITE) if methods is None else methods
+    scenarios = _SCENARIOS if scenarios is None else scenarios
+    if full:
+        max_calls = None
+
+    calendars = _suite_calendars()
+    server = _suite_server(calendars).start()
+    results = []
+    owl = None
+    try:
+        owl = OwlData('benchmark', 'benchmark', base_url = server.url, startup = 'parallel')
+        for func in methods:
+            freq, multi = _SUITE[func]
+            for tickers, periods in scenarios:
+                calls, rows, dates = _suite_calls(func, freq, multi, tickers, periods, calendars)
+                calls = calls[:max_calls]
+                body = _suite_body(func, freq or 'd', rows, dates or [calendars[freq or 'd'][-1]])
+                colist = (colist_dict[func][freq] if isinstance(colist_dict[func], dict) else colist_dict[func])[:5]
+
+                timings = {stage:[] for stage in _STAGES}
+                for _ in range(repeat):
+                    for args in calls:
+                        for stage, value in _suite_stages(owl, func, args, colist, server, body).items():
+                            timings[stage].append(value)
+
+                tracemalloc.start()
+                try:
+                    memory = _suite_stages(owl, func, calls[0], colist, server, body, trace = True)
+                finally:
+                    tracemalloc.stop()
+
+                results.append({
+                    'method':func, 'tickers':tickers, 'periods':periods, 'rows':rows,
+                    'calls':len(calls), 'body_bytes':len(body),
+                    'latency':{stage:_percentiles(values) for stage, values in timings.items()},
+                    'memory':memory
+                    })
+        owl.close()
+    finally:
+        server.stop()
+        # 合成日曆只屬於本機伺服器，不留給其他 OwlData
+        if owl is not None:
+            _drop_calendars(owl._token['data_url'])
+
+    report = {
+        'meta':{'owldata':__version__, 'pandas':pd.__version__, 'numpy':np.__version__,
+                'python':platform.python_version(), 'platform':platform.platform(),
+                'time':datetime.datetime.now().isoformat(timespec = 'seconds'), 'repeat':repeat},
+        'results':results
+        }
+    if path is not None:
+        with open(path, 'w', encoding = 'utf-8') as f:
+            json.dump(report, f, ensure_ascii = False, indent = 1)
+    return report
+
+# 量測結果摘要
+def suite_frame(report:dict, stat:str = 'p50_ms') -> 'DataFrame':
+    '''
+    將 run_suite 結果整理為表格，index 為 (函數, 股票數, 期數)，欄位為各階段
+    '''
+    records = {(r['method'], r['tickers'], r['periods']):{stage:v[stat] for stage, v in r['latency'].items()}
+               for r in report['results']}
+    return pd.DataFrame(records).T[_STAGES]
+
+if __name__ == '__main__':
+    # python -m owldata.benchmark [輸出檔案] [--full]
+    with pd.option_context('display.float_format', '{:.6f}'.format):
+        args = [arg for arg in sys.argv[1:] if arg != '--full']
+        if len(args) > 0:
+            print(suite_frame(run_suite(args[0], full = '--full' in sys.argv)))
+        else:
+            print(bench_check_dates())
+            print(bench_decode())
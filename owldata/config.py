@@ -7,109 +7,157 @@
 
 # =====================================================================
 
-# 各種欄位表
+# 各種欄位表，依 API 回傳 (付費版) 欄位順序，免費版為其子集
+_FS = ['流動資產(千)', '現金及約當現金(千)', '短期投資合計(千)', '應收帳款淨額(千)',
+       '存貨(千)', '非流動資產(千)', '不動產、廠房及設備(千)', '無形資產(千)',
+       '資產總計(千)', '流動負債(千)', '短期借款(千)', '應付票據(千)', '應付帳款(千)',
+       '非流動負債(千)', '應付公司債(千)', '負債總計(千)', '普通股股本(千)',
+       '特別股股本(千)', '公告每股淨值(元)', '保留盈餘(千)', '資本公積(千)',
+       '庫藏股票(千)', '母公司業主權益(千)', '權益總計(千)', '營業收入淨額(千)',
+       '營業成本(千)', '營業毛利(千)', '營業費用(千)', '營業利益(千)',
+       '營業外收入及支出(千)', '稅前純益(千)', '所得稅(千)', '繼續營業單位損益(千)',
+       '稅後純益(千)', '公告基本每股盈餘(元)', '營業活動現金流量(千)',
+       '投資活動現金流量(千)', '籌資活動現金流量(千)', '自由現金流量(千)',
+       '槓桿比率(%)', '流動比率(%)', '速動比率(%)', '負債比率(%)', '淨值成長率(%)',
+       '應付帳款週轉率(次)', '應收帳款週轉率(次)', '存貨週轉率(次)',
+       '固定資產週轉率(次)', '總資產週轉率(次)', '淨值週轉率(次)', '毛利率(%)',
+       '營業費用率(%)', '營業利益率(%)', '稅前純益率(%)', '稅後純益率(%)',
+       '稅前權益報酬率(%)', '稅後權益報酬率(%)', '稅前資產報酬率(%)',
+       '稅後資產報酬率(%)', '利息保障倍數(倍)', '營收成長率(%)', '總資產成長率(%)']
+
+_REVENUE = ['單月合併營收(千)', '去年單月合併營收(千)', '單月合併營收年成長(%)',
+            '單月合併營收月變動(%)', '累計合併營收(千)', '去年累計合併營收(千)',
+            '累計合併營收成長(%)', '近三月合併營收(千)', '近三月合併營收年成長(%)',
+            '近三月合併營收月變動(%)', '近12月合併營收(千)', '近12月合併營收成長(%)']
+
+_PRICE = ['開盤價', '最高價', '最低價', '收盤價', '成交量', '漲跌', '漲幅(%)',
+          '振幅(%)', '成交筆數', '成交金額(千)', '均張', '均價', '股本(百萬)',
+          '總市值(億)', '本益比', '股價淨值比', '本益比(近四季)']
+
+_CHIP = ['買賣超合計', '法人買賣超金額(千)', '法人持股比率(%)', '外資買賣超',
+         '外資買賣超金額(千)', '外資持股比率(%)', '投信買賣超', '投信買賣超金額(千)',
+         '投信庫存', '投信持股比率(%)', '自營商買賣超', '自營買賣超金額(千)',
+         '自營商買賣超(自行買賣)', '自營商買賣超(避險)', '自營商庫存', '自營商持股比率(%)',
+         '資餘', '資增減', '券餘', '券增減', '券資比', '資使用率', '券使用率', '當沖比率']
+
+_TECH = ['K(9)', 'D(9)', 'RSI(5)', 'RSI(10)', 'DIF', 'MACD', 'DIF-MACD', 'W%R(5)',
+         'W%R(10)', '+DI(14)', '-DI(14)', 'ADX(14)', 'Alpha(250D)', 'Beta係數(21D)',
+         'Beta係數(65D)', 'Beta係數(250D)', '年化波動度(21D)', '年化波動度(250D)',
+         '乖離率(20日)', '乖離率(60日)', '乖離率(250日)', 'EWMA波動率(%)',
+         '+DM(14)', '-DM(14)']
+
+_DIVIDEND = ['除息日', '除權日', '現金股利合計(元)', '股票股利合計(元)', '股利合計(元)',
+             '盈餘配息(元)', '公積配息(元)', '盈餘配股(元)', '公積配股(元)', '領股日期',
+             '領息日期', '現金股利殖利率(%)', '股票股利發放率(%)', '股利發放率(%)',
+             '董監改選年度']
+
+_EXDIVIDEND = ['停止過戶起', '停止過戶迄', '最後過戶日', '股東會日期', '停止融券起始日',
+               '融券回補日', '停止融券終迄日', '停止融資起始日', '停止融資終迄日']
+
 colist_dict = {
-    'ssp':['日期', '股票名稱', '開盤價', '最高價', 
-           '最低價', '收盤價', '漲跌', '漲幅(%)', 
-           '成交量', '成交筆數', '成交金額(千)', '均張', 
-           '均價', '成交量(股)'],
-    
-    'msp':['股票代號', '股票名稱', '日期', '開盤價',
-            '最高價', '最低價', '收盤價', '漲跌', '漲幅(%)', 
-            '成交量', '成交筆數', '成交金額(千)', '均張', 
-            '均價', '成交量(股)'],
-    
+    'ssp':['日期', '股票名稱'] + _PRICE,
+
+    'msp':['股票代號', '股票名稱', '日期'] + _PRICE,
+
     'fis':{
-           'y':['年度', '流動資產', '非流動資產', '資產總計', '流動負債', 
-                '非流動負債', '負債總計', '權益總計', '公告每股淨值', 
-                '營業收入(千)', '營業成本(千)', '營業毛利(千)', 
-                '營業費用(千)', '營業利益(千)', '營業外收入及支出(千)',
-                '稅前純益(千)', '所得稅(千)', '稅後純益歸屬(千)', 
-                '每股盈餘(元)', '營業活動現金流量(千)', 
-                '投資活動現金流量(千)', '籌資活動現金流量(千)', 
-                '本期現金及約當現金增減數(千)', '期末現金及約當現金餘額(千)',
-                '自由現金流量(千)'],
-           
-           'm':['年月', '單月合併營收(千)', '去年同期(千)', 
-                '單月合併營收年成長(%)', '單月合併營收月變動(%)', 
-                '累計合併營收(千)', '去年同期(千)1', '累計合併營收成長(%)'],
-           
-           'q':['年季', '流動資產', '非流動資產', '資產總計', '流動負債', 
-                '非流動負債', '負債總計', '權益總計', '公告每股淨值', '營業收入(千)', 
-                '營業成本(千)', '營業毛利(千)', '營業費用(千)', '營業利益(千)', 
-                '營業外收入及支出(千)', '稅前純益(千)', '所得稅(千)', 
-                '稅後純益歸屬(千)', '每股盈餘(元)', '營業活動現金流量(千)', 
-                '投資活動現金流量(千)', '籌資活動現金流量(千)', 
-                '本期現金及約當現金增減數(千)', '期末現金及約當現金餘額(千)', 
-                '自由現金流量(千)']
+           'y':['年度'] + _FS,
+           'm':['年月'] + _REVENUE,
+           'q':['年季'] + _FS
            },
 
     'fim':{
-           'y':['股票代號', '股票名稱', '年度', '流動資產', '非流動資產', 
-                '資產總計', '流動負債', '非流動負債', '負債總計', '權益總計',
-                 '公告每股淨值', '營業收入(千)', '營業成本(千)', 
-                 '營業毛利(千)', '營業費用(千)', '營業利益(千)', 
-                 '營業外收入及支出(千)', '稅前純益(千)', '所得稅(千)', 
-                 '稅後純益歸屬(千)', '每股盈餘(元)', '營業活動現金流量(千)', 
-                 '投資活動現金流量(千)', '籌資活動現金流量(千)', 
-                 '本期現金及約當現金增減數(千)', '期末現金及約當現金餘額(千)', 
-                 '自由現金流量(千)'],
-           
-           'm':['股票代號', '股票名稱', '年月', '單月合併營收(千)', 
-                '去年同期(千)', '單月合併營收年成長(%)',
-                '單月合併營收月變動(%)', '累計合併營收(千)', 
-                '去年同期(千)1', '累計合併營收成長(%)'],
-           
-           'q':['股票代號', '股票名稱', '年季', '流動資產', '非流動資產', 
-                '資產總計', '流動負債', '非流動負債', '負債總計', 
-                '權益總計', '公告每股淨值', '營業收入(千)', '營業成本(千)', 
-                '營業毛利(千)', '營業費用(千)', '營業利益(千)', 
-                '營業外收入及支出(千)', '稅前純益(千)', '所得稅(千)',
-                '稅後純益歸屬(千)', '每股盈餘(元)', '營業活動現金流量(千)',
-                '投資活動現金流量(千)', '籌資活動現金流量(千)', 
-                '本期現金及約當現金增減數(千)', '期末現金及約當現金餘額(千)',
-                '自由現金流量(千)']
+           'y':['股票代號', '股票名稱', '年度'] + _FS,
+           'm':['股票代號', '股票名稱', '年月'] + _REVENUE,
+           'q':['股票代號', '股票名稱', '年季'] + _FS
            },
 
-    'chs':['日期', '法人買賣超', '法人買賣超金額(千)', '外資買賣超', 
-           '外資買賣超金額(千)', '投信買賣超', '投信買賣超金額(千)', 
-           '自營買賣超', '自營買賣超金額(千)', '融資增減', '融資餘額', 
-           '融資使用率', '融券增減', '融券餘額', '融券使用率', '券資比', '當沖比率'],
-    
-    'chm':['股票代號', '股票名稱', '法人買賣超', '法人買賣超金額(千)', 
-           '外資買賣超', '外資買賣超金額(千)', '投信買賣超', '投信買賣超金額(千)', 
-           '自營買賣超', '自營買賣超金額(千)', '融資增減', '融資餘額', '融資使用率',
-            '融券增減', '融券餘額', '融券使用率', '券資比', '當沖比率'],
-    
-    'tis':['日期', 'K(9)', 'D(9)', 'RSI(5)', 'RSI(10)', 'DIF', 
-           'MACD', 'DIF-MACD', 'W%R(5)', 'W%R(10)', '+DI(14)', 
-           '-DI(14)', 'ADX(14)'],
-    
-    'tim':['股票代號', '股票名稱', '日期', 'K(9)', 'D(9)', 'RSI(5)',
-            'RSI(10)', 'DIF', 'MACD', 'DIF-MACD', 'W%R(5)',
-             'W%R(10)', '+DI(14)', '-DI(14)', 'ADX(14)'],
-    
-    'cim':['股票代號', '股票名稱', '中文簡稱', '英文簡稱', '公司名稱', 
-           '英文名稱', '地址', '電話', '傳真機號碼', '實收資本額(百萬)', 
-           '成立日期', '上市日期', '上櫃日期', '興櫃日期', '公發日期', 
-           '董事長', '總經理', '發言人', '上市上櫃', '產業名稱', '統一編號', 
-           '交易所公告股本(千)'],
-    
-    'dps':['年度', '現金股利合計', '股票股利合計', '股利合計', 
-           '現金股利殖利率(%)', '盈餘配息', '公積配息', '盈餘配股', '公積配股'],
-    
-    'dpm':['股票代號', '股票名稱', '年度', '現金股利合計', 
-           '股票股利合計', '股利合計', '現金股利殖利率(%)', 
-           '盈餘配息', '公積配息', '盈餘配股', '公積配股'],
-    
-    'edps':['年度', '股東會日期', '停止融券起始日', '融券回補日',
-             '停止融券終迄日', '停止融資起始日', '停止融資終迄日', 
-             '停止過戶起', '停止過戶迄', '最後過戶日'],
-    
-    'edpm':['股票代號', '股票名稱', '年度', '股東會日期', '停止融券起始日', 
-            '融券回補日', '停止融券終迄日', '停止融資起始日', '停止融資終迄日',
-             '停止過戶起', '停止過戶迄', '最後過戶日'],
-    
+    'chs':['日期'] + _CHIP,
+
+    'chm':['股票代號', '股票名稱', '日期'] + _CHIP,
+
+    'tis':['日期'] + _TECH,
+
+    'tim':['股票代號', '股票名稱', '日期'] + _TECH,
+
+    'cim':['股票代號', '股票名稱', '中文簡稱', '公司名稱', '地址', '電話', '上市上櫃',
+           '存續年度', '成立日期', '上市日期', '上櫃日期', '興櫃日期', '公發日期',
+           '董事長', '總經理', '發言人', '發言人職稱', '產業代號', '產業名稱',
+           '產業指數代號', '產業指數名稱', '股票過戶機構', '經營項目',
+           '前年度內銷比重(%)', '前年度外銷比重(%)', '交易所普通股股本(千)',
+           '交易所特別股股本(千)', '交易所普通股股數(千)', '交易所特別股股數(千)',
+           '交易所公告股本(千)', '實收資本額(百萬)', '普通股每股面額', '員工人數(人)'],
+
+    'dps':['年度'] + _DIVIDEND,
+
+    'dpm':['股票代號', '股票名稱', '年度'] + _DIVIDEND,
+
+    'edps':['年度'] + _EXDIVIDEND,
+
+    'edpm':['股票代號', '股票名稱', '年度'] + _EXDIVIDEND,
+
     'tsp':['股票代號', '股票名稱', '時間', '成交價', '漲跌', '漲跌幅',
             '總量', '開盤價', '最高價', '最低價', '成交量']
 }
+
+
+# 欄位型態表
+# - datetime: 由 _check 依頻率轉換為期末日
+# - str: 保留原始字串
+# - category: 重複度高的名稱欄位
+# - Int32: 可含缺值的整數 (張數、筆數、人數)
+# - float32: 價格與漲跌幅
+# - float64: 金額、財務數據與技術指標
+coltype_dict = {
+    'datetime':['日期', '年月', '年季', '年度'],
+
+    'str':['股票代號', '時間', '中文簡稱', '公司名稱', '地址', '電話', '存續年度',
+           '成立日期', '上市日期', '上櫃日期', '興櫃日期', '公發日期', '董事長',
+           '總經理', '發言人', '發言人職稱', '產業代號', '產業指數代號', '股票過戶機構',
+           '經營項目', '除息日', '除權日', '領股日期', '領息日期', '董監改選年度'] + _EXDIVIDEND,
+
+    'category':['股票名稱', '產業名稱', '產業指數名稱', '上市上櫃'],
+
+    'Int32':['成交量', '成交筆數', '總量', '買賣超合計', '外資買賣超', '投信買賣超',
+             '自營商買賣超', '自營商買賣超(自行買賣)', '自營商買賣超(避險)', '投信庫存',
+             '自營商庫存', '資餘', '資增減', '券餘', '券增減', '員工人數(人)'],
+
+    'float32':['開盤價', '最高價', '最低價', '收盤價', '成交價', '均價', '均張',
+               '漲跌', '漲幅(%)', '振幅(%)', '漲跌幅'],
+
+    'float64':['成交金額(千)', '股本(百萬)', '總市值(億)', '本益比', '股價淨值比',
+               '本益比(近四季)', '法人買賣超金額(千)', '法人持股比率(%)',
+               '外資買賣超金額(千)', '外資持股比率(%)', '投信買賣超金額(千)',
+               '投信持股比率(%)', '自營買賣超金額(千)', '自營商持股比率(%)', '券資比',
+               '資使用率', '券使用率', '當沖比率',
+               '實收資本額(百萬)', '前年度內銷比重(%)', '前年度外銷比重(%)',
+               '交易所普通股股本(千)', '交易所特別股股本(千)', '交易所普通股股數(千)',
+               '交易所特別股股數(千)', '交易所公告股本(千)', '普通股每股面額',
+               '現金股利合計(元)', '股票股利合計(元)', '股利合計(元)', '盈餘配息(元)',
+               '公積配息(元)', '盈餘配股(元)', '公積配股(元)', '現金股利殖利率(%)',
+               '股票股利發放率(%)', '股利發放率(%)'] + _FS + _REVENUE + _TECH
+}
+
+# 欄位名稱對應型態
+coltype_map = {col:dtype for dtype, cols in coltype_dict.items() for col in cols}
+
+def schema(func:str, di:str = None) -> dict:
+    '''
+    取得商品欄位與型態
+
+    Parameters
+    ----------
+    :param func: str
+        - 函數名稱，如 'ssp'、'fim'
+
+    :param di: str, default None
+        - fis / fim 的資料頻率 y, q, m
+
+    Returns
+    ----------
+    dict
+        - {欄位名稱: 型態}，依 colist_dict 欄位順序
+    '''
+    cols = colist_dict[func]
+    if isinstance(cols, dict):
+        cols = cols[di.lower()]
+    return {col:coltype_map.get(col, 'float64') for col in cols}
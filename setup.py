@@ -25,6 +25,7 @@ setup(
     author = 'Owl Corp.',
     author_email = 'owldb@cmoney.com.tw',
     install_requires = requires,
+    extras_require = {'async': ['aiohttp >= 3.0'], 'archive': ['pyarrow >= 14.0']},
     url = 'https://owl.cmoney.com.tw/Owl/',
     packages = packages
 )
@@ -0,0 +1,59 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from owldata import OwlData, OwlReplayServer
+from owldata._owltime import _drop_calendars
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# 重播伺服器使用的產品代碼
+PDID = {'ssp':'PYPRI-1', 'msp':'PYPRI-2', 'sth':'PYTH-1', 'mth':'PYTH-2', 'mcm1':'PYCM-3', 'sbq':'PYBAL-2', 'mbq':'PYBAL-5'}
+
+def load_fixture(name:str) -> dict:
+    with open(os.path.join(FIXTURES, name), encoding = 'utf-8') as f:
+        return json.load(f)
+
+def payload(body) -> bytes:
+    return json.dumps(body, ensure_ascii = False).encode('utf-8')
+
+def response_frame(body:dict) -> 'DataFrame':
+    return pd.DataFrame(body['Data'], columns = body['Title'])
+
+# 以交易日 (新到舊) 建立產品對照表與四種日曆的回應
+def startup_records(days:list) -> dict:
+    base = '/OwlApi/api/v2/json/'
+    stamps = pd.to_datetime(days, format = '%Y%m%d')
+    periods = {
+        'PYCtrl-14806a/':('日期', list(days)),
+        'PYCtrl-14809a/':('年月', sorted(set(stamps.strftime('%Y%m')))),
+        'PYCtrl-14810a/':('年季', sorted(set(stamps.year.astype(str) + ['0' + str(q) for q in stamps.quarter]))),
+        'PYCtrl-14811a/':('年度', sorted(set(stamps.strftime('%Y'))))
+        }
+    records = {base + 'PYCtrl-14882b':payload({'Title':['FuncID', 'pdid'], 'Data':[[k, v] for k, v in PDID.items()]})}
+    for code, (title, values) in periods.items():
+        records[base + code] = payload({'Title':[title], 'Data':[[x] for x in values]})
+    records[base + 'PYCtrl-14806a//TWA00/9999'] = records[base + 'PYCtrl-14806a/']
+    return records
+
+@pytest.fixture
+def replay():
+    '''
+    回傳 connect(days)，以空白的重播伺服器與 OwlData 連線，測試結束後關閉並清除日曆
+    '''
+    opened = []
+    def connect(days:list) -> tuple:
+        server = OwlReplayServer(startup_records(days)).start()
+        owl = OwlData('appid', 'appsecret', base_url = server.url, errors = 'raise')
+        opened.append((server, owl))
+        return server, owl
+    yield connect
+    for server, owl in opened:
+        owl.close()
+        server.stop()
+        _drop_calendars(owl._token['data_url'])
@@ -0,0 +1,84 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from owldata import OwlAdjustment
+from owldata._owladjust import _DPM_COLS
+
+from .conftest import payload
+
+DAYS = pd.bdate_range('2023-01-02', '2024-12-31').strftime('%Y%m%d').tolist()[::-1]
+
+# 季配息 (含重複列)、除息與除權不同日、同日除權息、除息日為時間表第一日
+DPM = [
+    ['1101', '2023', '20230315', '', '1.0', '0'],
+    ['1101', '2023', '20230615', '', '1.0', '0'],
+    ['1101', '2023', '20230615', '', '1.0', '0'],
+    ['1101', '2023', '20230915', '', '1.0', '0'],
+    ['1101', '2023', '20231215', '', '1.0', '0'],
+    ['2330', '2023', '20230710', '20230801', '2.0', '1.0'],
+    ['3008', '2023', '20230502', '20230502', '1.0', '0.5'],
+    ['9999', '2023', '20230102', '', '3.0', '0'],
+    ]
+CLOSE = {'1101':50.0, '2330':500.0, '3008':20.0, '9999':30.0}
+
+def _connect(replay):
+    server, owl = replay(DAYS)
+    server.add(owl._req_dpm('2023')[0], payload({'Title':_DPM_COLS, 'Data':DPM}))
+    for day in DAYS:
+        rows = [[sid, '名' + sid, day, str(close)] for sid, close in CLOSE.items()]
+        server.add(owl._req_msp(day)[0], payload({'Title':['股票代號', '股票名稱', '日期', '收盤價'], 'Data':rows}))
+    return server, owl
+
+def test_events_per_ex_date(replay):
+    server, owl = _connect(replay)
+    events = owl.adj_update('2023', '2023').set_index(['股票代號', '除權息日'])
+
+    assert events.loc['1101'].index.tolist() == [20230315, 20230615, 20230915, 20231215]
+    assert (events.loc['1101', '現金股利'] == 1.0).all()
+    assert np.allclose(events.loc['1101', '價格因子'], 49 / 50)
+
+    split = events.loc['2330']
+    assert split.loc[20230710, ['現金股利', '股票股利']].tolist() == [2.0, 0.0]
+    assert split.loc[20230801, ['現金股利', '股票股利']].tolist() == [0.0, 1.0]
+    assert np.isclose(split.loc[20230710, '價格因子'], 498 / 500)
+    assert np.isclose(split.loc[20230801, '價格因子'], 1 / 1.1)
+
+    same = events.loc[('3008', 20230502)]
+    assert np.isclose(same['價格因子'], 19 / (20 * 1.05)) and np.isclose(same['股數因子'], 1.05)
+
+    # 時間表第一日除息，沒有前一日收盤價，不以當日收盤代替
+    assert np.isnan(events.loc[('9999', 20230102), '價格因子'])
+    assert server.stats['misses'] == 0
+
+# 除息前一日停牌時不計算因子，取得收盤價後才結算
+def test_missing_close_stays_pending(replay):
+    server, owl = _connect(replay)
+    rows = [[sid, '名' + sid, '20230501', str(close)] for sid, close in CLOSE.items() if sid != '3008']
+    server.add(owl._req_msp('20230501')[0], payload({'Title':['股票代號', '股票名稱', '日期', '收盤價'], 'Data':rows}))
+    events = owl.adj_update('2023', '2023').set_index(['股票代號', '除權息日'])
+    assert np.isnan(events.loc[('3008', 20230502), '價格因子'])
+    assert events.loc['1101', '價格因子'].notna().all()
+
+    rows.append(['3008', '名3008', '20230501', '20.0'])
+    server.add(owl._req_msp('20230501')[0], payload({'Title':['股票代號', '股票名稱', '日期', '收盤價'], 'Data':rows}))
+    events = owl.adj_update('2023', '2023').set_index(['股票代號', '除權息日'])
+    assert np.isclose(events.loc[('3008', 20230502), '價格因子'], 19 / (20 * 1.05))
+
+def test_factors_compound(replay):
+    server, owl = _connect(replay)
+    owl.adj_update('2023', '2023')
+    dates = pd.to_datetime(['2023-03-14', '2023-03-15', '2023-12-14', '2023-12-15'])
+    price, share = owl._adjustment().factors(dates, ['1101'] * 4)
+    assert np.allclose(price, [0.98 ** 4, 0.98 ** 3, 0.98, 1.0])
+    assert np.allclose(share, 1.0)
+
+def test_legacy_file_is_refetched(tmp_path):
+    path = str(tmp_path / 'adjust.pkl')
+    legacy = pd.DataFrame({'股票代號':['1101'], '年度':pd.to_datetime(['2023']), '最後過戶日':[20230620],
+                           '除權息日':[20230619], '現金股利':[4.0], '股票股利':[0.0]})
+    pd.to_pickle({'events':legacy, 'fetched':{'2023':0.0}}, path)
+    adjust = OwlAdjustment(path)
+    assert len(adjust.events) == 0 and adjust.stale(['2023']) == ['2023']
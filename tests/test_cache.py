@@ -0,0 +1,111 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+import time
+
+import pandas as pd
+import pytest
+
+from owldata import _owlcache
+from owldata._owlcache import OwlCache
+
+from .conftest import payload
+
+URL = 'http://127.0.0.1/OwlApi/api/v2/json/date/{}/PYXX-1'
+
+# 固定今天的日期
+@pytest.fixture
+def today(monkeypatch):
+    def set_today(value:str):
+        fixed = datetime.datetime.strptime(value, '%Y%m%d').date()
+        class _Date(datetime.date):
+            @classmethod
+            def today(cls):
+                return fixed
+        monkeypatch.setattr(_owlcache.datetime, 'date', _Date)
+    return set_today
+
+@pytest.fixture
+def cache(tmp_path):
+    return OwlCache(str(tmp_path / 'cache'), ttl = 60)
+
+def _permanent(cache, dt:str, func:str) -> bool:
+    return cache.expires(URL.format(dt), func = func) is None
+
+@pytest.mark.parametrize('func, dt, closed, still_open', [
+    # 日資料: 隔日收盤
+    ('msp', '20240513', '20240515', '20240514'),
+    # 月營收: 次月 10 日
+    ('mbm', '20240401', '20240511', '20240510'),
+    # 個股季資料網址為 yyyyqq01: 第一季期末 3/31、第三季期末 9/30，後 45 日
+    ('sbq', '20240101', '20240516', '20240515'),
+    ('sbq', '20230301', '20231115', '20231114'),
+    # 個股第四季同年報 90 日
+    ('sbq', '20230401', '20240331', '20240330'),
+    # 多股季資料 (fim) 網址為季初月份 01、04、07、10
+    ('mbq', '20240101', '20240516', '20240515'),
+    ('mbq', '20230401', '20230815', '20230814'),
+    ('mbq', '20230701', '20231115', '20231114'),
+    ('mbq', '20231001', '20240331', '20240330'),
+    ('mby', '20231231', '20240331', '20240330'),
+    # 股利政策: 次年整年仍會更新
+    ('mcm1', '20231231', '20250101', '20241231'),
+    ('mcm2', '20231231', '20240201', '20240131'),
+    ])
+def test_publication_lag(cache, today, func, dt, closed, still_open):
+    today(still_open)
+    assert not _permanent(cache, dt, func)
+    today(closed)
+    assert _permanent(cache, dt, func)
+
+def test_rules(tmp_path):
+    cache = OwlCache(str(tmp_path / 'cache'), ttl = 60, rules = {'msp':None, 'PYXX-1':10})
+    assert cache.expires(URL.format('20990101'), func = 'msp') is None
+    assert cache.expires(URL.format('20000101'), func = 'tsp') == 0
+    assert cache.expires(URL.format('20000101'), pdid = 'PYXX-1') == pytest.approx(time.time() + 10, abs = 5)
+    # 無日期的網址 (商品表、時間表) 依 ttl
+    assert cache.expires('http://127.0.0.1/OwlApi/api/v2/json/PYCtrl-14882b') == pytest.approx(time.time() + 60, abs = 5)
+
+def test_expired_entry_is_dropped(cache, today):
+    today('20240514')
+    url = URL.format('20240513')
+    cache.set(url, b'body', func = 'msp')
+    assert cache.get(url, func = 'msp') == b'body'
+    cache.ttl = -1
+    cache.set(url, b'body', func = 'msp')
+    assert cache.get(url, func = 'msp') is None
+    assert cache.info()['entries'] == 0
+
+# 以實際的請求網址計算到期，fim 與 fis 的同一季結果相同
+@pytest.mark.parametrize('season, closed, still_open', [
+    ('202301', '20230516', '20230515'),
+    ('202302', '20230815', '20230814'),
+    ('202303', '20231115', '20231114'),
+    ('202304', '20240331', '20240330'),
+    ])
+def test_request_urls(replay, tmp_path, today, season, closed, still_open):
+    server, owl = replay(pd.bdate_range('2023-01-02', '2024-01-05').strftime('%Y%m%d').tolist()[::-1])
+    cache = OwlCache(str(tmp_path / 'cache'))
+    fim = owl._req_fim('q', season)[0]
+    fis = owl._req_fis('1101', 'q', season, season)[0]
+    for url, func in ((fim, 'mbq'), (fis, 'sbq')):
+        today(still_open)
+        assert cache.expires(url, func = func) is not None
+        today(closed)
+        assert cache.expires(url, func = func) is None
+
+# 經重播伺服器查詢，已收盤的日期第二次由快取提供
+def test_replay_roundtrip(replay, tmp_path):
+    days = ['20240105', '20240104', '20240103', '20240102']
+    server, owl = replay(days)
+    owl.enable_cache(str(tmp_path / 'cache'))
+    rows = [['1101', '台泥', '20240104', '32.5'], ['2330', '台積電', '20240104', '580']]
+    server.add(owl._req_msp('20240104')[0], payload({'Title':['股票代號', '股票名稱', '日期', '收盤價'], 'Data':rows}))
+
+    first = owl.msp('20240104')
+    hits = server.stats['hits']
+    second = owl.msp('20240104')
+    assert server.stats['hits'] == hits
+    assert second.equals(first)
+    assert first['收盤價'].tolist() == [32.5, 580.0]
@@ -0,0 +1,41 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from owldata import OwlData, OwlReplayServer, OwlColumnError
+from owldata._owlerror import _check_colist
+from owldata.config import colist_dict
+
+from .conftest import startup_records
+
+# 延遲載入的連線，檢查錯誤欄位時不應送出任何資料請求
+@pytest.fixture
+def lazy():
+    server = OwlReplayServer(startup_records(['20240105', '20240104'])).start()
+    owl = OwlData('appid', 'appsecret', base_url = server.url, startup = 'lazy', errors = 'raise')
+    yield server, owl
+    owl.close()
+    server.stop()
+
+def _requests(server) -> int:
+    return server.stats['hits'] + server.stats['misses']
+
+@pytest.mark.parametrize('call', [
+    lambda owl: owl.ssp('1101', '20240104', '20240105', ['收盤價', '不存在']),
+    lambda owl: owl.msp('20240105', ['外資買賣超']),
+    lambda owl: owl.fim('y', '2023', ['年季']),
+    lambda owl: owl.fis('1101', 'm', '202301', '202312', ['公告基本每股盈餘(元)']),
+    lambda owl: owl.ssp_many(['1101', '2330'], '20240104', '20240105', ['收盤價', '不存在']),
+    lambda owl: owl.fim_range('q', '202301', '202304', ['不存在']),
+    ])
+def test_unknown_column_fails_before_request(lazy, call):
+    server, owl = lazy
+    with pytest.raises(OwlColumnError):
+        call(owl)
+    assert _requests(server) == 0
+
+def test_readme_columns_pass():
+    for func, cols in colist_dict.items():
+        for freq, names in (cols.items() if isinstance(cols, dict) else [(None, cols)]):
+            assert _check_colist(None, func, names, freq)
@@ -0,0 +1,61 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from owldata._owlpit import _OwlPIT
+
+# 兩檔四季財報，每股盈餘以期別編號，便於辨認對齊到哪一期
+@pytest.fixture
+def fundamentals():
+    periods = pd.to_datetime(['2023-09-30', '2023-12-31', '2024-03-31', '2024-06-30'])
+    frame = pd.DataFrame({'股票代號':np.repeat(['1101', '2330'], 4), '年季':np.tile(periods, 2),
+                          '每股盈餘(元)':np.tile([1.0, 2.0, 3.0, 4.0], 2) + np.repeat([0, 10], 4)})
+    # 2330 缺 2024 第一季
+    frame = frame.drop(index = 6)
+    return frame.set_index(['股票代號', '年季'])
+
+@pytest.fixture
+def grid():
+    dates = pd.bdate_range('2023-11-01', '2024-09-30')
+    return pd.MultiIndex.from_product([dates, ['1101', '2330', '9999']], names = ['日期', '股票代號'])
+
+# 期末日加上公告期限，第四季 90 日、其餘 45 日
+def _known(period:'Timestamp') -> 'Timestamp':
+    return period + pd.Timedelta(days = 90 if period.month == 12 else 45)
+
+def test_no_lookahead(fundamentals, grid):
+    result = _OwlPIT().fim_asof(fundamentals, grid)
+    assert result.index.equals(grid)
+    for (dt, sid), period in result['年季'].items():
+        if sid == '9999':
+            assert pd.isna(period)
+            continue
+        table = fundamentals.loc[sid]
+        available = [p for p in table.index if _known(p) <= dt]
+        if len(available) == 0:
+            assert pd.isna(period)
+        else:
+            # 已公告的期別中最新的一期
+            assert period == max(available)
+            assert result.loc[(dt, sid), '每股盈餘(元)'] == table.loc[period, '每股盈餘(元)']
+
+def test_boundary_days(fundamentals, grid):
+    result = _OwlPIT().fim_asof(fundamentals, grid)['每股盈餘(元)']
+    # 第三季 11/14 公告，第四季 3/30 公告
+    assert np.isnan(result[(pd.Timestamp('2023-11-13'), '1101')])
+    assert result[(pd.Timestamp('2023-11-14'), '1101')] == 1.0
+    assert result[(pd.Timestamp('2024-03-29'), '1101')] == 1.0
+    assert result[(pd.Timestamp('2024-04-01'), '1101')] == 2.0
+    # 2330 缺第一季，第一季公告日後仍為第四季
+    assert result[(pd.Timestamp('2024-05-15'), '2330')] == 12.0
+
+def test_custom_lag(fundamentals, grid):
+    fixed = _OwlPIT().fim_asof(fundamentals, grid, lag = 0)['每股盈餘(元)']
+    assert fixed[(pd.Timestamp('2024-01-02'), '1101')] == 2.0
+    shifted = _OwlPIT().fim_asof(fundamentals, grid, lag = lambda p: p + pd.DateOffset(months = 6))['每股盈餘(元)']
+    # 第三季 6 個月後 (3/30) 才可取得
+    assert np.isnan(shifted[(pd.Timestamp('2024-03-29'), '1101')])
+    assert shifted[(pd.Timestamp('2024-04-01'), '1101')] == 1.0
@@ -0,0 +1,93 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from owldata import OwlScreen
+from owldata._owlscreen import _SCREEN_COLUMNS, _SCREEN_FUNC, _OwlScreen
+from owldata.config import colist_dict
+
+# 以固定表格回應的選股物件，tim 在 published 之前回傳空表
+class _Screener(_OwlScreen):
+    def __init__(self):
+        self.published = False
+        self.calls = []
+        self._archive = None
+
+    def _date_freq(self, bpd, epd, freq):
+        return freq
+
+    def _frame(self, func:str, **cols) -> 'DataFrame':
+        self.calls.append(func)
+        # 模擬下載時間
+        time.sleep(0.005)
+        return pd.DataFrame(dict({'股票代號':['1101', '2330']}, **cols))
+
+    def msp(self, dt):
+        return self._frame('msp', 收盤價 = [40.0, 600.0])
+
+    def chm(self, dt):
+        return self._frame('chm', 外資買賣超 = [-10.0, 2500.0])
+
+    def tim(self, dt):
+        if not self.published:
+            self.calls.append('tim')
+            return pd.DataFrame(columns = ['股票代號', 'RSI(5)'])
+        return self._frame('tim', **{'RSI(5)':[20.0, 80.0]})
+
+    def cim(self):
+        return self._frame('cim', 產業名稱 = ['水泥', '半導體'])
+
+def test_columns_follow_colist():
+    for func in _SCREEN_FUNC:
+        for col in colist_dict[func]:
+            assert col == '股票代號' or col in _SCREEN_COLUMNS
+    assert _SCREEN_COLUMNS['外資買賣超'] == 'chm'
+    assert _SCREEN_COLUMNS['RSI(5)'] == 'tim'
+    assert _SCREEN_COLUMNS['產業名稱'] == 'cim'
+    assert _SCREEN_COLUMNS['收盤價'] == 'msp'
+
+def test_empty_product_is_reloaded():
+    owl = _Screener()
+    screen = owl.screener('20240105')
+    assert screen.products == {'msp', 'chm', 'cim'}
+    assert 'RSI(5)' not in screen.columns
+
+    owl.published = True
+    screen = owl.screener('20240105')
+    assert 'tim' in screen.products
+    assert owl.calls.count('tim') == 2 and owl.calls.count('msp') == 1
+    result = screen.query(['RSI(5) < 50'], colist = ['RSI(5)', '產業名稱'])
+    assert result['股票代號'].tolist() == ['1101']
+
+def test_unaligned_rows_are_skipped():
+    screen = OwlScreen('20240105').add(pd.DataFrame({'股票代號':['1101'], 'a':[1.0]}), 'msp')
+    screen.add(pd.DataFrame({'股票代號':['9999'], 'b':[1.0]}), 'cim', expand = False)
+    assert screen.products == {'msp'} and screen.columns == ['a']
+
+# 同一日同時篩選: 每個商品只讀取一次，載入期間的查詢不會讀到一半的資料
+def test_same_date_across_threads():
+    owl = _Screener()
+    owl.published = True
+    filters = ['收盤價 > 100', ('產業名稱', '==', '半導體'), 'RSI(5) > 50']
+    def run(_):
+        screen = owl.screener('20240105')
+        return screen.query(filters, rank = '外資買賣超')['股票代號'].tolist()
+    with ThreadPoolExecutor(max_workers = 8) as pool:
+        results = list(pool.map(run, range(64)))
+    assert all(result == ['2330'] for result in results)
+    assert sorted(owl.calls) == sorted(_SCREEN_FUNC)
+
+def test_screens_shared_across_threads():
+    owl = _Screener()
+    owl.published = True
+    dates = ['202401{:02d}'.format(d) for d in range(1, 29)]
+    with ThreadPoolExecutor(max_workers = 8) as pool:
+        screens = list(pool.map(owl.screener, dates * 4))
+    assert all(len(screen) == 2 for screen in screens)
+    assert len(owl._screens) == owl._screen_keep
+    assert np.isfinite(owl.screener(dates[-1])._numeric['收盤價']).all()
@@ -0,0 +1,131 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from owldata import OwlIndicators, OwlIndicatorState
+
+from .conftest import load_fixture, payload, response_frame
+
+# tis 回應: 3 檔，2002 中途停牌 8 日、3008 晚 20 日上市，數值四捨五入至小數第二位
+@pytest.fixture(scope = 'module')
+def recorded():
+    return load_fixture('tis_responses.json')
+
+# 各檔 ssp 回應合併為 股票代號、日期 長表格
+def _prices(recorded:dict) -> 'DataFrame':
+    frames = []
+    for sid, body in recorded['ssp'].items():
+        frame = response_frame(body)
+        frame.insert(0, '股票代號', sid)
+        frames.append(frame)
+    prices = pd.concat(frames, ignore_index = True)
+    prices['日期'] = pd.to_datetime(prices['日期'], format = '%Y%m%d')
+    for col in ('最高價', '最低價', '收盤價'):
+        prices[col] = prices[col].astype(float)
+    return prices
+
+def _tis(recorded:dict) -> 'DataFrame':
+    frames = []
+    for sid, body in recorded['tis'].items():
+        frame = response_frame(body)
+        frame.insert(0, '股票代號', sid)
+        frames.append(frame)
+    tis = pd.concat(frames, ignore_index = True)
+    tis['日期'] = pd.to_datetime(tis['日期'], format = '%Y%m%d')
+    return tis
+
+def _assert_parity(report:'DataFrame'):
+    assert len(report) == len(OwlIndicators().columns)
+    assert (report['rows'] > 0).all()
+    assert (report['match'] == 1).all(), report
+
+# 經重播伺服器以 tis_parity 比對個股
+@pytest.mark.parametrize('sid', ['1101', '2002', '3008'])
+def test_tis_parity_replay(replay, recorded, sid):
+    server, owl = replay(recorded['calendar'])
+    days = recorded['calendar'][::-1]
+    bpd, epd = days[30], days[-1]
+    url = owl._req_ssp(sid, owl._warmup_start(bpd, 120), epd)[0]
+    server.add(url, payload(recorded['ssp'][sid]))
+    tis = response_frame(recorded['tis'][sid])
+    server.add(owl._req_tis(sid, bpd, epd)[0], payload({'Title':tis.columns.tolist(),
+                                                       'Data':tis[tis['日期'] >= bpd].values.tolist()}))
+
+    _assert_parity(owl.tis_parity(sid, bpd, epd))
+    assert server.stats['misses'] == 0
+
+# 多股面板中停牌日不佔 KD、W%R 視窗，結果與各檔 tis 相同
+def test_panel_matches_tis(recorded):
+    indicators = OwlIndicators()
+    prices = _prices(recorded)
+    _assert_parity(indicators.parity(indicators.compute(prices), _tis(recorded)))
+
+    panel = indicators.compute(prices.set_index(['日期', '股票代號']))
+    long = indicators.compute(prices)
+    assert np.allclose(panel.sort_index().to_numpy(),
+                       long.set_index(['日期', '股票代號']).sort_index().to_numpy(), equal_nan = True)
+
+def test_suspension_window(recorded):
+    indicators = OwlIndicators(kd = 9, rsi = (), macd = None, wr = (5,), dmi = None, ma = (5,), bbands = (5, 2))
+    prices = _prices(recorded)
+    result = indicators.compute(prices).set_index(['股票代號', '日期'])
+    alone = indicators.compute(prices[prices['股票代號'] == '2002'].reset_index(drop = True))
+    expect = alone.set_index(['股票代號', '日期'])
+    assert np.allclose(result.loc[expect.index].to_numpy(), expect.to_numpy(), equal_nan = True)
+    # 復牌第一日 MA(5) 以停牌前 4 日計算，不因停牌而缺值
+    assert result.loc['2002', 'MA(5)'].notna().sum() == len(expect) - 4
+
+# 逐日更新的狀態與批次計算一致，停牌日不寫入緩衝區，保存後可接續
+def test_state_matches_compute(recorded, tmp_path):
+    indicators = OwlIndicators(ma = (5, 20), bbands = (20, 2))
+    prices = _prices(recorded)
+    expect = indicators.compute(prices).set_index(['股票代號', '日期'])
+    dates = sorted(prices['日期'].unique())
+    head = prices[prices['日期'] < dates[75]]
+
+    state = OwlIndicatorState(indicators).extend(head)
+    path = str(tmp_path / 'state.pkl')
+    state.save(path)
+    state = OwlIndicatorState.load(path)
+    for dt in dates[75:]:
+        day = state.update(prices[prices['日期'] == dt])
+        got = day.set_index(['股票代號', '日期'])
+        assert np.allclose(got.to_numpy(), expect.loc[got.index].to_numpy(), equal_nan = True, atol = 1e-8)
+
+# 隨機面板: 上市、下市與零星停牌，逐日更新與批次計算相同
+def test_state_random_panel(tmp_path):
+    rng = np.random.RandomState(5)
+    dates = pd.bdate_range('2024-01-02', periods = 120)
+    sids = ['{:04d}'.format(1101 + i) for i in range(12)]
+    close = 50 + rng.randn(len(dates), len(sids)).cumsum(axis = 0)
+    traded = rng.rand(len(dates), len(sids)) > 0.1
+    traded[:30, 0] = False
+    traded[90:, 1] = False
+    i, j = np.nonzero(traded)
+    prices = pd.DataFrame({'日期':dates[i], '股票代號':np.array(sids)[j], '收盤價':close[i, j]})
+    prices['最高價'] = prices['收盤價'] + rng.rand(len(prices))
+    prices['最低價'] = prices['收盤價'] - rng.rand(len(prices))
+
+    indicators = OwlIndicators(ma = (5,), bbands = (10, 2))
+    expect = indicators.compute(prices.set_index(['日期', '股票代號']))
+    state = OwlIndicatorState(indicators).extend(prices[prices['日期'] < dates[60]])
+    for dt in dates[60:]:
+        day = prices[prices['日期'] == dt]
+        preview = state.preview(day.drop(columns = '日期'))
+        got = state.update(day)
+        cols = indicators.columns
+        assert np.allclose(preview[cols].to_numpy(), got[cols].to_numpy(), equal_nan = True)
+        want = expect.loc[dt].loc[got['股票代號']]
+        assert np.allclose(got[cols].to_numpy(), want[cols].to_numpy(), equal_nan = True, atol = 1e-8)
+
+    path = str(tmp_path / 'state.pkl')
+    state.save(path)
+    assert OwlIndicatorState.load(path).date == state.date
+    snapshot = pd.read_pickle(path)
+    snapshot['version'] = 1
+    pd.to_pickle(snapshot, path)
+    with pytest.raises(ValueError):
+        OwlIndicatorState.load(path)
@@ -0,0 +1,41 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+import pytest
+from pandas.tseries.offsets import MonthEnd, QuarterEnd, YearEnd
+
+from owldata._owltime import _parse_dates
+
+# 原本逐筆轉換的寫法，空字串保留為空字串
+def _baseline(values:list, freq:str) -> list:
+    if freq == 'd':
+        return [pd.to_datetime(i) if i != '' else '' for i in values]
+    if freq == 'm':
+        return [pd.to_datetime(i, format = '%Y%m') + MonthEnd(1) if i != '' else '' for i in values]
+    if freq == 'q':
+        values = [x[0:4] + x[4:6].replace('0', 'Q') for x in values]
+        return [pd.to_datetime(i) + QuarterEnd(1) if i != '' else '' for i in values]
+    return [pd.to_datetime(i) + YearEnd(1) if i != '' else '' for i in values]
+
+CASES = {
+    'd':['20240229', '20231231', '', '19990104', '20240101'],
+    'm':['202401', '202402', '', '202312', '201911'],
+    'q':['202401', '202402', '202403', '202404', '', '199904'],
+    'y':['2024', '', '1999', '2000']
+    }
+
+@pytest.mark.parametrize('freq', sorted(CASES))
+def test_parse_dates_matches_baseline(freq):
+    values = CASES[freq]
+    result = _parse_dates(pd.Series(values, dtype = object), freq)
+    assert str(result.dtype) == 'datetime64[ns]'
+    for got, expect in zip(result, _baseline(values, freq)):
+        if expect == '':
+            assert pd.isna(got)
+        else:
+            assert got == expect
+
+def test_parse_dates_rejects_bad_quarter():
+    with pytest.raises(ValueError):
+        _parse_dates(pd.Series(['202405']), 'q')